@@ -2,8 +2,16 @@
 
 from .orchestrator import orchestrator_node
 from .query_analysis import query_analysis_node
-from .retrieval import retrieval_node
-from .reranking import reranking_node, BAAIReranker
+from .retrieval import retrieval_node, retrieval_node_async, clear_retrieval_cache
+from .reranking import (
+    reranking_node,
+    reranking_node_async,
+    BAAIReranker,
+    preload_reranker,
+    warmup_reranker_in_background,
+    load_score_cache,
+    save_score_cache,
+)
 from .relevance_checker import relevance_checker_node
 from .generation import generation_node
 from .citation import citation_node
@@ -1,11 +1,12 @@
 """Wrapper for integrating LangChain agents with LangGraph."""
 
-from typing import Any, Dict, Callable, Optional
+from typing import Any, Dict, Callable, List, Optional
 from langchain_core.runnables import Runnable
 
 from .langchain_agents import (
     create_query_analysis_agent,
     create_relevance_check_agent,
+    create_query_and_relevance_agent,
     create_tool_using_chain,
     create_rag_agent
 )
@@ -37,6 +38,19 @@ class LangChainAgentWrapper:
         """Execute the agent and return updated state."""
         return self.agent.invoke(state)
 
+    async def ainvoke(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute the agent asynchronously and return updated state."""
+        return await self.agent.ainvoke(state)
+
+    async def abatch(self, states: List[Dict[str, Any]], **kwargs) -> List[Dict[str, Any]]:
+        """Execute the agent over several states with one batched call."""
+        return await self.agent.abatch(states, **kwargs)
+
+
+def state_delta(state: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    """Keys an agent added or changed, so graph nodes can return a partial update."""
+    return {k: v for k, v in result.items() if k not in state or state[k] is not v}
+
 
 def create_query_analysis_wrapper(**kwargs) -> LangChainAgentWrapper:
     """Create a wrapper for the query analysis agent."""
@@ -48,6 +62,11 @@ def create_relevance_check_wrapper(**kwargs) -> LangChainAgentWrapper:
     return LangChainAgentWrapper(create_relevance_check_agent, **kwargs)
 
 
+def create_query_and_relevance_wrapper(**kwargs) -> LangChainAgentWrapper:
+    """Create a wrapper for the combined query analysis and relevance check agent."""
+    return LangChainAgentWrapper(create_query_and_relevance_agent, **kwargs)
+
+
 def create_tool_using_wrapper(tools, system_prompt: str, **kwargs) -> LangChainAgentWrapper:
     """Create a wrapper for a tool-using chain."""
     def factory(**factory_kwargs):
@@ -64,17 +83,26 @@ def create_rag_wrapper(retriever: Runnable, **kwargs) -> LangChainAgentWrapper:
     return LangChainAgentWrapper(factory, **kwargs)
 
 
+# Shared wrappers: the agent (LLM client, parser, prompt) is built once on first use
+QUERY_ANALYSIS_WRAPPER = create_query_analysis_wrapper()
+RELEVANCE_CHECK_WRAPPER = create_relevance_check_wrapper()
+QUERY_AND_RELEVANCE_WRAPPER = create_query_and_relevance_wrapper()
+
+
 # Node functions for LangGraph integration
 def query_analysis_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """LangGraph node for query analysis using LangChain agent."""
-    wrapper = create_query_analysis_wrapper()
-    return wrapper.invoke(state)
+    return state_delta(state, QUERY_ANALYSIS_WRAPPER.invoke(state))
 
 
 def relevance_check_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """LangGraph node for relevance checking using LangChain agent."""
-    wrapper = create_relevance_check_wrapper()
-    return wrapper.invoke(state)
+    return state_delta(state, RELEVANCE_CHECK_WRAPPER.invoke(state))
+
+
+async def query_and_relevance_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """LangGraph node for combined query analysis and relevance checking (one LLM call)."""
+    return state_delta(state, await QUERY_AND_RELEVANCE_WRAPPER.ainvoke(state))
 
 
 def tool_using_node(state: Dict[str, Any], tools, system_prompt: str) -> Dict[str, Any]:
@@ -86,7 +114,6 @@ def tool_using_node(state: Dict[str, Any], tools, system_prompt: str) -> Dict[st
     response = wrapper.agent.invoke(query, chat_history)
     
     return {
-        **state,
         "generated_answer": response,
         "final_response": response
     }
@@ -101,7 +128,6 @@ def rag_node(state: Dict[str, Any], retriever: Runnable) -> Dict[str, Any]:
     response = wrapper.agent.invoke(query, chat_history)
     
     return {
-        **state,
         "generated_answer": response,
         "final_response": response
     }
@@ -130,29 +156,34 @@ def agent_to_node(agent: Runnable, state_key: str = "query") -> Callable:
             response = agent.invoke(state)
         
         # Handle different response types
+        # Partial update; LangGraph merges it into the state
         if isinstance(response, dict):
-            return {**state, **response}
+            return response
         else:
-            return {**state, "response": response}
+            return {"response": response}
     
     return node
 
 
 # Factory for creating custom agent nodes
-def create_agent_node(agent_factory: Callable, state_key: str = "query", **factory_kwargs) -> Callable:
+def create_agent_node(agent_factory: Callable, state_key: str = "query", stateful: bool = False,
+                      **factory_kwargs) -> Callable:
     """
     Create a custom agent node for LangGraph.
     
     Args:
         agent_factory: Function that creates the agent
         state_key: The key in the state to use as input
+        stateful: Build a fresh agent for every call instead of sharing one
         **factory_kwargs: Additional arguments for the agent factory
         
     Returns:
         A function compatible with LangGraph nodes
     """
+    shared_agent = None if stateful else agent_factory(**factory_kwargs)
+    
     def node(state: Dict[str, Any]) -> Dict[str, Any]:
-        agent = agent_factory(**factory_kwargs)
+        agent = agent_factory(**factory_kwargs) if stateful else shared_agent
         input_value = state.get(state_key, "")
         
         if isinstance(input_value, str):
@@ -160,9 +191,10 @@ def create_agent_node(agent_factory: Callable, state_key: str = "query", **facto
         else:
             response = agent.invoke(state)
         
+        # Partial update; LangGraph merges it into the state
         if isinstance(response, dict):
-            return {**state, **response}
+            return response
         else:
-            return {**state, "response": response}
+            return {"response": response}
     
     return node
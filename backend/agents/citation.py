@@ -4,34 +4,41 @@ from typing import Any, Dict, List
 
 
 def _extract_citations(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Extract unique (source, page) from chunks."""
-    seen = set()
-    citations = []
+    """Extract unique (source, page) from chunks, in first-seen order."""
+    seen: Dict[tuple, Dict[str, Any]] = {}
     for c in chunks:
-        meta = c.get("metadata", {})
-        src = meta.get("source", "unknown")
-        page = meta.get("page", "?")
-        key = (src, page)
+        meta = c.get("metadata") or {}
+        key = (meta.get("source", "unknown"), meta.get("page", "?"))
         if key not in seen:
-            seen.add(key)
-            citations.append({"source": src, "page": page})
-    return citations
+            seen[key] = {"source": key[0], "page": key[1]}
+    return list(seen.values())
 
 
 def _format_citation(c: Dict[str, Any]) -> str:
     return f"[Source: {c.get('source', 'unknown')}, Page {c.get('page', '?')}]"
 
 
-def _filter_relevant_chunks(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _filter_relevant_chunks(chunks: List[Dict[str, Any]], ratio: float = 0.8) -> List[Dict[str, Any]]:
     """
-    Return only chunks from the most relevant document for citation.
-    Uses the top-scoring chunk's source - only cite that document.
+    Return only chunks scoring within ``ratio`` of the best rerank score, for citation.
     Filters out irrelevant docs (e.g. Risk & Fraud when query is about invoices).
+    Chunks without a rerank score (e.g. web results) fall back to the top chunk's source.
     """
     if not chunks:
         return []
-    top_source = chunks[0].get("metadata", {}).get("source", "unknown")
-    return [c for c in chunks if c.get("metadata", {}).get("source") == top_source]
+    best = chunks[0].get("metadata", {}).get("rerank_score")
+    if best is None:
+        top_source = chunks[0].get("metadata", {}).get("source", "unknown")
+        return [c for c in chunks if c.get("metadata", {}).get("source") == top_source]
+    # Rerank scores are sigmoid outputs in (0, 1), so the cut-off is a plain fraction of the best
+    threshold = ratio * best
+    relevant = []
+    for c in chunks:
+        # Reranked chunks are sorted best-first, so the first miss ends the scan
+        if c.get("metadata", {}).get("rerank_score", float("-inf")) < threshold:
+            break
+        relevant.append(c)
+    return relevant
 
 
 def citation_node(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -49,7 +56,6 @@ def citation_node(state: Dict[str, Any]) -> Dict[str, Any]:
     final = answer
 
     return {
-        **state,
         "citations": citations,
         "final_response": final,
     }
@@ -1,117 +1,203 @@
 """Generation Agent - Uses LLM (Gemini/Ollama) to generate answer from context."""
 
-from typing import Any, Dict
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import Runnable
 
 # Import centralized LLM provider with fallback
-from llm_provider import get_llm
+from llm_provider import LLM_MAX_CONCURRENCY, ainvoke_with_limits, get_llm
 
+logger = logging.getLogger(__name__)
 
-def _format_context(chunks: list) -> str:
+
+_SYSTEM_WEB = (
+    "You are an expert assistant. Provide clear, accurate answers based on the web search results provided.\n\n"
+    "Critical rules:\n"
+    "1. OUTPUT FORMAT: Write in plain text only. Do NOT use markdown (no #, ##, ###, *, **, bullet points, or headers). Use natural paragraphs and sentences instead.\n"
+    "2. ANSWER DIRECTLY: Use the information from the web search results to answer comprehensively.\n"
+    "3. TONE: Answer directly and naturally. Don't mention 'the search results' or 'according to'.\n"
+    "4. ACCURACY: Provide factual, informative answers based on the search results.\n"
+    "5. STRUCTURE: Use clear paragraphs.\n"
+    "Provide focused, professional responses in plain text."
+)
+
+_SYSTEM_KB = (
+    "You are an expert assistant. Provide clear, accurate answers based solely on the provided context.\n\n"
+    "Critical rules:\n"
+    "1. OUTPUT FORMAT: Write in plain text only. Do NOT use markdown (no #, ##, ###, *, **, bullet points, or headers). Use natural paragraphs and sentences instead.\n"
+    "2. CONTEXT RELEVANCE: Use ONLY passages that directly answer the user's question. If a passage is about a different topic or document (e.g., unrelated guides, manuals), IGNORE it completely. Do not mention, footnote, or acknowledge irrelevant passages.\n"
+    "3. TONE: Answer directly. Never mention 'the documents', 'the context', or 'the provided information'.\n"
+    "4. ACCURACY: Base your answer strictly on the most relevant context. If information is insufficient, state what's missing briefly.\n"
+    "5. STRUCTURE: Use clear paragraphs. Avoid lists unless the content is inherently a short enumeration (e.g., line items).\n"
+    "Provide focused, professional responses in plain text."
+)
+
+_HUMAN = (
+    "Context (each passage is from a document; use only passages relevant to the question):\n\n{context}\n\n"
+    "---\n\n"
+    "User Question: {query}\n\n"
+    "---\n\n"
+    "Instructions:\n"
+    "- Answer using ONLY context that directly relates to the question. Ignore unrelated passages.\n"
+    "- Write in plain text (no markdown: no #, *, **, or bullet formatting).\n"
+    "- Be thorough but focused. Do not add notes about irrelevant documents.\n\n"
+    "Your answer:"
+)
+
+
+def _build_prompt(system: str) -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages([
+        ("system", system),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("human", _HUMAN),
+    ])
+
+
+# Prompts and parser are built once at import; the chains are completed on
+# first use so importing this module doesn't require an LLM provider.
+_PROMPT_WEB = _build_prompt(_SYSTEM_WEB)
+_PROMPT_KB = _build_prompt(_SYSTEM_KB)
+_PARSER = StrOutputParser()
+_CHAIN_WEB: Optional[Runnable] = None
+_CHAIN_KB: Optional[Runnable] = None
+
+
+def _get_chain(used_web_search: bool) -> Runnable:
+    """Return the generation chain for the answer source, sharing one LLM client."""
+    global _CHAIN_WEB, _CHAIN_KB
+    if _CHAIN_KB is None:
+        llm = get_llm(temperature=0.4, max_tokens=2048)
+        _CHAIN_WEB = _PROMPT_WEB | llm | _PARSER
+        _CHAIN_KB = _PROMPT_KB | llm | _PARSER
+    return _CHAIN_WEB if used_web_search else _CHAIN_KB
+
+
+# Conversation-history role -> message class; other roles are dropped
+_MSG_CTORS = {"user": HumanMessage, "assistant": AIMessage}
+
+
+def _format_context(chunks: list, max_chars_per_chunk: int = 1200, max_total_chars: int = 8000) -> str:
+    """Format chunks for the prompt, truncating long passages and dropping trailing ones past the budget."""
     out = []
+    total = 0
     for i, c in enumerate(chunks, 1):
         content = c.get("content", "") if isinstance(c, dict) else str(c)
+        # Truncate long passages
+        if len(content) > max_chars_per_chunk:
+            content = content[:max_chars_per_chunk] + "..."
         meta = c.get("metadata", {}) if isinstance(c, dict) else {}
         src = meta.get("source", "unknown")
         page = meta.get("page", "?")
-        out.append(f"[{i}] (Source: {src}, Page {page})\n{content}")
+        passage = f"[{i}] (Source: {src}, Page {page})\n{content}"
+        # Chunks arrive best-first, so always keep the first and drop the tail once over budget
+        if out and total + len(passage) > max_total_chars:
+            logger.debug("[Generation] Context budget reached, dropping %d trailing chunks", len(chunks) - i + 1)
+            break
+        out.append(passage)
+        total += len(passage)
     return "\n\n---\n\n".join(out)
 
 
-def generation_node(state: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Generation Agent: Uses Gemini to generate answer from reranked chunks and conversation history.
-    """
+def _prepare(state: Dict[str, Any]) -> Tuple[bool, Dict[str, Any]]:
+    """Pick the answer source for a state and build the generation chain input."""
     query = state.get("query", "")
     history = state.get("conversation_history", [])
-    
-    # Check if web search was used
-    used_web_search = state.get("needs_web_search", False) and state.get("relevance_score", 10) < 5
-    
+
+    # Web results are only in the state once a web search actually ran; deciding from the
+    # 0-10 relevance score could answer from KB chunks the re-ranker just judged irrelevant
+    used_web_search = state.get("web_search_attempted", False)
+
     # If web search was triggered, use retrieved_chunks (which contain web results)
     # Otherwise use reranked_chunks (which are reranked document chunks)
     if used_web_search:
         chunks = state.get("retrieved_chunks", [])
-        print(f"[Generation] Using web search results ({len(chunks)} chunks)")
+        logger.debug("[Generation] Using web search results (%d chunks)", len(chunks))
     else:
         chunks = state.get("reranked_chunks", [])
-        print(f"[Generation] Using knowledge base documents ({len(chunks)} chunks)")
+        logger.debug("[Generation] Using knowledge base documents (%d chunks)", len(chunks))
 
     context = _format_context(chunks) if chunks else "No relevant information found."
 
-    # Update system prompt based on source
-    # Define prompt template
-    if used_web_search:
-        system = (
-            "You are an expert assistant. Provide clear, accurate answers based on the web search results provided.\n\n"
-            "Critical rules:\n"
-            "1. OUTPUT FORMAT: Write in plain text only. Do NOT use markdown (no #, ##, ###, *, **, bullet points, or headers). Use natural paragraphs and sentences instead.\n"
-            "2. ANSWER DIRECTLY: Use the information from the web search results to answer comprehensively.\n"
-            "3. TONE: Answer directly and naturally. Don't mention 'the search results' or 'according to'.\n"
-            "4. ACCURACY: Provide factual, informative answers based on the search results.\n"
-            "5. STRUCTURE: Use clear paragraphs.\n"
-            "Provide focused, professional responses in plain text."
-        )
-    else:
-        system = (
-            "You are an expert assistant. Provide clear, accurate answers based solely on the provided context.\n\n"
-            "Critical rules:\n"
-            "1. OUTPUT FORMAT: Write in plain text only. Do NOT use markdown (no #, ##, ###, *, **, bullet points, or headers). Use natural paragraphs and sentences instead.\n"
-            "2. CONTEXT RELEVANCE: Use ONLY passages that directly answer the user's question. If a passage is about a different topic or document (e.g., unrelated guides, manuals), IGNORE it completely. Do not mention, footnote, or acknowledge irrelevant passages.\n"
-            "3. TONE: Answer directly. Never mention 'the documents', 'the context', or 'the provided information'.\n"
-            "4. ACCURACY: Base your answer strictly on the most relevant context. If information is insufficient, state what's missing briefly.\n"
-            "5. STRUCTURE: Use clear paragraphs. Avoid lists unless the content is inherently a short enumeration (e.g., line items).\n"
-            "Provide focused, professional responses in plain text."
-        )
-
-    # Use LCEL with ChatPromptTemplate
-    from langchain_core.output_parsers import StrOutputParser
-    from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-
     # Convert history to BaseMessage objects if they aren't already
-    chat_history = []
-    for h in history[-6:]:
-        role = h.get("role", "")
-        content = h.get("content", "")
-        if role == "user":
-            chat_history.append(HumanMessage(content=content))
-        elif role == "assistant":
-            chat_history.append(AIMessage(content=content))
-
-    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-
-    prompt_template = ChatPromptTemplate.from_messages([
-        ("system", system),
-        MessagesPlaceholder(variable_name="chat_history"),
-        ("human", 
-         "Context (each passage is from a document; use only passages relevant to the question):\n\n{context}\n\n"
-         "---\n\n"
-         "User Question: {query}\n\n"
-         "---\n\n"
-         "Instructions:\n"
-         "- Answer using ONLY context that directly relates to the question. Ignore unrelated passages.\n"
-         "- Write in plain text (no markdown: no #, *, **, or bullet formatting).\n"
-         "- Be thorough but focused. Do not add notes about irrelevant documents.\n\n"
-         "Your answer:")
-    ])
+    chat_history = [
+        _MSG_CTORS[h["role"]](content=h.get("content", ""))
+        for h in history[-6:]
+        if h.get("role") in _MSG_CTORS
+    ]
+
+    return used_web_search, {
+        "chat_history": chat_history,
+        "context": context,
+        "query": query
+    }
+
+
+def _error_state(e: BaseException) -> Dict[str, Any]:
+    return {
+        "generated_answer": f"Error generating answer: {e}",
+        "error": str(e),
+    }
+
+
+async def generation_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Generation Agent: Uses Gemini to generate answer from reranked chunks and conversation history.
+    Async so the event loop stays free while the LLM call is in flight.
+    """
+    used_web_search, inputs = _prepare(state)
 
     try:
-        llm = get_llm(temperature=0.4, max_tokens=2048)
-        chain = prompt_template | llm | StrOutputParser()
-        
-        answer = chain.invoke({
-            "chat_history": chat_history,
-            "context": context,
-            "query": query
-        })
-            
-        return {**state, "generated_answer": answer}
+        chain = _get_chain(used_web_search)
+        answer = await ainvoke_with_limits(chain, inputs)
+        return {"generated_answer": answer}
     except Exception as e:
-        return {
-            **state,
-            "generated_answer": f"Error generating answer: {e}",
-            "error": str(e),
-        }
+        return _error_state(e)
+
+
+async def generation_stream(state: Dict[str, Any]) -> AsyncIterator[str]:
+    """
+    Stream the answer for a prepared state token by token, so the first words reach
+    the user before the LLM has finished. Errors are yielded as text, like generation_node.
+    """
+    used_web_search, inputs = _prepare(state)
+
+    try:
+        chain = _get_chain(used_web_search)
+        async for token in chain.astream(inputs):
+            yield token
+    except Exception as e:
+        yield _error_state(e)["generated_answer"]
+
+
+async def generation_node_batch(states: List[Dict[str, Any]], max_concurrency: int = LLM_MAX_CONCURRENCY) -> List[Dict[str, Any]]:
+    """
+    Generate answers for several states with one ``abatch`` call per answer source.
+    Used for evaluation runs and conversation replay, where many queries are known up front.
+    """
+    prepared = [_prepare(state) for state in states]
+    results: List[Dict[str, Any]] = list(states)
+
+    for used_web_search in (False, True):
+        indices = [i for i, (web, _) in enumerate(prepared) if web == used_web_search]
+        if not indices:
+            continue
+        try:
+            chain = _get_chain(used_web_search)
+            answers = await chain.abatch(
+                [prepared[i][1] for i in indices],
+                config={"max_concurrency": max_concurrency},
+                return_exceptions=True,
+            )
+        except Exception as e:
+            answers = [e] * len(indices)
+        for i, answer in zip(indices, answers):
+            if isinstance(answer, Exception):
+                results[i] = {**states[i], **_error_state(answer)}
+            else:
+                results[i] = {**states[i], "generated_answer": answer}
 
+    return results
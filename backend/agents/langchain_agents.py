@@ -1,42 +1,109 @@
 """Proper LangChain Agent implementations for the RAG system."""
 
-from typing import Any, Dict, List, Optional, Sequence
+import logging
+import re
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.tools import BaseTool
-from langchain_core.output_parsers import JsonOutputParser, StrOutputParser
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import Runnable, RunnablePassthrough
 from pydantic import BaseModel, Field
 
-from llm_provider import get_llm
+from llm_provider import LLM_MAX_CONCURRENCY, ainvoke_with_limits, get_llm, get_structured_llm
+
+logger = logging.getLogger(__name__)
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset({
+    "a", "an", "the", "and", "or", "but", "of", "to", "in", "on", "at", "for", "from", "by", "with",
+    "about", "is", "are", "was", "were", "be", "been", "do", "does", "did", "have", "has", "had",
+    "what", "which", "who", "whom", "when", "where", "why", "how", "this", "that", "these", "those",
+    "it", "its", "i", "me", "my", "we", "our", "you", "your", "can", "could", "should", "would",
+    "will", "tell", "explain", "describe", "give", "please", "any", "some", "there",
+})
+
+
+def query_terms(query: str) -> Set[str]:
+    """The query's lowercased content words (stopwords removed)."""
+    return {t for t in _TOKEN_RE.findall(query.lower()) if t not in _STOPWORDS}
+
+
+def lexical_overlap(query: str, chunks: list, max_chunks: int = 3) -> Tuple[float, int]:
+    """
+    Cheap relevance signal: fraction of the query's content words found in the top chunks.
+    Returns (score in 0.0-1.0, number of content words in the query).
+    """
+    terms = query_terms(query)
+    if not terms:
+        return 0.0, 0
+    passage_tokens = set()
+    for c in chunks[:max_chunks]:
+        content = c.get("content", "") if isinstance(c, dict) else str(c)
+        passage_tokens.update(_TOKEN_RE.findall(content.lower()))
+    return len(terms & passage_tokens) / len(terms), len(terms)
+
+
+# Output schemas for the structured agents (defined once, shared by every agent instance)
+class QueryAnalysisSchema(BaseModel):
+    query_intent: str = Field(description="Clear, concise description of user intent")
+    query_entities: List[str] = Field(description="List of key entities, terms, and time references")
+    query_type: str = Field(description="Type of query: factual, conceptual, comparison, procedural, analytical, exploratory, or other")
+
+
+class RelevanceResponseSchema(BaseModel):
+    relevance_score: int = Field(description="Relevance score from 0 to 10")
+    reasoning: str = Field(description="Brief explanation for the score")
+
+
+class QueryAndRelevanceSchema(BaseModel):
+    query_intent: str = Field(description="Clear, concise description of user intent")
+    query_entities: List[str] = Field(description="List of key entities, terms, and time references")
+    query_type: str = Field(description="Type of query: factual, conceptual, comparison, procedural, analytical, exploratory, or other")
+    relevance_score: int = Field(description="Relevance score from 0 to 10")
+    reasoning: str = Field(description="Brief explanation for the score")
 
 
 class QueryAnalysisAgent:
     """LangChain Agent for query analysis with structured output."""
     
     def __init__(self, temperature: float = 0.0, max_tokens: int = 512):
-        self.llm = get_llm(temperature=temperature, max_tokens=max_tokens)
-        self.parser = JsonOutputParser()
-        
-        # Define the output schema
-        class QueryAnalysisSchema(BaseModel):
-            query_intent: str = Field(description="Clear, concise description of user intent")
-            query_entities: List[str] = Field(description="List of key entities, terms, and time references")
-            query_type: str = Field(description="Type of query: factual, conceptual, comparison, procedural, analytical, exploratory, or other")
-        
-        self.parser = JsonOutputParser(pydantic_object=QueryAnalysisSchema)
+        # Native structured output: the provider returns schema fields, no JSON parsing step
+        self.llm = get_structured_llm(QueryAnalysisSchema, temperature=temperature, max_tokens=max_tokens)
         
         # Create the prompt
         self.prompt = ChatPromptTemplate.from_messages([
             ("system", 
-             "You are an expert query analyst. Analyze the user's query deeply to extract intent, entities, and type.\n\n"
-             "{format_instructions}"),
+             "You are an expert query analyst. Analyze the user's query deeply to extract intent, entities, and type."),
             ("human", "{query}"),
         ])
         
         # Create the chain
-        self.chain = self.prompt | self.llm | self.parser
+        self.chain = self.prompt | self.llm
     
+    def _chain_input(self, query: str) -> Dict[str, Any]:
+        return {"query": query}
+
+    def _apply_response(self, state: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            **state,
+            "query_intent": response.get("query_intent", ""),
+            "query_entities": response.get("query_entities", []),
+            "query_type": response.get("query_type", "factual"),
+        }
+
+    def _apply_error(self, state: Dict[str, Any], query: str, e: Exception) -> Dict[str, Any]:
+        print(f"[Query Analysis Agent] Error: {e}")
+        return {
+            **state,
+            "query_intent": query[:50],
+            "query_entities": [],
+            "query_type": "factual",
+            "error": str(e),
+        }
+
     def invoke(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Execute the query analysis agent."""
         query = state.get("query", "")
@@ -44,41 +111,54 @@ class QueryAnalysisAgent:
             return state
         
         try:
-            response = self.chain.invoke({
-                "query": query,
-                "format_instructions": self.parser.get_format_instructions()
-            })
-            
-            return {
-                **state,
-                "query_intent": response.get("query_intent", ""),
-                "query_entities": response.get("query_entities", []),
-                "query_type": response.get("query_type", "factual"),
-            }
-            
+            response = self.chain.invoke(self._chain_input(query))
+            return self._apply_response(state, response)
         except Exception as e:
-            print(f"[Query Analysis Agent] Error: {e}")
-            return {
-                **state,
-                "query_intent": query[:50],
-                "query_entities": [],
-                "query_type": "factual",
-                "error": str(e),
-            }
+            return self._apply_error(state, query, e)
+
+    async def ainvoke(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute the query analysis agent without blocking the event loop."""
+        query = state.get("query", "")
+        if not query:
+            return state
+        
+        try:
+            response = await ainvoke_with_limits(self.chain, self._chain_input(query))
+            return self._apply_response(state, response)
+        except Exception as e:
+            return self._apply_error(state, query, e)
+
+    async def abatch(self, states: List[Dict[str, Any]], max_concurrency: int = LLM_MAX_CONCURRENCY) -> List[Dict[str, Any]]:
+        """Analyse several queries with a single batched chain call."""
+        results = list(states)
+        pending = [i for i, state in enumerate(states) if state.get("query")]
+        if not pending:
+            return results
+        
+        responses = await self.chain.abatch(
+            [self._chain_input(states[i]["query"]) for i in pending],
+            config={"max_concurrency": max_concurrency},
+            return_exceptions=True,
+        )
+        for i, response in zip(pending, responses):
+            if isinstance(response, Exception):
+                results[i] = self._apply_error(states[i], states[i]["query"], response)
+            else:
+                results[i] = self._apply_response(states[i], response)
+        return results
 
 
 class RelevanceCheckAgent:
     """LangChain Agent for relevance checking with structured output."""
     
-    def __init__(self, temperature: float = 0.0, max_tokens: int = 256):
-        self.llm = get_llm(temperature=temperature, max_tokens=max_tokens)
+    def __init__(self, temperature: float = 0.0, max_tokens: int = 256,
+                 lexical_high: float = 0.8, lexical_low: float = 0.0, lexical_min_terms: int = 3):
+        # Lexical pre-filter: only ambiguous overlap scores go to the LLM
+        self.lexical_high = lexical_high
+        self.lexical_low = lexical_low
+        self.lexical_min_terms = lexical_min_terms
         
-        # Define the output schema
-        class RelevanceResponseSchema(BaseModel):
-            relevance_score: int = Field(description="Relevance score from 0 to 10")
-            reasoning: str = Field(description="Brief explanation for the score")
-        
-        self.parser = JsonOutputParser(pydantic_object=RelevanceResponseSchema)
+        self.llm = get_structured_llm(RelevanceResponseSchema, temperature=temperature, max_tokens=max_tokens)
         
         # Create the prompt
         system_msg = (
@@ -89,8 +169,7 @@ class RelevanceCheckAgent:
             "- 4-6: Partially relevant (related domain but doesn't directly answer the question)\n"
             "- 7-10: Highly relevant (directly answers or provides needed information)\n\n"
             "Be strict: If the passages are about a completely different topic (e.g., query is about 'General Motors' "
-            "but passages are about 'fraud analysis'), score should be 0-2.\n\n"
-            "{format_instructions}"
+            "but passages are about 'fraud analysis'), score should be 0-2."
         )
         
         self.prompt = ChatPromptTemplate.from_messages([
@@ -102,7 +181,7 @@ class RelevanceCheckAgent:
         ])
         
         # Create the chain
-        self.chain = self.prompt | self.llm | self.parser
+        self.chain = self.prompt | self.llm
     
     def _format_passages(self, chunks: list, max_chunks: int = 3) -> str:
         """Format top chunks for relevance evaluation."""
@@ -117,17 +196,17 @@ class RelevanceCheckAgent:
             out.append(f"[Passage {i}] (Source: {src})\n{content}")
         return "\n\n".join(out)
     
-    def invoke(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute the relevance check agent."""
+    def _precheck(self, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Decide relevance without the LLM where possible; None means the LLM must score it."""
         query = state.get("query", "")
         chunks = state.get("reranked_chunks", [])
         
-        print(f"[Relevance Check Agent] Starting check for query: {query}")
-        print(f"[Relevance Check Agent] Number of chunks: {len(chunks)}")
+        logger.debug("[Relevance Check Agent] Starting check for query: %s", query)
+        logger.debug("[Relevance Check Agent] Number of chunks: %d", len(chunks))
         
         # If no chunks retrieved, definitely need web search
         if not chunks:
-            print("[Relevance Check Agent] No chunks found, triggering web search")
+            logger.debug("[Relevance Check Agent] No chunks found, triggering web search")
             return {
                 **state,
                 "relevance_score": 0,
@@ -137,51 +216,165 @@ class RelevanceCheckAgent:
         
         # If already flagged for web search (time-sensitive), skip relevance check
         if state.get("needs_web_search"):
-            print("[Relevance Check Agent] Already flagged for web search, skipping check")
+            logger.debug("[Relevance Check Agent] Already flagged for web search, skipping check")
             return {
                 **state,
                 "relevance_score": 10,  # Don't override web search decision
                 "relevance_reasoning": "Time-sensitive query, using web search",
             }
         
-        print("[Relevance Check Agent] Running LLM-based relevance evaluation...")
-        passages = self._format_passages(chunks, max_chunks=3)
-        
-        try:
-            response = self.chain.invoke({
-                "query": query,
-                "passages": passages,
-                "format_instructions": self.parser.get_format_instructions()
-            })
-            
-            print(f"[Relevance Check Agent] LLM Response: {response}")
-            
-            score = response.get("relevance_score", 5)
-            reasoning = response.get("reasoning", "")
-            
-            # Determine if web search is needed (threshold: score < 5)
-            needs_web_search = score < 5
-            
-            print(f"[Relevance Check Agent] Score: {score}/10 | Web Search: {needs_web_search}")
-            print(f"[Relevance Check Agent] Reasoning: {reasoning}")
-            
+        overlap, n_terms = lexical_overlap(query, chunks)
+        if n_terms and overlap >= self.lexical_high:
+            logger.debug("[Relevance Check Agent] Lexical overlap %.2f, skipping LLM check", overlap)
             return {
                 **state,
-                "relevance_score": score,
-                "relevance_reasoning": reasoning,
-                "needs_web_search": needs_web_search,
+                "relevance_score": 9,
+                "relevance_reasoning": f"Query terms found in top passages (overlap {overlap:.2f})",
+                "needs_web_search": False,
             }
-            
-        except Exception as e:
-            print(f"[Relevance Check Agent] Error: {e}")
-            # On error, assume documents might be relevant (don't trigger web search)
+        if n_terms >= self.lexical_min_terms and overlap <= self.lexical_low:
+            logger.debug("[Relevance Check Agent] Lexical overlap %.2f, triggering web search", overlap)
             return {
                 **state,
-                "relevance_score": 5,
-                "relevance_reasoning": f"Error during relevance check: {e}",
-                "needs_web_search": False,
-                "error": str(e),
+                "relevance_score": 1,
+                "relevance_reasoning": f"No query terms found in top passages (overlap {overlap:.2f})",
+                "needs_web_search": True,
             }
+        return None
+
+    def _chain_input(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        logger.debug("[Relevance Check Agent] Running LLM-based relevance evaluation...")
+        return {
+            "query": state.get("query", ""),
+            "passages": self._format_passages(state.get("reranked_chunks", []), max_chunks=3),
+        }
+
+    def _apply_response(self, state: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+        logger.debug("[Relevance Check Agent] LLM Response: %s", response)
+        
+        score = response.get("relevance_score", 5)
+        reasoning = response.get("reasoning", "")
+        
+        # Determine if web search is needed (threshold: score < 5)
+        needs_web_search = score < 5
+        
+        logger.debug("[Relevance Check Agent] Score: %s/10 | Web Search: %s", score, needs_web_search)
+        logger.debug("[Relevance Check Agent] Reasoning: %s", reasoning)
+        
+        return {
+            **state,
+            "relevance_score": score,
+            "relevance_reasoning": reasoning,
+            "needs_web_search": needs_web_search,
+        }
+
+    def _apply_error(self, state: Dict[str, Any], e: Exception) -> Dict[str, Any]:
+        logger.warning("[Relevance Check Agent] Error: %s", e)
+        # On error, assume documents might be relevant (don't trigger web search)
+        return {
+            **state,
+            "relevance_score": 5,
+            "relevance_reasoning": f"Error during relevance check: {e}",
+            "needs_web_search": False,
+            "error": str(e),
+        }
+
+    def invoke(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute the relevance check agent."""
+        decided = self._precheck(state)
+        if decided is not None:
+            return decided
+        
+        try:
+            response = self.chain.invoke(self._chain_input(state))
+            return self._apply_response(state, response)
+        except Exception as e:
+            return self._apply_error(state, e)
+
+    async def ainvoke(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute the relevance check agent without blocking the event loop."""
+        decided = self._precheck(state)
+        if decided is not None:
+            return decided
+        
+        try:
+            response = await ainvoke_with_limits(self.chain, self._chain_input(state))
+            return self._apply_response(state, response)
+        except Exception as e:
+            return self._apply_error(state, e)
+
+
+class QueryAndRelevanceAgent(RelevanceCheckAgent):
+    """
+    LangChain Agent that analyses the query and scores the retrieved passages in one LLM call.
+    Runs after retrieval/reranking; when the relevance pre-check already decides the route,
+    only the query analysis part is sent to the LLM.
+    """
+    
+    def __init__(self, temperature: float = 0.0, max_tokens: int = 512,
+                 lexical_high: float = 0.8, lexical_low: float = 0.0, lexical_min_terms: int = 3):
+        # Lexical pre-filter (shared with RelevanceCheckAgent._precheck)
+        self.lexical_high = lexical_high
+        self.lexical_low = lexical_low
+        self.lexical_min_terms = lexical_min_terms
+        self.analysis = QueryAnalysisAgent(temperature=temperature, max_tokens=max_tokens)
+        
+        self.llm = get_structured_llm(QueryAndRelevanceSchema, temperature=temperature, max_tokens=max_tokens)
+        
+        # Create the prompt
+        system_msg = (
+            "You are an expert query analyst and relevance evaluator. Do both tasks in one response.\n\n"
+            "Task 1 - Analyze the user's query deeply to extract intent, entities, and type.\n\n"
+            "Task 2 - Determine if the retrieved document passages contain information that can answer the query.\n"
+            "Rate relevance from 0-10:\n"
+            "- 0-3: Completely irrelevant (different topic entirely, cannot answer query)\n"
+            "- 4-6: Partially relevant (related domain but doesn't directly answer the question)\n"
+            "- 7-10: Highly relevant (directly answers or provides needed information)\n\n"
+            "Be strict: If the passages are about a completely different topic (e.g., query is about 'General Motors' "
+            "but passages are about 'fraud analysis'), score should be 0-2."
+        )
+        
+        self.prompt = ChatPromptTemplate.from_messages([
+            ("system", system_msg),
+            ("human", 
+             "User Query: {query}\n\n"
+             "Top Retrieved Passages:\n{passages}\n\n"
+             "Analyze the query and evaluate relevance.")
+        ])
+        
+        # Create the chain
+        self.chain = self.prompt | self.llm
+
+    def _apply_response(self, state: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+        return super()._apply_response(self.analysis._apply_response(state, response), response)
+
+    def _apply_error(self, state: Dict[str, Any], e: Exception) -> Dict[str, Any]:
+        query = state.get("query", "")
+        return super()._apply_error(self.analysis._apply_error(state, query, e), e)
+
+    def invoke(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute query analysis and relevance check with a single LLM call."""
+        decided = self._precheck(state)
+        if decided is not None:
+            return self.analysis.invoke(decided)
+        
+        try:
+            response = self.chain.invoke(self._chain_input(state))
+            return self._apply_response(state, response)
+        except Exception as e:
+            return self._apply_error(state, e)
+
+    async def ainvoke(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute query analysis and relevance check with a single LLM call, asynchronously."""
+        decided = self._precheck(state)
+        if decided is not None:
+            return await self.analysis.ainvoke(decided)
+        
+        try:
+            response = await ainvoke_with_limits(self.chain, self._chain_input(state))
+            return self._apply_response(state, response)
+        except Exception as e:
+            return self._apply_error(state, e)
 
 
 class ToolUsingChain:
@@ -213,6 +406,24 @@ class ToolUsingChain:
             print(f"[ToolUsingChain] Error: {e}")
             return f"Error executing chain: {str(e)}"
 
+    async def ainvoke(self, input_text: str, chat_history: Optional[List[BaseMessage]] = None) -> str:
+        """Execute the tool-using chain without blocking the event loop."""
+        try:
+            return await self.chain.ainvoke({
+                "input": input_text,
+                "chat_history": chat_history or []
+            })
+        except Exception as e:
+            print(f"[ToolUsingChain] Error: {e}")
+            return f"Error executing chain: {str(e)}"
+
+
+def _format_docs(docs) -> str:
+    """Join retrieved documents (a list or any iterator of Documents) into a context string for RAGAgent."""
+    if isinstance(docs, str):
+        return docs
+    return "\n\n".join([doc.page_content for doc in docs])
+
 
 class RAGAgent:
     """A specialized RAG agent that combines retrieval and generation."""
@@ -221,25 +432,17 @@ class RAGAgent:
         self.llm = get_llm(temperature=temperature, max_tokens=max_tokens)
         self.retriever = retriever
         
-        # Create RAG prompt
+        # Create RAG prompt; per-turn context sits after the constant system prompt and history
         self.prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are a helpful assistant. Answer the user's question based on the context below.\n\nContext:\n{context}"),
+            ("system", "You are a helpful assistant. Answer the user's question based on the context in their message."),
             MessagesPlaceholder(variable_name="chat_history", optional=True),
-            ("human", "{query}")
+            ("human", "Context:\n{context}\n\nQuestion: {query}")
         ])
         
         # Create the chain
-        from langchain_core.output_parsers import StrOutputParser
-        from operator import itemgetter
-        
-        def format_docs(docs):
-            if isinstance(docs, list):
-                return "\n\n".join(doc.page_content for doc in docs)
-            return str(docs)
-        
         self.chain = (
             {
-                "context": itemgetter("query") | self.retriever | format_docs,
+                "context": itemgetter("query") | self.retriever | _format_docs,
                 "query": itemgetter("query"),
                 "chat_history": itemgetter("chat_history"),
             }
@@ -260,6 +463,17 @@ class RAGAgent:
             print(f"[RAGAgent] Error: {e}")
             return f"Error generating response: {str(e)}"
 
+    async def ainvoke(self, query: str, chat_history: Optional[List[BaseMessage]] = None) -> str:
+        """Execute the RAG agent without blocking the event loop."""
+        try:
+            return await self.chain.ainvoke({
+                "query": query,
+                "chat_history": chat_history or []
+            })
+        except Exception as e:
+            print(f"[RAGAgent] Error: {e}")
+            return f"Error generating response: {str(e)}"
+
 
 # Factory functions for easy agent creation
 def create_query_analysis_agent(temperature: float = 0.0, max_tokens: int = 512) -> QueryAnalysisAgent:
@@ -267,9 +481,18 @@ def create_query_analysis_agent(temperature: float = 0.0, max_tokens: int = 512)
     return QueryAnalysisAgent(temperature=temperature, max_tokens=max_tokens)
 
 
-def create_relevance_check_agent(temperature: float = 0.0, max_tokens: int = 256) -> RelevanceCheckAgent:
+def create_relevance_check_agent(temperature: float = 0.0, max_tokens: int = 256,
+                                 lexical_high: float = 0.8, lexical_low: float = 0.0) -> RelevanceCheckAgent:
     """Create a relevance check agent."""
-    return RelevanceCheckAgent(temperature=temperature, max_tokens=max_tokens)
+    return RelevanceCheckAgent(temperature=temperature, max_tokens=max_tokens,
+                               lexical_high=lexical_high, lexical_low=lexical_low)
+
+
+def create_query_and_relevance_agent(temperature: float = 0.0, max_tokens: int = 512,
+                                     lexical_high: float = 0.8, lexical_low: float = 0.0) -> QueryAndRelevanceAgent:
+    """Create a combined query analysis and relevance check agent."""
+    return QueryAndRelevanceAgent(temperature=temperature, max_tokens=max_tokens,
+                                  lexical_high=lexical_high, lexical_low=lexical_low)
 
 
 def create_tool_using_chain(tools: List[BaseTool], system_prompt: str, 
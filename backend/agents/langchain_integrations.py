@@ -1,5 +1,7 @@
 
-from typing import Optional, List, Any, Dict
+import hashlib
+from collections import OrderedDict
+from typing import Optional, List, Any, Dict, Iterable, Iterator
 from langchain_core.runnables import Runnable, RunnableLambda, RunnablePassthrough
 from langchain_core.documents import Document
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
@@ -7,6 +9,7 @@ from langchain_core.tools import Tool
 
 # Import LLM provider
 from llm_provider import get_llm
+from semantic_cache import SemanticCache
 from agents.reranking import BAAIReranker
 from agents.generation import _format_context
 
@@ -14,24 +17,61 @@ from agents.generation import _format_context
 class HybridRetriever(Runnable):
     """
     LangChain Retriever wrapper for VectorDBMCPServer hybrid search.
+    Given an embedder, near-duplicate queries (cosine >= cache_threshold) reuse the
+    chunks of an earlier search; call clear_cache() whenever the knowledge base changes.
     """
-    def __init__(self, vector_db_mcp, web_search_mcp=None, top_k=15, use_web_fallback=True):
+    def __init__(self, vector_db_mcp, web_search_mcp=None, top_k=15, use_web_fallback=True,
+                 embedder=None, cache_threshold: float = 0.95, cache_size: int = 256):
         self.vector_db_mcp = vector_db_mcp
         self.web_search_mcp = web_search_mcp
         self.top_k = top_k
         self.use_web_fallback = use_web_fallback
+        self.embedder = embedder
+        self._cache = SemanticCache(threshold=cache_threshold, max_entries=cache_size) if embedder else None
+
+    def clear_cache(self) -> None:
+        if self._cache is not None:
+            self._cache.clear()
 
     def invoke(self, query: str, config: Optional[Any] = None) -> List[Document]:
-        # 1. Vector/Hybrid Search
-        docs = []
-        resp = self.vector_db_mcp.call("hybrid_search", query=query, top_k=self.top_k)
-        if resp.success and resp.result:
-            for chunk in resp.result.get("chunks", []):
-                docs.append(Document(
-                    page_content=chunk.get("content", ""),
-                    metadata=chunk.get("metadata", {})
-                ))
-        return docs
+        return list(self.iter_documents(query))
+
+    async def ainvoke(self, query: str, config: Optional[Any] = None, **kwargs) -> List[Document]:
+        """Async retrieval via acall, so the vector and BM25 legs run concurrently."""
+        embedding = None
+        if self._cache is not None:
+            embedding = await self.embedder.aembed_query(query)
+            hit = self._cache.lookup(embedding)
+            if hit:
+                return list(_to_documents(hit["chunks"]))
+        resp = await self.vector_db_mcp.acall(
+            "hybrid_search", query=query, top_k=self.top_k, query_embedding=embedding
+        )
+        return list(_to_documents(self._store(query, embedding, resp)))
+
+    def iter_documents(self, query: str) -> Iterator[Document]:
+        """Yield Documents one at a time, for consumers that only need a single pass."""
+        embedding = None
+        if self._cache is not None:
+            embedding = self.embedder.embed_query(query)
+            hit = self._cache.lookup(embedding)
+            if hit:
+                yield from _to_documents(hit["chunks"])
+                return
+        # 1. Vector/Hybrid Search (reusing the embedding computed for the cache lookup)
+        resp = self.vector_db_mcp.call("hybrid_search", query=query, top_k=self.top_k, query_embedding=embedding)
+        yield from _to_documents(self._store(query, embedding, resp))
+
+    def _store(self, query: str, embedding, resp) -> List[Dict[str, Any]]:
+        chunks = resp.result.get("chunks", []) if resp.success and resp.result else []
+        if embedding is not None and chunks:
+            self._cache.put(query, embedding, chunks=chunks)
+        return chunks
+
+
+def _to_documents(chunks: List[Dict[str, Any]]) -> Iterator[Document]:
+    for c in chunks:
+        yield Document(page_content=c.get("content", ""), metadata=c.get("metadata") or {})
 
 class LangChainMemoryAdapter:
     """
@@ -79,58 +119,118 @@ class LangChainMemoryAdapter:
 def create_memory(memory_key: str = "chat_history", return_messages: bool = True, k: int = 6, persist_path: str = None):
     return LangChainMemoryAdapter(memory_key, return_messages, k, persist_path)
 
+def _tool_output(resp) -> str:
+    if resp.success: return str(resp.result)
+    return "Error: " + str(resp.error)
+
 def create_tools(vector_db_mcp, web_search_mcp, doc_processing_mcp) -> List[Tool]:
     """Wrap MCP servers as LangChain Tools."""
     tools = []
     
     # Vector Search Tool
     def search_func(query: str):
-        resp = vector_db_mcp.call("hybrid_search", query=query)
-        if resp.success: return str(resp.result)
-        return "Error: " + str(resp.error)
+        return _tool_output(vector_db_mcp.call("hybrid_search", query=query))
+
+    async def asearch_func(query: str):
+        return _tool_output(await vector_db_mcp.acall("hybrid_search", query=query))
         
     tools.append(Tool(
         name="KnowledgeBaseSearch",
         func=search_func,
+        coroutine=asearch_func,
         description="Search stored documents for information."
     ))
     
     if web_search_mcp:
         def web_func(query: str):
-            resp = web_search_mcp.call("search", query=query)
-            if resp.success: return str(resp.result)
-            return "Error: " + str(resp.error)
+            return _tool_output(web_search_mcp.call("search", query=query))
+
+        async def aweb_func(query: str):
+            return _tool_output(await web_search_mcp.acall("search", query=query))
             
         tools.append(Tool(
             name="WebSearch",
             func=web_func,
+            coroutine=aweb_func,
             description="Search the live web for recent information."
         ))
 
     return tools
 
-def create_rag_chain(retriever, memory, reranker, temperature=0.4, max_tokens=2048) -> Runnable:
-    """Create a standard LangChain RAG pipeline."""
+# Formatted context by document fingerprint, so retries and regenerations skip re-templating
+_CONTEXT_CACHE_SIZE = 256
+_context_cache: "OrderedDict[bytes, str]" = OrderedDict()
+
+
+def _format_docs(docs: Iterable[Document]) -> str:
+    """
+    Format retrieved Documents with the same source/page layout as the graph's generation step.
+    Reads ``docs`` once, so a list or a generator (HybridRetriever.iter_documents) both work.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    chunks = []
+    for d in docs:
+        meta = d.metadata or {}
+        h.update(f"{meta.get('source', 'unknown')}\x00{meta.get('page', '?')}\x00".encode("utf-8"))
+        h.update(d.page_content.encode("utf-8"))
+        h.update(b"\x01")
+        chunks.append({"content": d.page_content, "metadata": meta})
+    key = h.digest()
+    context = _context_cache.get(key)
+    if context is not None:
+        _context_cache.move_to_end(key)
+        return context
+    context = _format_context(chunks)
+    _context_cache[key] = context
+    if len(_context_cache) > _CONTEXT_CACHE_SIZE:
+        _context_cache.popitem(last=False)
+    return context
+
+
+def _rerank_step(reranker, top_n: int) -> Runnable:
+    """
+    {"query", "docs"} -> the top_n docs by cross-encoder score. All candidates are scored
+    in one batched forward pass; async runs join the re-ranker's shared micro-batch.
+    """
+    def _chunks(x):
+        return [{"content": d.page_content, "metadata": d.metadata or {}} for d in x["docs"]]
+
+    def rerank(x) -> List[Document]:
+        return list(_to_documents(reranker.rerank(x["query"], _chunks(x), top_k=top_n)))
+
+    async def arerank(x) -> List[Document]:
+        return list(_to_documents(await reranker.rerank_async(x["query"], _chunks(x), top_k=top_n)))
+
+    return RunnableLambda(rerank, afunc=arerank)
+
+
+def create_rag_chain(retriever, memory, reranker, temperature=0.4, max_tokens=2048, rerank_top_n=10) -> Runnable:
+    """
+    Create a standard LangChain RAG pipeline. With a reranker, the retriever's candidates
+    are re-scored by the cross-encoder and only the best rerank_top_n reach the prompt.
+    """
     from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
     from langchain_core.output_parsers import StrOutputParser
     from operator import itemgetter
 
     llm = get_llm(temperature=temperature, max_tokens=max_tokens)
     
+    # Context goes in the last message, so the system prompt and history form a prefix
+    # that stays identical across turns and the provider's prompt cache can reuse it
     prompt = ChatPromptTemplate.from_messages([
-        ("system", "Answer the user's question based on the context below.\n\nContext:\n{context}"),
+        ("system", "Answer the user's question based on the context in their message."),
         MessagesPlaceholder(variable_name="chat_history"),
-        ("human", "{query}")
+        ("human", "Context:\n{context}\n\nQuestion: {query}")
     ])
 
-    def format_docs(docs):
-        chunks = [{"content": d.page_content, "metadata": d.metadata} for d in docs]
-        return _format_context(chunks)
+    retrieve = itemgetter("query") | retriever
+    if reranker is not None:
+        retrieve = {"query": itemgetter("query"), "docs": retrieve} | _rerank_step(reranker, rerank_top_n)
 
     # Retrieval chain
     chain = (
         {
-            "context": itemgetter("query") | retriever | RunnableLambda(format_docs),
+            "context": retrieve | RunnableLambda(_format_docs),
             "query": itemgetter("query"),
             "chat_history": itemgetter("chat_history"),
         }
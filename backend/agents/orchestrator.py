@@ -1,10 +1,22 @@
 """Orchestrator Agent - Routes and coordinates the RAG pipeline."""
 
+import re
 from typing import Any, Dict
 
 from .state import RAGState, rag_state_to_dict
 
 
+# Time-sensitive keywords that route a query to web search
+WEB_KEYWORDS = (
+    "today", "latest", "current", "news", "recent", "now", 
+    "2024", "2025", "2026", "this week", "this month", "this year",
+    "trending", "breaking", "update", "new"
+)
+# One precompiled, case-insensitive alternation matched on word boundaries, so that
+# "now" doesn't fire on "snowing" or "new" on "newspaper" and send the query to web search
+_WEB_KEYWORDS_RE = re.compile(r"\b(?:" + "|".join(re.escape(k) for k in WEB_KEYWORDS) + r")\b", re.IGNORECASE)
+
+
 def orchestrator_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     Orchestrator Agent: Receives query, validates, and determines routing.
@@ -13,22 +25,14 @@ def orchestrator_node(state: Dict[str, Any]) -> Dict[str, Any]:
     query = state.get("query", "").strip()
     if not query:
         return {
-            **state,
             "error": "Empty query",
             "final_response": "Please provide a non-empty question.",
         }
 
     # Detect if web search is needed
-    web_keywords = [
-        "today", "latest", "current", "news", "recent", "now", 
-        "2024", "2025", "2026", "this week", "this month", "this year",
-        "trending", "breaking", "update", "new"
-    ]
-    query_lower = query.lower()
-    needs_web_search = any(keyword in query_lower for keyword in web_keywords)
+    needs_web_search = _WEB_KEYWORDS_RE.search(query) is not None
 
     return {
-        **state,
         "query": query,
         "needs_web_search": needs_web_search,
         "error": None,
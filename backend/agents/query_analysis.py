@@ -2,16 +2,13 @@
 
 from typing import Any, Dict, List
 
-# Import the proper LangChain agent
-from .langchain_agents import create_query_analysis_agent
+# Shared LangChain agent wrapper (agent is built once, on first use)
+from .agent_wrapper import QUERY_ANALYSIS_WRAPPER, state_delta
 
 
 def query_analysis_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     Query Analysis Agent: Uses LangChain agent to analyze query intent, entities, and type.
     """
-    # Create the agent instance
-    agent = create_query_analysis_agent()
-    
-    # Execute the agent
-    return agent.invoke(state)
+    # Execute the shared agent
+    return state_delta(state, QUERY_ANALYSIS_WRAPPER.invoke(state))
@@ -3,8 +3,8 @@
 from typing import Any, Dict, List
 import json
 
-# Import the proper LangChain agent
-from .langchain_agents import create_relevance_check_agent
+# Shared LangChain agent wrapper (agent is built once, on first use)
+from .agent_wrapper import RELEVANCE_CHECK_WRAPPER, state_delta
 
 
 def relevance_checker_node(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -12,8 +12,5 @@ def relevance_checker_node(state: Dict[str, Any]) -> Dict[str, Any]:
     Relevance Checker Agent: Uses LangChain agent to evaluate if retrieved documents are relevant to the query.
     Returns relevance score (0-10) and determines if web search is needed.
     """
-    # Create the agent instance
-    agent = create_relevance_check_agent()
-    
-    # Execute the agent
-    return agent.invoke(state)
+    # Execute the shared agent
+    return state_delta(state, RELEVANCE_CHECK_WRAPPER.invoke(state))
@@ -1,13 +1,167 @@
 """Re-Ranking Agent - Re-ranks retrieved chunks using BAAI neural re-ranker."""
 
-from typing import Any, Dict, List
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import torch
 from sentence_transformers import CrossEncoder
 
+# Optional: INT8-quantized ONNX export of the re-ranker for CPU-only deployments
+try:
+    import onnxruntime as ort
+    from transformers import AutoTokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+
+# (query digest, chunk digest) -> score, shared across requests; oldest entries are evicted first
+_SCORE_CACHE_SIZE = 50_000
+_score_cache: "OrderedDict[Tuple[bytes, bytes], float]" = OrderedDict()
+_score_lock = threading.Lock()  # Sync rerank runs on worker threads, rerank_async on the event loop
+
+
+# chunk digest -> token ids (no special tokens); chunk text never changes once ingested
+_DOC_IDS_CACHE_SIZE = 20_000
+_doc_ids_cache: "OrderedDict[bytes, List[int]]" = OrderedDict()
+_doc_ids_lock = threading.Lock()  # Batched scoring runs on worker threads
+
+# How long an async rerank waits for other requests to join its cross-encoder batch
+RERANK_MAX_WAIT_MS = float(os.getenv("RERANK_MAX_WAIT_MS", "10"))
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+def _select_device() -> str:
+    """Pick the fastest available torch device for inference."""
+    if torch.cuda.is_available():
+        return "cuda"
+    if getattr(torch.backends, "mps", None) is not None and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+class MemmapEmbedding(torch.nn.Module):
+    """
+    Drop-in replacement for a token embedding layer that keeps the table in an on-disk
+    memmap and only the recently used rows in RAM. The XLM-R vocabulary (250k rows) is most
+    of bge-reranker-base's weights, but real queries touch a small fraction of it.
+    """
+    
+    def __init__(self, embedding: torch.nn.Embedding, path: str, cache_rows: int, copy_rows: int = 4096):
+        super().__init__()
+        self.num_embeddings, self.embedding_dim = embedding.weight.shape
+        self.padding_idx = embedding.padding_idx
+        self.dtype = embedding.weight.dtype
+        self._table = self._open_table(embedding.weight.detach(), path, copy_rows)
+        self._rows: "OrderedDict[int, torch.Tensor]" = OrderedDict()
+        self._cache_rows = cache_rows
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _open_table(weight: torch.Tensor, path: str, copy_rows: int) -> np.ndarray:
+        """
+        Map the table at path, writing it first if it is missing or has another shape. Rows are
+        copied copy_rows at a time (no second full copy in RAM) into a temp file that is renamed
+        into place, so concurrent workers never map a half-written table.
+        """
+        shape = tuple(weight.shape)
+        if os.path.exists(path):
+            table = np.load(path, mmap_mode="r")
+            if table.shape == shape and table.dtype == np.float32:
+                return table
+            del table
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        table = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=shape)
+        for start in range(0, shape[0], copy_rows):
+            table[start:start + copy_rows] = weight[start:start + copy_rows].float().cpu().numpy()
+        table.flush()
+        del table
+        os.replace(tmp_path, path)
+        return np.load(path, mmap_mode="r")
+    
+    def forward(self, input_ids: torch.Tensor) -> torch.Tensor:
+        unique, inverse = torch.unique(input_ids, return_inverse=True)
+        rows = []
+        with self._lock:
+            for token_id in unique.tolist():
+                row = self._rows.get(token_id)
+                if row is None:
+                    row = torch.from_numpy(np.array(self._table[token_id])).to(self.dtype)
+                    self._rows[token_id] = row
+                    if len(self._rows) > self._cache_rows:
+                        self._rows.popitem(last=False)
+                else:
+                    self._rows.move_to_end(token_id)
+                rows.append(row)
+        return torch.stack(rows)[inverse]
+
+
+def _offload_word_embeddings(model: torch.nn.Module, model_name: str, cache_fraction: float = 0.1) -> None:
+    """
+    Swap the model's input embedding table for a MemmapEmbedding with an LRU of cache_fraction
+    of the vocab. The table file is keyed by model name, so restarts and workers reuse one copy.
+    """
+    embedding = model.get_input_embeddings()
+    safe_name = "".join(ch if ch.isalnum() or ch in "-_." else "_" for ch in model_name)
+    path = os.path.join(tempfile.gettempdir(), f"reranker_word_embeddings_{safe_name}.npy")
+    cache_rows = max(1, int(embedding.num_embeddings * cache_fraction))
+    model.set_input_embeddings(MemmapEmbedding(embedding, path, cache_rows))
+    print(f"[BAAI Re-ranker] Word embeddings offloaded to {path} (LRU of {cache_rows} rows)")
+
+
+class OnnxCrossEncoder:
+    """
+    CrossEncoder-compatible ``predict`` backed by an ONNX Runtime session.
+    
+    Point RERANKER_ONNX_DIR at a directory holding the tokenizer files and an INT8 model,
+    produced once with:
+        optimum-cli export onnx --model BAAI/bge-reranker-base --task text-classification out/
+        python -c "from onnxruntime.quantization import quantize_dynamic, QuantType; \
+            quantize_dynamic('out/model.onnx', 'out/model_int8.onnx', weight_type=QuantType.QInt8)"
+    """
+    
+    def __init__(self, model_dir: str, model_file: str = "model_int8.onnx", max_length: int = 512):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Half the cores by default, leaving the rest for the event loop and embedding/HTTP threads
+        options.intra_op_num_threads = int(os.getenv("RERANKER_ONNX_THREADS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.max_length = max_length
+    
+    def predict(self, pairs, batch_size: int = 32, show_progress_bar: bool = False, convert_to_numpy: bool = True):
+        scores = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            enc = self.tokenizer(
+                [q for q, _ in batch], [d for _, d in batch],
+                padding=True, truncation=True, max_length=self.max_length, return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self.input_names}
+            logits = self.session.run(None, feeds)[0].reshape(-1)
+            scores.append(logits)
+        logits = np.concatenate(scores) if scores else np.empty(0, dtype=np.float32)
+        # Same sigmoid activation CrossEncoder applies to single-label models, so scores keep their scale
+        return 1.0 / (1.0 + np.exp(-logits))
+
 
 class BAAIReranker:
     """BAAI/bge-reranker-base neural re-ranker for semantic relevance scoring."""
     
     _instance = None  # Singleton to avoid reloading model
+    _init_lock = threading.Lock()  # Startup warm-up and the first request may race to load
     
     def __new__(cls):
         if cls._instance is None:
@@ -15,14 +169,38 @@ class BAAIReranker:
             cls._instance._initialized = False
         return cls._instance
     
-    def __init__(self, model_name: str = "BAAI/bge-reranker-base"):
+    def __init__(self, model_name: str = "BAAI/bge-reranker-base", batch_size: int = 32):
         if self._initialized:
             return
-        
-        print(f"[BAAI Re-ranker] Loading model: {model_name}...")
-        self.model = CrossEncoder(model_name, max_length=512)
-        self._initialized = True
-        print(f"[BAAI Re-ranker] Model loaded successfully")
+        with self._init_lock:
+            if self._initialized:
+                return
+            
+            self.device = _select_device()
+            self.batch_size = batch_size
+            self.max_length = 512
+            onnx_dir = os.getenv("RERANKER_ONNX_DIR", "").strip()
+            if onnx_dir and ONNX_AVAILABLE and self.device == "cpu":
+                print(f"[BAAI Re-ranker] Loading INT8 ONNX model from {onnx_dir}...")
+                self.model = OnnxCrossEncoder(onnx_dir, max_length=self.max_length)
+            else:
+                print(f"[BAAI Re-ranker] Loading model: {model_name} on {self.device}...")
+                self.model = CrossEncoder(model_name, max_length=self.max_length, device=self.device)
+                # Half precision on accelerators: half the memory traffic, tensor-core matmuls
+                if self.device in ("cuda", "mps"):
+                    self.model.model.half()
+                elif os.getenv("RERANKER_OFFLOAD_EMBEDDINGS", "false").lower() == "true":
+                    # Memory-constrained CPU hosts: keep only hot vocabulary rows resident
+                    _offload_word_embeddings(self.model.model, model_name)
+            # Micro-batch state for rerank_async (event-loop thread only)
+            self._pending: List[Tuple[List[Tuple[str, str]], "asyncio.Future"]] = []
+            self._flusher = None
+            self._initialized = True
+            print(f"[BAAI Re-ranker] Model loaded successfully")
+    
+    def warmup(self) -> None:
+        """Run one throwaway forward pass so weights and kernels are ready before the first query."""
+        self.model.predict([("warmup", "warmup")], show_progress_bar=False)
     
     def rerank(self, query: str, chunks: List[Dict[str, Any]], top_k: int = 10) -> List[Dict[str, Any]]:
         """
@@ -39,26 +217,225 @@ class BAAIReranker:
         if not chunks:
             return []
         
-        # Prepare query-document pairs
-        pairs = [(query, chunk.get("content", "")) for chunk in chunks]
+        keys, scores, misses = self._lookup(query, chunks)
+        if misses:
+            # Get relevance scores from cross-encoder (all pairs in as few forward passes as possible)
+            fresh = self._predict([(query, chunks[i].get("content", "")) for i in misses], self.batch_size)
+            self._store(keys, scores, misses, fresh)
+        return self._top_k(chunks, scores, top_k)
+    
+    async def rerank_async(self, query: str, chunks: List[Dict[str, Any]], top_k: int = 10) -> List[Dict[str, Any]]:
+        """
+        Same as rerank, but uncached pairs join a shared micro-batch: concurrent requests
+        arriving within RERANK_MAX_WAIT_MS are scored together in one forward pass,
+        off the event loop.
+        """
+        if not chunks:
+            return []
+        
+        keys, scores, misses = self._lookup(query, chunks)
+        if misses:
+            fresh = await self._predict_batched([(query, chunks[i].get("content", "")) for i in misses])
+            self._store(keys, scores, misses, fresh)
+        return self._top_k(chunks, scores, top_k)
+    
+    async def _predict_batched(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((pairs, future))
+        if self._flusher is None:
+            self._flusher = loop.create_task(self._flush_after(RERANK_MAX_WAIT_MS / 1000.0))
+        return await future
+    
+    async def _flush_after(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        batch, self._pending, self._flusher = self._pending, [], None
+        all_pairs = [pair for pairs, _ in batch for pair in pairs]
+        try:
+            scores = await asyncio.to_thread(self._predict, all_pairs, max(self.batch_size, len(all_pairs)))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        offset = 0
+        for pairs, future in batch:
+            if not future.done():
+                future.set_result(scores[offset:offset + len(pairs)])
+            offset += len(pairs)
+    
+    def _predict(self, pairs: List[Tuple[str, str]], batch_size: int) -> np.ndarray:
+        """Score pairs with the loaded model; the PyTorch model reuses cached chunk tokenizations."""
+        if isinstance(self.model, CrossEncoder):
+            return self._predict_pretokenized(pairs, batch_size)
+        return self.model.predict(pairs, batch_size=batch_size, show_progress_bar=False, convert_to_numpy=True)
+    
+    def _predict_pretokenized(self, pairs: List[Tuple[str, str]], batch_size: int) -> np.ndarray:
+        """
+        CrossEncoder.predict equivalent that tokenizes each distinct query once and each
+        chunk once per process (chunk text is static), then only assembles
+        <s> query </s></s> chunk </s> id sequences and runs the HF model directly.
+        """
+        tokenizer = self.model.tokenizer
+        hf_model = self.model.model
+        budget = self.max_length - tokenizer.num_special_tokens_to_add(pair=True)
         
-        # Get relevance scores from cross-encoder
-        scores = self.model.predict(pairs)
+        query_ids: Dict[str, List[int]] = {}
+        features = []
+        for query, content in pairs:
+            q_ids = query_ids.get(query)
+            if q_ids is None:
+                q_ids = query_ids[query] = tokenizer(query, add_special_tokens=False)["input_ids"][:budget // 2]
+            d_ids = self._doc_ids(tokenizer, content, budget)[:budget - len(q_ids)]
+            features.append({"input_ids": tokenizer.build_inputs_with_special_tokens(q_ids, d_ids)})
         
-        # Combine chunks with scores and sort
-        scored_chunks = list(zip(chunks, scores))
-        scored_chunks.sort(key=lambda x: x[1], reverse=True)
+        scores = []
+        with torch.inference_mode():
+            for start in range(0, len(features), batch_size):
+                batch = tokenizer.pad(features[start:start + batch_size], return_tensors="pt").to(hf_model.device)
+                logits = hf_model(**batch).logits.float().view(-1)
+                # Same sigmoid activation CrossEncoder applies to single-label models
+                scores.append(torch.sigmoid(logits).cpu().numpy())
+        return np.concatenate(scores) if scores else np.empty(0, dtype=np.float32)
+    
+    @staticmethod
+    def _doc_ids(tokenizer, content: str, budget: int) -> List[int]:
+        key = _digest(content)
+        with _doc_ids_lock:
+            ids = _doc_ids_cache.get(key)
+            if ids is not None:
+                _doc_ids_cache.move_to_end(key)
+                return ids
+        ids = tokenizer(content, add_special_tokens=False, truncation=True, max_length=budget)["input_ids"]
+        with _doc_ids_lock:
+            _doc_ids_cache[key] = ids
+            if len(_doc_ids_cache) > _DOC_IDS_CACHE_SIZE:
+                _doc_ids_cache.popitem(last=False)
+        return ids
+    
+    def _lookup(self, query: str, chunks: List[Dict[str, Any]]) -> Tuple[list, np.ndarray, List[int]]:
+        """Fill scores from the cache; return the cache keys, the scores and the indices still to score."""
+        # Whitespace never changes the tokenization, so "  What is X? " and "What is X?" share entries
+        qh = _digest(" ".join(query.split()))
+        keys = [(qh, _digest(chunk.get("content", ""))) for chunk in chunks]
+        scores = np.empty(len(chunks), dtype=np.float32)
         
-        # Add score to metadata for transparency
-        reranked = []
-        for chunk, score in scored_chunks[:top_k]:
-            chunk_copy = chunk.copy()
-            if "metadata" not in chunk_copy:
-                chunk_copy["metadata"] = {}
-            chunk_copy["metadata"]["rerank_score"] = float(score)
-            reranked.append(chunk_copy)
+        misses = []
+        with _score_lock:
+            for i, key in enumerate(keys):
+                cached = _score_cache.get(key)
+                if cached is None:
+                    misses.append(i)
+                else:
+                    _score_cache.move_to_end(key)
+                    scores[i] = cached
+        return keys, scores, misses
+    
+    def _store(self, keys: list, scores: np.ndarray, misses: List[int], fresh) -> None:
+        with _score_lock:
+            for i, score in zip(misses, fresh):
+                scores[i] = score
+                _score_cache[keys[i]] = float(score)
+            while len(_score_cache) > _SCORE_CACHE_SIZE:
+                _score_cache.popitem(last=False)
+    
+    @staticmethod
+    def _top_k(chunks: List[Dict[str, Any]], scores: np.ndarray, top_k: int) -> List[Dict[str, Any]]:
+        # Select the top k in O(n), then sort only those (descending) in numpy
+        k = min(top_k, len(chunks))
+        if k <= 0:
+            return []
+        top_idx = np.argpartition(-scores, k - 1)[:k]
+        # argpartition scrambles ties, so break them by original (retrieval) position
+        top_idx = top_idx[np.lexsort((top_idx, -scores[top_idx]))]
         
-        return reranked
+        # Add score to metadata for transparency (new dicts, so the retrieved chunks stay untouched)
+        return [
+            {**chunks[i], "metadata": {**(chunks[i].get("metadata") or {}), "rerank_score": float(scores[i])}}
+            for i in top_idx
+        ]
+
+
+def save_score_cache(filepath: str) -> None:
+    """
+    Save the rerank score cache to an .npz file so a restart doesn't re-score known (query, chunk)
+    pairs: one row of the two 16-byte digests per entry, plus the float32 scores.
+    Keys are content digests, so entries for deleted documents are harmless and age out.
+    """
+    with _score_lock:
+        items = list(_score_cache.items())
+    keys = np.frombuffer(b"".join(q + c for (q, c), _ in items), dtype=np.uint8).reshape(len(items), 32)
+    np.savez(filepath, keys=keys, scores=np.array([score for _, score in items], dtype=np.float32))
+
+
+def load_score_cache(filepath: str) -> None:
+    """Load scores saved by save_score_cache, keeping the most recent _SCORE_CACHE_SIZE."""
+    if not os.path.exists(filepath):
+        return
+    with np.load(filepath, allow_pickle=False) as data:
+        keys = data["keys"][-_SCORE_CACHE_SIZE:]
+        scores = data["scores"][-_SCORE_CACHE_SIZE:]
+    with _score_lock:
+        _score_cache.update(
+            ((row[:16].tobytes(), row[16:].tobytes()), score) for row, score in zip(keys, scores.tolist())
+        )
+        while len(_score_cache) > _SCORE_CACHE_SIZE:
+            _score_cache.popitem(last=False)
+
+
+def preload_reranker() -> BAAIReranker:
+    """
+    Load the re-ranker in the current process and move CPU weights to shared memory.
+    Call before forking workers (e.g. gunicorn --preload) so every worker reuses the
+    parent's tensors copy-on-write instead of loading its own copy.
+    """
+    reranker = BAAIReranker()
+    torch_model = getattr(reranker.model, "model", None)
+    if reranker.device == "cpu" and isinstance(torch_model, torch.nn.Module):
+        torch_model.share_memory()
+    return reranker
+
+
+def warmup_reranker_in_background() -> threading.Thread:
+    """Load and warm the re-ranker on a daemon thread so startup and the first query don't wait on it."""
+    thread = threading.Thread(target=lambda: BAAIReranker().warmup(), name="reranker-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+# Only the best hybrid-search candidates go through the cross-encoder (its cost is linear in candidates)
+RERANK_MAX_CANDIDATES = int(os.getenv("RERANK_MAX_CANDIDATES", "8"))
+
+def _rerank_candidates(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Web results plus the first RERANK_MAX_CANDIDATES knowledge-base chunks. Retrieval puts web
+    results first, so capping the combined list would crowd the hybrid-search shortlist out.
+    """
+    web = [c for c in chunks if (c.get("metadata") or {}).get("type") == "web_search"]
+    if not web:
+        return chunks[:RERANK_MAX_CANDIDATES]
+    docs = [c for c in chunks if (c.get("metadata") or {}).get("type") != "web_search"]
+    # Knowledge-base chunks arrive in fused hybrid-score order, so the prefix is the lexical/vector shortlist
+    return web + docs[:RERANK_MAX_CANDIDATES]
+
+
+# Top cross-encoder score (0-1) below which the knowledge base is treated as not answering the query
+RERANK_RELEVANCE_THRESHOLD = float(os.getenv("RERANK_RELEVANCE_THRESHOLD", "0.5"))
+
+
+def _relevance_from_score(state: Dict[str, Any], top_score: float) -> Dict[str, Any]:
+    """Derive the 0-10 relevance score and web-search decision from the best rerank score."""
+    # If already flagged for web search (time-sensitive), don't override that decision
+    if state.get("needs_web_search"):
+        return {
+            "relevance_score": 10,
+            "relevance_reasoning": "Time-sensitive query, using web search",
+        }
+    return {
+        "relevance_score": int(round(top_score * 10)),
+        "relevance_reasoning": f"Top cross-encoder score {top_score:.3f}",
+        "needs_web_search": top_score < RERANK_RELEVANCE_THRESHOLD,
+    }
 
 
 def reranking_node(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -72,14 +449,46 @@ def reranking_node(state: Dict[str, Any]) -> Dict[str, Any]:
     query = state.get("query", "")
     
     if not chunks:
-        return {**state, "reranked_chunks": []}
+        return {
+            "reranked_chunks": [],
+            "relevance_score": 0,
+            "relevance_reasoning": "No documents retrieved from knowledge base",
+            "needs_web_search": True,
+        }
     
+    chunks = _rerank_candidates(chunks)
     print(f"[Re-ranking Agent] Re-ranking {len(chunks)} chunks with BAAI model...")
     
     # Initialize re-ranker (singleton pattern ensures model loads only once)
     reranker = BAAIReranker()
     reranked = reranker.rerank(query, chunks, top_k=10)
     
-    print(f"[Re-ranking Agent] Top chunk score: {reranked[0]['metadata'].get('rerank_score', 0):.3f}")
+    top_score = reranked[0]["metadata"].get("rerank_score", 0.0)
+    print(f"[Re-ranking Agent] Top chunk score: {top_score:.3f}")
+    
+    return {"reranked_chunks": reranked, **_relevance_from_score(state, top_score)}
+
+
+async def reranking_node_async(state: Dict[str, Any]) -> Dict[str, Any]:
+    """Re-Ranking Agent for the async graph: concurrent requests share cross-encoder batches."""
+    chunks = state.get("retrieved_chunks", [])
+    query = state.get("query", "")
+    
+    if not chunks:
+        return {
+            "reranked_chunks": [],
+            "relevance_score": 0,
+            "relevance_reasoning": "No documents retrieved from knowledge base",
+            "needs_web_search": True,
+        }
+    
+    chunks = _rerank_candidates(chunks)
+    print(f"[Re-ranking Agent] Re-ranking {len(chunks)} chunks with BAAI model...")
+    
+    reranker = BAAIReranker()
+    reranked = await reranker.rerank_async(query, chunks, top_k=10)
+    
+    top_score = reranked[0]["metadata"].get("rerank_score", 0.0)
+    print(f"[Re-ranking Agent] Top chunk score: {top_score:.3f}")
     
-    return {**state, "reranked_chunks": reranked}
+    return {"reranked_chunks": reranked, **_relevance_from_score(state, top_score)}
@@ -1,6 +1,96 @@
 """Retrieval Agent - Calls VectorDB MCP for hybrid search and optionally WebSearch MCP."""
 
-from typing import Any, Dict, Optional
+import asyncio
+import hashlib
+from collections import OrderedDict
+from operator import itemgetter
+from typing import Any, Dict, List, Optional
+
+from .langchain_agents import query_terms
+
+
+_web_fields = itemgetter("title", "url", "snippet")
+
+# session_id -> (query signature -> hybrid-search chunks); scoped per session so nothing crosses users
+_SESSION_CACHE_SIZE = 16
+_MAX_CACHED_SESSIONS = 1024
+_session_cache: "OrderedDict[str, OrderedDict[str, List[Dict[str, Any]]]]" = OrderedDict()
+
+
+def _query_signature(query: str) -> Optional[str]:
+    """Order- and stopword-insensitive signature, so light rephrasings share cached candidates."""
+    terms = query_terms(query)
+    if not terms:
+        return None
+    return hashlib.sha1(" ".join(sorted(terms)).encode("utf-8")).hexdigest()
+
+
+def _cached_chunks(state: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    session = _session_cache.get(state.get("session_id", ""))
+    if session is None:
+        return None
+    sig = _query_signature(state.get("query", ""))
+    chunks = session.get(sig) if sig else None
+    if chunks is not None:
+        session.move_to_end(sig)
+        print("[Retrieval Agent] Reusing this session's cached candidates")
+    return chunks
+
+
+def _cache_chunks(state: Dict[str, Any], chunks: List[Dict[str, Any]]) -> None:
+    session_id = state.get("session_id")
+    sig = _query_signature(state.get("query", ""))
+    if not session_id or not sig or not chunks:
+        return
+    session = _session_cache.setdefault(session_id, OrderedDict())
+    _session_cache.move_to_end(session_id)
+    session[sig] = chunks
+    while len(session) > _SESSION_CACHE_SIZE:
+        session.popitem(last=False)
+    while len(_session_cache) > _MAX_CACHED_SESSIONS:
+        _session_cache.popitem(last=False)
+
+
+def clear_retrieval_cache() -> None:
+    """Forget every session's cached candidates; call whenever the knowledge base changes."""
+    _session_cache.clear()
+
+
+def _doc_chunks(resp) -> List[Dict[str, Any]]:
+    if resp.success and resp.result:
+        return resp.result.get("chunks", [])
+    return []
+
+
+def _web_chunks(web_resp) -> List[Dict[str, Any]]:
+    web_chunks = []
+    if web_resp.success and web_resp.result:
+        results = web_resp.result.get("results", [])
+        print(f"[Retrieval Agent] Web search returned {len(results)} results")
+        # Format web results as chunks for consistency
+        web_chunks = [
+            {
+                "content": title + "\n\n" + snippet,
+                "metadata": {"source": url, "type": "web_search", "page": "web", "title": title},
+            }
+            for title, url, snippet in map(_web_fields, results)
+        ]
+    return web_chunks
+
+
+def _use_web(state: Dict[str, Any], web_search_mcp: Optional[Any]) -> bool:
+    needs_web = state.get("needs_web_search", False)
+    print(f"[Retrieval Agent] Needs web search: {needs_web}")
+    if needs_web and not web_search_mcp:
+        print(f"[Retrieval Agent] WebSearchMCP not injected!")
+    return bool(needs_web and web_search_mcp)
+
+
+def _combine(web_chunks: List[Dict[str, Any]], doc_chunks: List[Dict[str, Any]], used_web: bool) -> Dict[str, Any]:
+    # Combine both sources (web results first for recency)
+    print(f"[Retrieval Agent] Total chunks: {len(web_chunks)} web + {len(doc_chunks)} docs")
+    # web_search_attempted tells routing not to search again and generation to answer from these chunks
+    return {"retrieved_chunks": web_chunks + doc_chunks, "web_search_attempted": used_web}
 
 
 def retrieval_node(state: Dict[str, Any], vector_db_mcp, web_search_mcp: Optional[Any] = None) -> Dict[str, Any]:
@@ -11,43 +101,51 @@ def retrieval_node(state: Dict[str, Any], vector_db_mcp, web_search_mcp: Optiona
     """
     query = state.get("query", "")
     if not query:
-        return {**state, "retrieved_chunks": []}
+        return {"retrieved_chunks": []}
 
-    # Get document chunks from vector DB (always)
-    doc_chunks = []
-    resp = vector_db_mcp.call("hybrid_search", query=query, top_k=15)
-    if resp.success and resp.result:
-        doc_chunks = resp.result.get("chunks", [])
+    # Get document chunks from vector DB (always), unless this session already ran the same search
+    doc_chunks = _cached_chunks(state)
+    if doc_chunks is None:
+        doc_chunks = _doc_chunks(vector_db_mcp.call(
+            "hybrid_search", query=query, top_k=15, query_embedding=state.get("query_embedding")
+        ))
+        _cache_chunks(state, doc_chunks)
 
     # Get web search results if needed
     web_chunks = []
-    needs_web = state.get("needs_web_search", False)
-    print(f"[Retrieval Agent] Needs web search: {needs_web}")
-    
-    if needs_web:
-        if web_search_mcp:
-            print(f"[Retrieval Agent] Calling WebSearchMCP...")
-            web_resp = web_search_mcp.call("search", query=query, top_k=5)
-            if web_resp.success and web_resp.result:
-                results = web_resp.result.get("results", [])
-                print(f"[Retrieval Agent] Web search returned {len(results)} results")
-                for result in results:
-                    # Format web results as chunks for consistency
-                    web_chunks.append({
-                        "content": f"{result['title']}\n\n{result['snippet']}",
-                        "metadata": {
-                            "source": result["url"],
-                            "type": "web_search",
-                            "page": "web",
-                            "title": result["title"]
-                        }
-                    })
-        else:
-            print(f"[Retrieval Agent] WebSearchMCP not injected!")
+    use_web = _use_web(state, web_search_mcp)
+    if use_web:
+        print(f"[Retrieval Agent] Calling WebSearchMCP...")
+        web_chunks = _web_chunks(web_search_mcp.call("search", query=query, top_k=5))
 
-    # Combine both sources (web results first for recency)
-    print(f"[Retrieval Agent] Total chunks: {len(web_chunks)} web + {len(doc_chunks)} docs")
-    all_chunks = web_chunks + doc_chunks
+    return _combine(web_chunks, doc_chunks, use_web)
+
+
+async def retrieval_node_async(state: Dict[str, Any], vector_db_mcp, web_search_mcp: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Async Retrieval Agent: same result as retrieval_node, but the hybrid search (whose
+    vector and BM25 legs overlap too) and the web search run concurrently through the
+    servers' acall(), so the critical path is the slowest call rather than their sum.
+    """
+    query = state.get("query", "")
+    if not query:
+        return {"retrieved_chunks": []}
+
+    cached = _cached_chunks(state)
+    calls = []
+    if cached is None:
+        calls.append(vector_db_mcp.acall("hybrid_search", query=query, top_k=15, query_embedding=state.get("query_embedding")))
+    use_web = _use_web(state, web_search_mcp)
+    if use_web:
+        print(f"[Retrieval Agent] Calling WebSearchMCP...")
+        calls.append(web_search_mcp.acall("search", query=query, top_k=5))
 
-    return {**state, "retrieved_chunks": all_chunks}
+    responses = await asyncio.gather(*calls)
+    if cached is None:
+        doc_chunks = _doc_chunks(responses[0])
+        _cache_chunks(state, doc_chunks)
+    else:
+        doc_chunks = cached
+    web_chunks = _web_chunks(responses[-1]) if use_web else []
 
+    return _combine(web_chunks, doc_chunks, use_web)
@@ -1,32 +1,42 @@
-"""LangGraph RAG pipeline: Orchestrator -> QueryAnalysis -> Retrieval -> ReRanking -> RelevanceCheck -> Generation -> Citation."""
+"""LangGraph RAG pipeline: Orchestrator -> Retrieval -> ReRanking (+relevance) -> [LLM QueryAnalysis+RelevanceCheck] -> Generation -> Citation."""
 
-from typing import Any, Dict, Literal, TypedDict
+import asyncio
+import os
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, Literal, Optional, Tuple, TypedDict
 
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 
 from agents import (
     orchestrator_node,
-    retrieval_node,
-    reranking_node,
+    retrieval_node_async,
+    reranking_node_async,
     generation_node,
     citation_node,
 )
-from agents.agent_wrapper import (
-    query_analysis_node as langchain_query_analysis_node,
-    relevance_check_node as langchain_relevance_check_node,
-)
+from agents.generation import generation_stream
+from agents.agent_wrapper import query_and_relevance_node
+from agents.langchain_agents import lexical_overlap
+
+
+# Start generation alongside the relevance check when this share of query terms is in the top passages
+SPECULATE_MIN_OVERLAP = float(os.getenv("SPECULATE_MIN_OVERLAP", "0.5"))
+# Re-check relevance with the LLM after re-ranking (the re-ranker's score is used otherwise)
+USE_LLM_RELEVANCE_CHECK = os.getenv("USE_LLM_RELEVANCE_CHECK", "false").lower() == "true"
 
 
 # State schema for LangGraph (mutable dict)
 class RAGGraphState(TypedDict, total=False):
     query: str
+    query_embedding: list
     session_id: str
     conversation_history: list
     query_intent: str
     query_entities: list
     query_type: str
     needs_web_search: bool
+    web_search_attempted: bool
     relevance_score: int
     relevance_reasoning: str
     retrieved_chunks: list
@@ -37,53 +47,156 @@ class RAGGraphState(TypedDict, total=False):
     error: str
 
 
-def build_rag_graph(vector_db_mcp, web_search_mcp=None):
-    """Build the LangGraph pipeline with MCP injection and relevance checking."""
+def new_turn_state(query: str, session_id: str, history: list) -> Dict[str, Any]:
+    """
+    Input state for one /ask turn. Every per-turn field is reset explicitly, so with a
+    checkpointer (thread_id=session_id) nothing leaks from the previous turn. The query-analysis
+    fields (query_intent/entities/type) are not reset, but they are only populated when the
+    LLM relevance check is enabled, and no node reads them.
+    """
+    return {
+        "query": query,
+        "query_embedding": None,
+        "session_id": session_id,
+        "conversation_history": history,
+        "needs_web_search": False,
+        "web_search_attempted": False,
+        "relevance_score": 0,
+        "relevance_reasoning": "",
+        "retrieved_chunks": [],
+        "reranked_chunks": [],
+        "generated_answer": "",
+        "citations": [],
+        "final_response": "",
+        "error": "",
+    }
+
+
+@lru_cache(maxsize=4)
+def build_rag_graph(vector_db_mcp, web_search_mcp=None, stream_generation: bool = False,
+                    llm_relevance_check: Optional[bool] = None, checkpointer=None):
+    """
+    Build the LangGraph pipeline with MCP injection and relevance checking.
+    Pass a checkpointer and config={"configurable": {"thread_id": session_id}} to keep
+    per-session graph state between turns.
+    Compiled graphs are memoized per argument set (servers/checkpointer by identity);
+    the agents they use are module-level singletons, so variants share models and clients.
+    With stream_generation=True the graph stops once the context is chosen; use
+    astream_answer() to stream generation and citations from it.
+    Relevance comes from the re-ranker's scores unless llm_relevance_check (default:
+    USE_LLM_RELEVANCE_CHECK env var) adds the LLM query-analysis/relevance step.
+    """
+    if llm_relevance_check is None:
+        llm_relevance_check = USE_LLM_RELEVANCE_CHECK
 
-    def retrieval_with_mcp(state: Dict[str, Any]) -> Dict[str, Any]:
-        return retrieval_node(state, vector_db_mcp, web_search_mcp)
+    async def retrieval_with_mcp(state: Dict[str, Any]) -> Dict[str, Any]:
+        return await retrieval_node_async(state, vector_db_mcp, web_search_mcp)
 
-    def should_use_web_search(state: Dict[str, Any]) -> Literal["web_search", "generation"]:
+    async def relevance_check_node(state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Relevance check with speculative generation: when the passages look relevant, generate
+        from them while the check runs and cancel the answer if the check asks for web search.
+        """
+        chunks = state.get("reranked_chunks", [])
+        if stream_generation or state.get("needs_web_search") or not chunks:
+            return await query_and_relevance_node(state)
+        overlap, _ = lexical_overlap(state.get("query", ""), chunks)
+        if overlap < SPECULATE_MIN_OVERLAP:
+            return await query_and_relevance_node(state)
+        
+        print(f"[Speculative Generation] Lexical overlap {overlap:.2f}, generating while checking relevance")
+        gen_task = asyncio.create_task(generation_node(state))
+        try:
+            checked = await query_and_relevance_node(state)
+        except BaseException:
+            gen_task.cancel()
+            raise
+        
+        if checked.get("needs_web_search"):
+            print("[Speculative Generation] Relevance check requested web search, discarding draft")
+            gen_task.cancel()
+            try:
+                await gen_task
+            except asyncio.CancelledError:
+                pass
+            return checked
+        
+        generated = await gen_task
+        result = {**checked, "generated_answer": generated.get("generated_answer", "")}
+        if "error" in generated:
+            result["error"] = generated["error"]
+        return result
+
+    def should_use_web_search(state: Dict[str, Any]) -> Literal["web_search", "generation", "citation"]:
         """Conditional routing: use web search if documents are irrelevant or time-sensitive."""
-        # Check if web search is needed (either time-sensitive or low relevance)
-        if state.get("needs_web_search", False):
+        # Check if web search is needed (either time-sensitive or low relevance) and not yet done;
+        # time-sensitive queries already got web results in the retrieval step
+        if state.get("needs_web_search", False) and not state.get("web_search_attempted", False):
             print("[Routing] → Using web search (flagged as needed)")
             return "web_search"
+        if state.get("generated_answer"):
+            print("[Routing] → Using speculatively generated answer")
+            return "citation"
         print("[Routing] → Using knowledge base documents")
         return "generation"
 
     graph = StateGraph(RAGGraphState)
 
     graph.add_node("orchestrator", orchestrator_node)
-    graph.add_node("query_analysis", langchain_query_analysis_node)
     graph.add_node("retrieval", retrieval_with_mcp)
-    graph.add_node("reranking", reranking_node)
-    graph.add_node("relevance_check", langchain_relevance_check_node)
-    graph.add_node("generation", generation_node)
-    graph.add_node("citation", citation_node)
+    graph.add_node("reranking", reranking_node_async)
+    if llm_relevance_check:
+        # Query analysis and relevance check share one LLM call once passages are available
+        graph.add_node("relevance_check", relevance_check_node)
+    if not stream_generation:
+        graph.add_node("generation", generation_node)
+        graph.add_node("citation", citation_node)
     
     # Add web_search node that re-runs retrieval with web search flag
-    def web_search_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    async def web_search_node(state: Dict[str, Any]) -> Dict[str, Any]:
         """Re-run retrieval with web search enabled."""
         print("[Web Search] Retrieving from web...")
         state_with_web = {**state, "needs_web_search": True}
-        return retrieval_node(state_with_web, vector_db_mcp, web_search_mcp)
+        # Retrieval sets web_search_attempted only if the web search server was actually called
+        return {
+            "needs_web_search": True,
+            **await retrieval_node_async(state_with_web, vector_db_mcp, web_search_mcp),
+        }
     
     graph.add_node("web_search", web_search_node)
 
     graph.set_entry_point("orchestrator")
-    graph.add_edge("orchestrator", "query_analysis")
-    graph.add_edge("query_analysis", "retrieval")
+    graph.add_edge("orchestrator", "retrieval")
     graph.add_edge("retrieval", "reranking")
-    graph.add_edge("reranking", "relevance_check")
+    if llm_relevance_check:
+        graph.add_edge("reranking", "relevance_check")
+        route_from = "relevance_check"
+    else:
+        # The re-ranker already set relevance_score / needs_web_search
+        route_from = "reranking"
     
     # Conditional routing after relevance check
+    if stream_generation:
+        # Generation and citation happen outside the graph, in astream_answer()
+        graph.add_conditional_edges(
+            route_from,
+            should_use_web_search,
+            {
+                "web_search": "web_search",
+                "generation": END,
+                "citation": END,
+            }
+        )
+        graph.add_edge("web_search", END)
+        return graph.compile(checkpointer=checkpointer)
+    
     graph.add_conditional_edges(
-        "relevance_check",
+        route_from,
         should_use_web_search,
         {
             "web_search": "web_search",
-            "generation": "generation"
+            "generation": "generation",
+            "citation": "citation",
         }
     )
     
@@ -91,5 +204,16 @@ def build_rag_graph(vector_db_mcp, web_search_mcp=None):
     graph.add_edge("generation", "citation")
     graph.add_edge("citation", END)
 
-    return graph.compile()
+    return graph.compile(checkpointer=checkpointer)
+
 
+async def astream_answer(stream_graph, state: Dict[str, Any], config: Optional[Dict[str, Any]] = None) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Run a graph built with stream_generation=True and stream the result as events:
+    ("citations", list) first - they depend only on the chosen chunks - then ("token", str)
+    for each generated piece of the answer.
+    """
+    prepared = await stream_graph.ainvoke(state, config=config)
+    yield "citations", citation_node(prepared)["citations"]
+    async for token in generation_stream(prepared):
+        yield "token", token
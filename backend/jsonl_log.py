@@ -0,0 +1,57 @@
+"""Append-only JSONL logs for small persistent lists (uploaded files, conversation turns)."""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+# Optional: orjson serializes in C; stdlib json is used when it is missing
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes, with orjson when available."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def append_jsonl(filepath: str, records: Iterable[Dict[str, Any]]) -> None:
+    """Append records, one JSON object per line."""
+    with open(filepath, 'ab') as f:
+        f.write(b"".join(dumps(record) + b"\n" for record in records))
+
+
+def read_jsonl(filepath: str) -> List[Dict[str, Any]]:
+    """Read every record; a torn last line from an interrupted write is skipped."""
+    if not Path(filepath).exists():
+        return []
+    records = []
+    with open(filepath, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def write_jsonl(filepath: str, records: Iterable[Dict[str, Any]]) -> None:
+    """Rewrite the log with only the given records (compaction); atomic via rename."""
+    tmp = Path(str(filepath) + ".tmp")
+    with open(tmp, 'wb') as f:
+        for record in records:
+            f.write(dumps(record) + b"\n")
+    tmp.replace(filepath)
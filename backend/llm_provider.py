@@ -1,9 +1,14 @@
 """Centralized LLM provider with automatic Gemini -> Ollama fallback."""
 
+import asyncio
 import os
-from typing import Optional, Any
+from functools import lru_cache
+from typing import Optional, Any, Dict, Tuple, Type
 from langchain_core.language_models import BaseChatModel
-from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_core.runnables import Runnable, RunnableLambda, RunnableWithFallbacks
+from langchain_core.runnables.retry import RunnableRetry
+from pydantic import BaseModel
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential_jitter
 
 # Try importing both providers
 try:
@@ -21,45 +26,60 @@ except ImportError:
     print("[LLM] Warning: langchain-ollama not installed")
 
 
-def create_fallback_wrapper(gemini_llm, ollama_llm):
-    """Create a Runnable that wraps Gemini with Ollama fallback."""
-    
-    def invoke_with_fallback(input_data, **kwargs):
-        """Try Gemini first, fall back to Ollama on any error."""
-        # Try Gemini first
-        if gemini_llm:
-            try:
-                return gemini_llm.invoke(input_data, **kwargs)
-            except Exception as e:
-                error_msg = str(e).lower()
-                
-                # Check if it's a rate limit error
-                if "429" in str(e) or "resource_exhausted" in error_msg or "quota" in error_msg:
-                    print(f"[LLM] Gemini rate limit hit, falling back to Ollama...")
-                else:
-                    print(f"[LLM] Gemini error ({e}), falling back to Ollama...")
-                
-                # Fall through to Ollama
-                if ollama_llm:
-                    print("[LLM] Using Ollama fallback")
-                    return ollama_llm.invoke(input_data, **kwargs)
-                else:
-                    raise e
-        
-        # If no Gemini or Gemini failed and we have Ollama
-        if ollama_llm:
-            return ollama_llm.invoke(input_data, **kwargs)
-        
-        raise RuntimeError("No LLM available")
-    
-    return RunnableLambda(invoke_with_fallback)
+# Provider rate-limit exceptions retried on the primary model before falling back
+_RATE_LIMIT_ERRORS: Tuple[Type[BaseException], ...] = ()
+try:
+    from google.api_core.exceptions import ResourceExhausted
+    _RATE_LIMIT_ERRORS += (ResourceExhausted,)
+except ImportError:
+    pass
 
 
-def get_llm(temperature: float = 0.4, max_tokens: int = 2048) -> Runnable:
+# Upper bound on in-flight async LLM calls per process, so fan-out stays under provider rate limits
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+_LLM_SEM = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+
+
+def is_rate_limit_error(e: BaseException) -> bool:
+    """Return True if the exception looks like a provider rate-limit / quota error."""
+    error_msg = str(e).lower()
+    return "429" in error_msg or "resource_exhausted" in error_msg or "quota" in error_msg
+
+
+def _retries_rate_limits(chain: Runnable) -> bool:
+    """True if chain contains a model from _combine that already retries rate limits before falling back."""
+    steps = getattr(chain, "steps", None) or [chain]
+    return any(
+        isinstance(step, RunnableWithFallbacks) and isinstance(step.runnable, RunnableRetry)
+        for step in steps
+    )
+
+
+async def ainvoke_with_limits(chain: Runnable, inputs: Dict[str, Any], **kwargs) -> Any:
     """
-    Get an LLM Runnable with automatic fallback: Gemini -> Ollama.
-    Uses standard LangChain .with_fallbacks() mechanism.
+    Await ``chain.ainvoke`` under the shared concurrency limit.
+    Rate-limit errors are retried with jittered exponential backoff; the
+    semaphore is released while backing off so other calls can proceed.
+    Chains whose model already retries (Gemini with the Ollama fallback) are called once:
+    when both providers fail the fallback re-raises Gemini's 429, and retrying that here
+    would multiply the attempts.
     """
+    if _retries_rate_limits(chain):
+        async with _LLM_SEM:
+            return await chain.ainvoke(inputs, **kwargs)
+    async for attempt in AsyncRetrying(
+        wait=wait_exponential_jitter(initial=1, max=20),
+        stop=stop_after_attempt(4),
+        retry=retry_if_exception(is_rate_limit_error),
+        reraise=True,
+    ):
+        with attempt:
+            async with _LLM_SEM:
+                return await chain.ainvoke(inputs, **kwargs)
+
+
+def _init_providers(temperature: float, max_tokens: int):
+    """Build the (Gemini, Ollama) chat models that are configured; either may be None."""
     primary_llm = None
     fallback_llm = None
     
@@ -87,15 +107,30 @@ def get_llm(temperature: float = 0.4, max_tokens: int = 2048) -> Runnable:
                 base_url=base_url,
                 temperature=temperature,
                 num_predict=max_tokens,
+                # Keep the model loaded between calls; a reload re-reads the weights before the first token
+                keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", "30m"),
             )
             print(f"[LLM] Fallback: Ollama ({model})")
         except Exception as e:
             print(f"[LLM] Ollama init failed: {e}")
 
-    # Return appropriate LLM configuration
+    return primary_llm, fallback_llm
+
+
+def _combine(primary_llm: Optional[Runnable], fallback_llm: Optional[Runnable]) -> Runnable:
+    """
+    Return appropriate LLM configuration for the providers that initialized.
+    With both, the primary retries rate limits with jittered backoff and then falls
+    back to Ollama on any error; invoke/ainvoke/batch/abatch/astream all keep working.
+    """
     if primary_llm and fallback_llm:
-        # Use RunnableLambda wrapper for better fallback handling
-        return create_fallback_wrapper(primary_llm, fallback_llm)
+        if _RATE_LIMIT_ERRORS:
+            primary_llm = primary_llm.with_retry(
+                retry_if_exception_type=_RATE_LIMIT_ERRORS,
+                wait_exponential_jitter=True,
+                stop_after_attempt=3,
+            )
+        return primary_llm.with_fallbacks([fallback_llm])
     elif primary_llm:
         return primary_llm
     elif fallback_llm:
@@ -105,3 +140,27 @@ def get_llm(temperature: float = 0.4, max_tokens: int = 2048) -> Runnable:
         raise RuntimeError("No LLM provider available! Please check .env configuration.")
 
 
+@lru_cache(maxsize=None)
+def get_llm(temperature: float = 0.4, max_tokens: int = 2048) -> Runnable:
+    """
+    Get an LLM Runnable with automatic fallback: Gemini -> Ollama.
+    Uses standard LangChain .with_retry() / .with_fallbacks() mechanisms.
+    Memoized per (temperature, max_tokens): agents with the same settings share one
+    client, and with it the provider's pooled HTTP connections.
+    """
+    return _combine(*_init_providers(temperature, max_tokens))
+
+
+@lru_cache(maxsize=None)
+def get_structured_llm(schema: Type[BaseModel], temperature: float = 0.0, max_tokens: int = 512) -> Runnable:
+    """
+    Get an LLM Runnable that returns ``schema`` fields as a dict, with Gemini -> Ollama fallback.
+    Each provider uses its native structured output (function calling / constrained JSON),
+    so no format instructions are needed in the prompt and no JSON post-parsing can fail.
+    """
+    to_dict = RunnableLambda(lambda obj: obj.model_dump() if isinstance(obj, BaseModel) else obj)
+    primary_llm, fallback_llm = _init_providers(temperature, max_tokens)
+    return _combine(
+        primary_llm.with_structured_output(schema) | to_dict if primary_llm else None,
+        fallback_llm.with_structured_output(schema) | to_dict if fallback_llm else None,
+    )
@@ -1,5 +1,6 @@
 """FastAPI backend - Advanced Multi-Agent RAG with MCP and LangChain."""
 
+import logging
 import os
 from pathlib import Path
 
@@ -8,22 +9,33 @@ from dotenv import load_dotenv
 # Load .env from project root (parent of backend/)
 load_dotenv(Path(__file__).resolve().parent.parent / ".env")
 
-import tempfile
+# Agent diagnostics go through logging; set LOG_LEVEL=DEBUG to see per-request detail
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import uuid
 import json
 from datetime import datetime
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import BackgroundTasks, FastAPI, File, Form, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
 from rag import (
     parse_document,
     extract_images_ocr,
+    parse_with_ocr,
     semantic_chunk,
     get_embedder,
+    BatchingEmbedder,
+    CachedEmbedder,
     create_vector_store,
     create_bm25_index,
     add_chunks_to_store,
@@ -32,10 +44,12 @@ from rag import (
 from mcp_servers import VectorDBMCPServer, DocumentProcessingMCPServer, WebSearchMCPServer
 
 # Import LangGraph workflow
-from graph import build_rag_graph
+from graph import astream_answer, build_rag_graph, new_turn_state
 
 # Import 6 core agents with LangChain retrievers and components
-from memory import ConversationBufferMemory as SimpleMemory
+from memory import ConversationBufferMemory as SimpleMemory, iso_timestamp, render_timestamps
+from jsonl_log import append_jsonl, read_jsonl, write_jsonl
+from semantic_cache import SemanticCache
 from agents import (
     # Core nodes (used in graph)
     orchestrator_node,
@@ -52,13 +66,30 @@ from agents import (
     create_tools,
     # Re-ranker
     BAAIReranker,
+    preload_reranker,
+    warmup_reranker_in_background,
+    load_score_cache,
+    save_score_cache,
+    clear_retrieval_cache,
 )
 
+# Load the re-ranker at import time so a pre-forking server (gunicorn --preload) shares one copy
+if os.getenv("PRELOAD_RERANKER", "false").lower() == "true":
+    preload_reranker()
+
 # Feature flags for LangChain components
 USE_LANGCHAIN_MEMORY = os.getenv("USE_LANGCHAIN_MEMORY", "true").lower() == "true"
 USE_LANGCHAIN_RETRIEVER = os.getenv("USE_LANGCHAIN_RETRIEVER", "true").lower() == "true"
 USE_LANGCHAIN_CHAIN = os.getenv("USE_LANGCHAIN_CHAIN", "false").lower() == "true"
 
+# Keep per-session graph state in SQLite between turns (needs langgraph-checkpoint-sqlite)
+USE_GRAPH_CHECKPOINTER = os.getenv("USE_GRAPH_CHECKPOINTER", "false").lower() == "true"
+
+# Semantic answer cache for near-duplicate first-turn questions
+USE_SEMANTIC_CACHE = os.getenv("USE_SEMANTIC_CACHE", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+
 # --- Globals (initialized on startup) ---
 embedder = None
 vector_store = None
@@ -67,7 +98,10 @@ vector_db_mcp = None
 doc_processing_mcp = None
 web_search_mcp = None
 rag_graph = None
+rag_stream_graph = None
+graph_checkpointer = None
 memory = SimpleMemory()
+semantic_cache = SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD, ttl_seconds=SEMANTIC_CACHE_TTL)
 
 # LangChain components (optional)
 lc_memory = None
@@ -80,44 +114,138 @@ DATA_DIR = BACKEND_DIR.parent / "data"
 CHROMA_DIR = DATA_DIR / "chroma_db"
 UPLOAD_DIR = DATA_DIR / "uploads"
 BM25_INDEX_FILE = DATA_DIR / "bm25_index.json"
+# Append-only logs; the .json files are the legacy full-rewrite format, migrated on startup
 CONVERSATION_HISTORY_FILE = DATA_DIR / "conversation_history.json"
+CONVERSATION_LOG = DATA_DIR / "conversation_history.jsonl"
 UPLOADED_FILES_LIST = DATA_DIR / "uploaded_files.json"
+UPLOADED_FILES_LOG = DATA_DIR / "uploaded_files.jsonl"
+SEMANTIC_CACHE_FILE = DATA_DIR / "sem_cache.npz"
+QUERY_EMBEDDING_CACHE_FILE = DATA_DIR / "query_emb_cache.npz"
+GRAPH_CHECKPOINT_DB = DATA_DIR / "graph_checkpoints.db"
+RERANK_CACHE_FILE = DATA_DIR / "rerank_cache.npz"
+WEB_SEARCH_CACHE_FILE = DATA_DIR / "web_search_cache.json"
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 # Uploaded files tracking
 uploaded_files = []
 
+# Background upload tasks: task_id -> {"task_id", "status", "results"}. Per process, so with
+# several workers the status endpoint needs sticky routing (or a single worker)
+upload_tasks: Dict[str, dict] = {}
+# task_id -> monotonic time it finished; finished tasks are dropped after UPLOAD_TASK_TTL seconds
+_upload_finished: Dict[str, float] = {}
+UPLOAD_TASK_TTL = float(os.getenv("UPLOAD_TASK_TTL", "3600"))
+# Serializes index writes from concurrent background uploads
+_ingest_lock = threading.Lock()
+
+# Worker processes for PDF parsing and OCR, shared by all uploads; created on first upload
+_PARSE_POOL: Optional[ProcessPoolExecutor] = None
+_parse_pool_lock = threading.Lock()
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    global _PARSE_POOL
+    with _parse_pool_lock:
+        if _PARSE_POOL is None:
+            _PARSE_POOL = ProcessPoolExecutor(max_workers=max(2, (os.cpu_count() or 2) - 1))
+        return _PARSE_POOL
+
+
+def _reset_parse_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a pool broken by a dead worker, so the next _get_parse_pool() starts a fresh one."""
+    global _PARSE_POOL
+    with _parse_pool_lock:
+        if _PARSE_POOL is pool:
+            _PARSE_POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _load_uploaded_files() -> int:
+    """Replay the uploaded-files log into uploaded_files. Returns the number of log lines."""
+    global uploaded_files
+    records = read_jsonl(str(UPLOADED_FILES_LOG))
+    files = []
+    for r in records:
+        if r.get("op") == "delete":
+            files = [f for f in files if f["filename"] != r["filename"]]
+        else:
+            files.append(r)
+    uploaded_files = files
+    return len(records)
+
+
+def _compact_uploaded_files() -> None:
+    """Rewrite the uploaded-files log with only the live records."""
+    write_jsonl(str(UPLOADED_FILES_LOG), uploaded_files)
+
 
-def init_app():
+async def _open_checkpointer():
+    """Open the SQLite graph checkpointer, or return None if its package is missing."""
+    try:
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    except ImportError:
+        print("[Init] langgraph-checkpoint-sqlite not installed; graph checkpoints disabled")
+        return None
+    conn = await aiosqlite.connect(str(GRAPH_CHECKPOINT_DB))
+    return AsyncSqliteSaver(conn)
+
+
+def init_app(checkpointer=None):
     """Initialize RAG components, MCP servers, and LangChain integrations."""
-    global embedder, vector_store, bm25_index, vector_db_mcp, doc_processing_mcp, web_search_mcp, rag_graph, uploaded_files
+    global embedder, vector_store, bm25_index, vector_db_mcp, doc_processing_mcp, web_search_mcp, rag_graph, rag_stream_graph, uploaded_files
     global lc_memory, lc_retriever, lc_tools, lc_chain
 
     print("[Init] Initializing RAG components...")
     
-    # Initialize embedder
-    embedder = get_embedder("models/gemini-embedding-001")
-    
-    # Initialize ChromaDB
-    vector_store = create_vector_store(persist_dir=str(CHROMA_DIR))
-    
-    # Initialize BM25 index
-    bm25_index = create_bm25_index()
+    # Initialize embedder; query embeddings are memoized across agents and requests,
+    # and concurrent cache misses share one embedding request
+    embedder = CachedEmbedder(BatchingEmbedder(
+        get_embedder("models/gemini-embedding-001"),
+        max_batch=int(os.getenv("EMBED_MAX_BATCH", "32")),
+        max_delay_ms=float(os.getenv("EMBED_BATCH_WAIT_MS", "8")),
+    ))
+    try:
+        embedder.load(str(QUERY_EMBEDDING_CACHE_FILE))
+    except Exception as e:
+        print(f"[Init] Could not load query embedding cache: {e}")
     
-    # Load BM25 index from disk if exists
-    if BM25_INDEX_FILE.exists():
+    # Opening ChromaDB and loading BM25 are independent disk reads, so they overlap
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="init-chroma") as pool:
+        # Initialize ChromaDB
+        vector_store_future = pool.submit(create_vector_store, persist_dir=str(CHROMA_DIR))
+        
+        # Initialize BM25 index
+        bm25_index = create_bm25_index()
+        
+        # Load BM25 index snapshot and its delta log from disk if they exist
         bm25_index.load(str(BM25_INDEX_FILE))
+        vector_store = vector_store_future.result()
     
     # Load conversation history from disk if exists
-    if CONVERSATION_HISTORY_FILE.exists():
+    if CONVERSATION_LOG.exists():
+        if memory.load_log(str(CONVERSATION_LOG)) > 2 * memory.message_count():
+            memory.compact_log(str(CONVERSATION_LOG))
+    elif CONVERSATION_HISTORY_FILE.exists():
         memory.load(str(CONVERSATION_HISTORY_FILE))
+        memory.compact_log(str(CONVERSATION_LOG))
     
+    # Load cached answers from the previous run
+    if USE_SEMANTIC_CACHE:
+        try:
+            semantic_cache.load(str(SEMANTIC_CACHE_FILE))
+        except Exception as e:
+            print(f"[Init] Could not load semantic cache: {e}")
+
     # Load uploaded files list
-    global uploaded_files
-    if UPLOADED_FILES_LIST.exists():
+    if UPLOADED_FILES_LOG.exists():
+        if _load_uploaded_files() > 2 * len(uploaded_files):
+            _compact_uploaded_files()
+    elif UPLOADED_FILES_LIST.exists():
         with open(UPLOADED_FILES_LIST, 'r', encoding='utf-8') as f:
             uploaded_files = json.load(f)
+        _compact_uploaded_files()
 
     # Initialize MCP servers
     vector_db_mcp = VectorDBMCPServer(vector_store, bm25_index, embedder)
@@ -132,9 +260,20 @@ def init_app():
     )
 
     web_search_mcp = WebSearchMCPServer()
+    try:
+        web_search_mcp.load_cache(str(WEB_SEARCH_CACHE_FILE))
+    except Exception as e:
+        print(f"[Init] Could not load web search cache: {e}")
     
     print(f"[Init] MCP servers initialized")
 
+    # Load the re-ranker model off the startup path, with scores cached by earlier runs
+    try:
+        load_score_cache(str(RERANK_CACHE_FILE))
+    except Exception as e:
+        print(f"[Init] Could not load rerank score cache: {e}")
+    warmup_reranker_in_background()
+
     # Initialize LangChain Memory
     if USE_LANGCHAIN_MEMORY:
         print("[Init] Initializing LangChain memory...")
@@ -152,7 +291,8 @@ def init_app():
             vector_db_mcp=vector_db_mcp,
             web_search_mcp=web_search_mcp,
             top_k=15,
-            use_web_fallback=True
+            use_web_fallback=True,
+            embedder=embedder,
         )
     
     # Initialize LangChain Tools
@@ -173,7 +313,8 @@ def init_app():
     
     # Build RAG graph
     print("[Init] Building RAG graph...")
-    rag_graph = build_rag_graph(vector_db_mcp, web_search_mcp)
+    rag_graph = build_rag_graph(vector_db_mcp, web_search_mcp, checkpointer=checkpointer)
+    rag_stream_graph = build_rag_graph(vector_db_mcp, web_search_mcp, stream_generation=True, checkpointer=checkpointer)
     
     print(f"[Init] Complete. ChromaDB: {vector_store.count()} documents")
     print(f"[Init] LangChain features: Memory={USE_LANGCHAIN_MEMORY}, Retriever={USE_LANGCHAIN_RETRIEVER}, Chain={USE_LANGCHAIN_CHAIN}")
@@ -218,8 +359,27 @@ app = FastAPI(
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
 @app.on_event("startup")
-def startup():
-    init_app()
+async def startup():
+    global graph_checkpointer
+    if USE_GRAPH_CHECKPOINTER:
+        graph_checkpointer = await _open_checkpointer()
+    init_app(checkpointer=graph_checkpointer)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if _PARSE_POOL is not None:
+        _PARSE_POOL.shutdown(wait=False, cancel_futures=True)
+    if web_search_mcp is not None:
+        await web_search_mcp.aclose()
+        web_search_mcp.save_cache(str(WEB_SEARCH_CACHE_FILE))
+    if graph_checkpointer is not None:
+        await graph_checkpointer.conn.close()
+    if USE_SEMANTIC_CACHE and len(semantic_cache):
+        semantic_cache.save(str(SEMANTIC_CACHE_FILE))
+    if embedder is not None:
+        embedder.save(str(QUERY_EMBEDDING_CACHE_FILE))
+    save_score_cache(str(RERANK_CACHE_FILE))
 
 
 # --- Schemas ---
@@ -241,13 +401,110 @@ class HistoryResponse(BaseModel):
 
 # --- Endpoints ---
 
+def _finish_task(task_id: str, status: str) -> None:
+    upload_tasks[task_id]["status"] = status
+    _upload_finished[task_id] = time.monotonic()
+
+
+def _prune_upload_tasks() -> None:
+    """Forget finished upload tasks older than UPLOAD_TASK_TTL."""
+    cutoff = time.monotonic() - UPLOAD_TASK_TTL
+    for task_id, finished in list(_upload_finished.items()):
+        if finished < cutoff:
+            upload_tasks.pop(task_id, None)
+            _upload_finished.pop(task_id, None)
+
+
+def _ingest_files(task_id: str, files: List[tuple]) -> None:
+    """Run _ingest_task, marking the task as failed if anything in it raises."""
+    try:
+        _finish_task(task_id, _ingest_task(task_id, files))
+    except Exception as e:
+        results = upload_tasks[task_id]["results"]
+        reported = {r["filename"] for r in results}
+        results.extend({"filename": fn, "status": "error", "reason": str(e)} for _, fn in files if fn not in reported)
+        _finish_task(task_id, "error")
+        for path, _ in files:
+            Path(path).unlink(missing_ok=True)
+
+
+def _ingest_task(task_id: str, files: List[tuple]) -> str:
+    """
+    Background ingestion for one /upload call: parse and OCR the files in the shared worker
+    process pool (files from concurrent uploads are spread over all cores), then embed all their chunks in a single embed_documents round-trip and
+    add them to ChromaDB and BM25, saving the BM25 index and file list once.
+    Returns the task's final status.
+    """
+    task = upload_tasks[task_id]
+    task["status"] = "processing"
+    results = task["results"]
+
+    parsed = []
+    pool = _get_parse_pool()
+    try:
+        futures = [(fn, path, pool.submit(parse_with_ocr, path, fn)) for path, fn in files]
+    except BrokenProcessPool:
+        # A worker died during an earlier upload; start this one on a fresh pool
+        _reset_parse_pool(pool)
+        pool = _get_parse_pool()
+        futures = [(fn, path, pool.submit(parse_with_ocr, path, fn)) for path, fn in files]
+    for fn, path, future in futures:
+        try:
+            parsed.append((fn, semantic_chunk(future.result())))
+        except BrokenProcessPool as e:
+            # A worker died (e.g. OOM rasterizing a large PDF); the pool is unusable from here on
+            _reset_parse_pool(pool)
+            results.append({"filename": fn, "status": "error", "reason": f"Parser worker crashed: {e}"})
+        except Exception as e:
+            results.append({"filename": fn, "status": "error", "reason": str(e)})
+        finally:
+            Path(path).unlink(missing_ok=True)
+
+    all_chunks = [c for _, chunks in parsed for c in chunks]
+    try:
+        with _ingest_lock:
+            if all_chunks:
+                add_chunks_to_store(vector_store, bm25_index, all_chunks, embedder)
+                # ChromaDB persists automatically; no save_local needed
+                # Append the new chunks to the BM25 delta log, folding it in when it grows large
+                bm25_index.append(str(BM25_INDEX_FILE), all_chunks)
+                bm25_index.compact(str(BM25_INDEX_FILE))
+
+            # Track uploaded files, appending only the new records to the log
+            records = [
+                {"filename": fn, "upload_time": datetime.now().isoformat(), "chunks": len(chunks)}
+                for fn, chunks in parsed if chunks
+            ]
+            uploaded_files.extend(records)
+            append_jsonl(str(UPLOADED_FILES_LOG), records)
+    except Exception as e:
+        results.extend({"filename": fn, "status": "error", "reason": str(e)} for fn, _ in parsed)
+        return "error"
+
+    results.extend({"filename": fn, "status": "ok", "chunks": len(chunks)} for fn, chunks in parsed)
+    # Cached answers and retrieval candidates may be stale once the knowledge base changes
+    semantic_cache.clear()
+    clear_retrieval_cache()
+    if lc_retriever is not None:
+        lc_retriever.clear_cache()
+    return "done"
+
+
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+
 @app.post("/upload", tags=["Documents"])
-async def upload(files: List[UploadFile] = File(...)):
-    """Upload PDF/TXT/MD files and add to knowledge base."""
+async def upload(background_tasks: BackgroundTasks, files: List[UploadFile] = File(...)):
+    """Upload PDF/TXT/MD files and add them to the knowledge base in the background.
+    
+    Returns a task id right away; poll GET /upload/status/{task_id} for per-file results.
+    """
     if not files:
         raise HTTPException(400, "No files provided")
 
+    task_id = str(uuid.uuid4())
     results = []
+    pending = []
     for f in files:
         fn = f.filename or "document"
         ext = Path(fn).suffix.lower()
@@ -255,82 +512,83 @@ async def upload(files: List[UploadFile] = File(...)):
             results.append({"filename": fn, "status": "skipped", "reason": "Unsupported format"})
             continue
 
-        try:
-            content = await f.read()
-            with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-                tmp.write(content)
-                tmp_path = tmp.name
-
-            parse_result = parse_document(tmp_path, fn)
-            docs = parse_result.get("documents", [])
-            if isinstance(parse_result, dict) and "documents" not in parse_result:
-                docs = [{"content": parse_result.get("text", ""), "metadata": parse_result.get("metadata", {})}]
-
-            ocr_result = extract_images_ocr(tmp_path, fn)
-            if ocr_result.get("text"):
-                docs.append({"content": ocr_result["text"], "metadata": {"source": fn, "page": "ocr"}})
-
-            chunks = semantic_chunk(docs)
-            if chunks:
-                add_chunks_to_store(vector_store, bm25_index, chunks, embedder)
-                # ChromaDB persists automatically; no save_local needed
-                # Save BM25 index
-                bm25_index.save(str(BM25_INDEX_FILE))
-                
-                # Track uploaded file
-                uploaded_files.append({
-                    "filename": fn,
-                    "upload_time": datetime.now().isoformat(),
-                    "chunks": len(chunks)
-                })
-                # Save uploaded files list
-                with open(UPLOADED_FILES_LIST, 'w', encoding='utf-8') as f:
-                    json.dump(uploaded_files, f, ensure_ascii=False, indent=2)
-
-            Path(tmp_path).unlink(missing_ok=True)
-            results.append({"filename": fn, "status": "ok", "chunks": len(chunks)})
-        except Exception as e:
-            results.append({"filename": fn, "status": "error", "reason": str(e)})
+        path = UPLOAD_DIR / f"{uuid.uuid4().hex}{ext}"
+        # Copy in chunks instead of holding the whole file in memory
+        with open(path, "wb") as out:
+            while chunk := await f.read(UPLOAD_CHUNK_SIZE):
+                out.write(chunk)
+        pending.append((str(path), fn))
+
+    _prune_upload_tasks()
+    upload_tasks[task_id] = {"task_id": task_id, "status": "queued", "results": results}
+    if pending:
+        background_tasks.add_task(_ingest_files, task_id, pending)
+    else:
+        _finish_task(task_id, "done")
+    return upload_tasks[task_id]
+
+
+@app.get("/upload/status/{task_id}", tags=["Documents"])
+async def upload_status(task_id: str):
+    """Get the status (queued, processing, done, error) and per-file results of an upload.
+    
+    Tasks live in the worker process that accepted the upload and are kept for
+    UPLOAD_TASK_TTL seconds after they finish; poll through sticky routing or a single worker.
+    """
+    task = upload_tasks.get(task_id)
+    if task is None:
+        raise HTTPException(404, "Upload task not found")
+    return task
+
+
+def _delete_document(filename: str) -> Optional[dict]:
+    """
+    Delete a document's chunks and its uploaded-files record; None if it isn't indexed.
+    Runs under _ingest_lock, so it never interleaves with a background upload's index writes.
+    """
+    with _ingest_lock:
+        if not any(f["filename"] == filename for f in uploaded_files):
+            return None
+
+        # 1. Delete chunks from vector store and BM25
+        counts = delete_chunks_by_source(vector_store, bm25_index, filename)
 
-    return {"results": results}
+        # 2. Remove from uploaded_files in place, so records a concurrent upload appends are kept
+        uploaded_files[:] = [f for f in uploaded_files if f["filename"] != filename]
+
+        # 3. Record the BM25 deletion in its delta log
+        bm25_index.append_delete(str(BM25_INDEX_FILE), filename)
+        bm25_index.compact(str(BM25_INDEX_FILE))
+
+        # Record the deletion in the uploaded files log
+        append_jsonl(str(UPLOADED_FILES_LOG), [{"op": "delete", "filename": filename}])
+
+    semantic_cache.clear()
+    clear_retrieval_cache()
+    if lc_retriever is not None:
+        lc_retriever.clear_cache()
+    return counts
 
 
 @app.delete("/document/{filename}", tags=["Documents"])
 async def delete_document(filename: str):
     """Delete a document and all its chunks from the knowledge base."""
-    global uploaded_files
-    
     print(f"[Delete] Request to delete document: {filename}")
     
-    # 1. Check if file exists in uploaded_files
-    file_record = next((f for f in uploaded_files if f["filename"] == filename), None)
-    if not file_record:
-        raise HTTPException(status_code=404, detail="Document not found")
-    
     try:
-        # 2. Delete chunks from vector store and BM25
-        # delete_chunks_by_source is imported from rag
-        counts = delete_chunks_by_source(vector_store, bm25_index, filename)
-        
-        # 3. Remove from uploaded_files list
-        uploaded_files = [f for f in uploaded_files if f["filename"] != filename]
-        
-        # 4. Save updated lists
-        # Save BM25 index
-        bm25_index.save(str(BM25_INDEX_FILE))
-        
-        # Save uploaded files list
-        with open(UPLOADED_FILES_LIST, 'w', encoding='utf-8') as f:
-            json.dump(uploaded_files, f, ensure_ascii=False, indent=2)
-            
-        return {
-            "status": "deleted", 
-            "filename": filename, 
-            "chunks_deleted": counts
-        }
+        # Off the event loop: it may wait for an upload holding the ingest lock
+        counts = await asyncio.to_thread(_delete_document, filename)
     except Exception as e:
         print(f"[Delete] Error deleting document: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    if counts is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    return {
+        "status": "deleted", 
+        "filename": filename, 
+        "chunks_deleted": counts
+    }
 
 
 @app.post("/ask", response_model=AskResponse, tags=["Chat"])
@@ -354,7 +612,7 @@ async def ask(req: AskRequest):
         
         try:
             # Invoke the chain
-            answer = lc_chain.invoke({
+            answer = await lc_chain.ainvoke({
                 "query": req.query,
                 "session_id": session_id,
                 "chat_history": chat_history
@@ -372,25 +630,39 @@ async def ask(req: AskRequest):
     
     # Option 2: Use LangGraph workflow (default)
     history = memory.get(session_id)
-    state = {
-        "query": req.query,
-        "session_id": session_id,
-        "conversation_history": history,
-        "retrieved_chunks": [],
-        "reranked_chunks": [],
-        "generated_answer": "",
-        "citations": [],
-        "final_response": "",
-    }
 
-    result = rag_graph.invoke(state)
+    # Only first turns are cached: follow-ups depend on the conversation so far
+    query_embedding = None
+    if USE_SEMANTIC_CACHE and not history:
+        try:
+            query_embedding = await embedder.aembed_query(req.query)
+            hit = semantic_cache.lookup(query_embedding)
+        except Exception as e:
+            print(f"[Ask] Semantic cache lookup failed: {e}")
+            query_embedding = hit = None
+        if hit:
+            memory.add(session_id, "user", req.query)
+            memory.add(session_id, "assistant", hit["answer"])
+            memory.append_log(str(CONVERSATION_LOG), session_id)
+            return AskResponse(answer=hit["answer"], citations=hit["citations"], session_id=session_id)
+
+    state = new_turn_state(req.query, session_id, history)
+    if query_embedding is not None:
+        # Retrieval reuses it instead of embedding the query again
+        state["query_embedding"] = query_embedding
+
+    result = await rag_graph.ainvoke(state, config={"configurable": {"thread_id": session_id}})
     final = result.get("final_response", result.get("generated_answer", "No answer generated."))
     citations = result.get("citations", [])
+    # Answers built from web search (often "latest"/"today" queries) go stale, so only KB answers are cached
+    used_web = result.get("needs_web_search") or result.get("web_search_attempted")
+    if query_embedding is not None and not result.get("error") and not used_web:
+        semantic_cache.add(req.query, query_embedding, final, citations)
 
     # Save to memory
     memory.add(session_id, "user", req.query)
     memory.add(session_id, "assistant", final)
-    memory.save(str(CONVERSATION_HISTORY_FILE))
+    memory.append_log(str(CONVERSATION_LOG), session_id)
     
     # Also save to LangChain memory if available
     if lc_memory:
@@ -401,11 +673,89 @@ async def ask(req: AskRequest):
     return AskResponse(answer=final, citations=citations, session_id=session_id)
 
 
+@app.post("/ask/stream", tags=["Chat"])
+async def ask_stream(req: AskRequest, request: Request):
+    """Ask a question and stream the answer as newline-delimited JSON events.
+    
+    Emits one {"type": "citations"} event, then {"type": "token"} events as the
+    answer is generated, and a final {"type": "done"} event with the session id.
+    Streams from the LangChain RAG chain instead of the graph when USE_LANGCHAIN_CHAIN is set.
+    Clients sending ``Accept: text/event-stream`` get the same events as
+    Server-Sent Events (``data: {...}`` frames) instead.
+    """
+    session_id = req.session_id or str(uuid.uuid4())
+    history = memory.get(session_id)
+    state = new_turn_state(req.query, session_id, history)
+    sse = "text/event-stream" in request.headers.get("accept", "")
+
+    def frame(event: dict) -> str:
+        data = json.dumps(event)
+        return f"data: {data}\n\n" if sse else data + "\n"
+
+    async def events():
+        parts = []
+        async for kind, payload in astream_answer(rag_stream_graph, state, config={"configurable": {"thread_id": session_id}}):
+            if kind == "token":
+                parts.append(payload)
+                yield frame({"type": "token", "content": payload})
+            else:
+                yield frame({"type": kind, kind: payload})
+        final = "".join(parts)
+
+        # Save to memory
+        memory.add(session_id, "user", req.query)
+        memory.add(session_id, "assistant", final)
+        memory.append_log(str(CONVERSATION_LOG), session_id)
+        
+        # Also save to LangChain memory if available
+        if lc_memory:
+            lc_memory.add_message(session_id, "user", req.query)
+            lc_memory.add_message(session_id, "assistant", final)
+            lc_memory.save(str(CONVERSATION_HISTORY_FILE))
+
+        yield frame({"type": "done", "session_id": session_id})
+
+    async def chain_events():
+        """Stream the LangChain RAG chain's answer; if it fails before its first token, use the graph."""
+        lc_memory.set_session(session_id)
+        chain_input = {
+            "query": req.query,
+            "session_id": session_id,
+            "chat_history": lc_memory.get_langchain_messages(session_id),
+        }
+        parts = []
+        try:
+            async for token in lc_chain.astream(chain_input):
+                if not parts:
+                    # The chain doesn't produce citations, same as /ask
+                    yield frame({"type": "citations", "citations": []})
+                parts.append(token)
+                yield frame({"type": "token", "content": token})
+        except Exception as e:
+            if parts:
+                raise
+            print(f"[Ask] LangChain chain failed: {e}, falling back to graph")
+            async for event in events():
+                yield event
+            return
+        
+        # Save to memory
+        lc_memory.add_message(session_id, "user", req.query)
+        lc_memory.add_message(session_id, "assistant", "".join(parts))
+        lc_memory.save(str(CONVERSATION_HISTORY_FILE))
+        yield frame({"type": "done", "session_id": session_id})
+
+    stream = chain_events() if USE_LANGCHAIN_CHAIN and lc_chain and lc_memory else events()
+    if sse:
+        return StreamingResponse(stream, media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+    return StreamingResponse(stream, media_type="application/x-ndjson")
+
+
 @app.get("/history", response_model=HistoryResponse, tags=["History"])
 async def get_history(session_id: Optional[str] = None):
     """Get conversation history for a session."""
     sid = session_id or ""
-    return HistoryResponse(session_id=sid, history=memory.get(sid))
+    return HistoryResponse(session_id=sid, history=render_timestamps(memory.get(sid)))
 
 
 @app.get("/sessions", tags=["History"])
@@ -419,10 +769,12 @@ async def get_sessions():
                 "id": session_id,
                 "first_message": first_msg.get("content", "")[:50] + "..." if first_msg else "New conversation",
                 "message_count": len(history),
-                "last_updated": max((msg.get("timestamp", "") for msg in history), default="")
+                "last_updated": max(msg.get("timestamp", 0) for msg in history),
             })
-    # Sort by last updated (most recent first)
-    sessions.sort(key=lambda x: x.get("last_updated", ""), reverse=True)
+    # Sort by last updated (most recent first), then render the epoch-ns timestamps
+    sessions.sort(key=lambda x: x["last_updated"], reverse=True)
+    for session in sessions:
+        session["last_updated"] = iso_timestamp(session["last_updated"])
     return {"sessions": sessions}
 
 
@@ -430,8 +782,7 @@ async def get_sessions():
 async def delete_session(session_id: str):
     """Delete a conversation session."""
     if session_id in memory.sessions:
-        del memory.sessions[session_id]
-        memory.save(str(CONVERSATION_HISTORY_FILE))
+        memory.delete(str(CONVERSATION_LOG), session_id)
         return {"status": "deleted", "session_id": session_id}
     raise HTTPException(404, "Session not found")
 
@@ -442,6 +793,15 @@ async def get_uploaded_files():
     return {"files": uploaded_files}
 
 
+@app.get("/health")
+async def health():
+    """Liveness check; reports whether the RAG components are initialized and the chunk count."""
+    return {
+        "status": "ok" if rag_graph is not None else "initializing",
+        "documents": vector_store.count() if vector_store is not None else 0,
+    }
+
+
 
 # --- Serve frontend ---
 FRONTEND_DIR = BACKEND_DIR.parent / "frontend"
@@ -1,5 +1,6 @@
 """Base MCP Server interface - all MCP servers inherit from this."""
 
+import asyncio
 from abc import ABC, abstractmethod
 from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
@@ -29,6 +30,10 @@ class BaseMCPServer(ABC):
         """Execute an MCP method. All agents call servers via this interface."""
         pass
 
+    async def acall(self, method: str, **params) -> MCPResponse:
+        """Async variant of call(); runs call() in a worker thread unless a server overrides it."""
+        return await asyncio.to_thread(self.call, method, **params)
+
     def _success(self, result: Any) -> MCPResponse:
         return MCPResponse(result=result, success=True)
 
@@ -1,8 +1,21 @@
 """VectorDB MCP Server - Wraps ChromaDB and BM25 for hybrid search."""
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
+import numpy as np
+
+# Optional: xxh3 hashes chunk content in SIMD C; the builtin str hash is used otherwise
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+from rag.fusion import rrf_fuse
+
 from .base_mcp import BaseMCPServer, MCPResponse
 
 
@@ -18,6 +31,8 @@ class VectorDBMCPServer(BaseMCPServer):
         self._vector_store = vector_store  # ChromaVectorStore
         self._bm25_index = bm25_index
         self._embedder = embedder
+        # Runs the vector and keyword legs of a sync hybrid search side by side
+        self._legs = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-search")
 
     def set_backends(self, vector_store, bm25_index, embedder):
         """Inject RAG backends after they are initialized."""
@@ -29,6 +44,8 @@ class VectorDBMCPServer(BaseMCPServer):
         """Handle MCP-style calls."""
         if method == "vector_search":
             return self._vector_search(**params)
+        if method == "vector_search_many":
+            return self._vector_search_many(**params)
         if method == "keyword_search":
             return self._keyword_search(**params)
         if method == "hybrid_search":
@@ -39,16 +56,23 @@ class VectorDBMCPServer(BaseMCPServer):
             return self._success({"status": "ok", "server": self.name})
         return self._error(f"Unknown method: {method}")
 
+    async def acall(self, method: str, **params) -> MCPResponse:
+        """Async MCP calls; hybrid search runs its vector and keyword legs concurrently."""
+        if method == "hybrid_search":
+            return await self._ahybrid_search(**params)
+        return await super().acall(method, **params)
+
     def _vector_search(
-        self, query: str, top_k: int = 10, **kwargs
+        self, query: str, top_k: int = 10, query_embedding: Optional[List[float]] = None, **kwargs
     ) -> MCPResponse:
-        """Vector similarity search via ChromaDB."""
+        """Vector similarity search via ChromaDB. Pass query_embedding to skip embedding the query."""
         if not self._vector_store or not self._embedder:
             return self._success({"chunks": [], "scores": []})
         
         try:
-            # Generate query embedding
-            query_embedding = self._embedder.embed_query(query)
+            # Generate query embedding unless the caller already has it
+            if query_embedding is None:
+                query_embedding = self._embedder.embed_query(query)
             
             # Search ChromaDB
             chunks = self._vector_store.search(query_embedding, top_k=top_k)
@@ -61,6 +85,24 @@ class VectorDBMCPServer(BaseMCPServer):
             print(f"[VectorDB MCP] Vector search error: {e}")
             return self._error(str(e))
 
+    def _vector_search_many(self, queries: List[str], top_k: int = 10, **kwargs) -> MCPResponse:
+        """
+        Vector search for several queries (sub-questions, HyDE variants) with one embedding
+        request and one ChromaDB query. Returns {"searches": [{"chunks", "scores"} per query]}.
+        """
+        if not self._vector_store or not self._embedder or not queries:
+            return self._success({"searches": [{"chunks": [], "scores": []} for _ in queries]})
+        
+        try:
+            embeddings = self._embedder.embed_documents(queries)
+            results = self._vector_store.search_batch(embeddings, top_k=top_k)
+            return self._success({"searches": [
+                {"chunks": chunks, "scores": [c.get("distance", 0.0) for c in chunks]} for chunks in results
+            ]})
+        except Exception as e:
+            print(f"[VectorDB MCP] Batch vector search error: {e}")
+            return self._error(str(e))
+
     def _keyword_search(
         self, query: str, top_k: int = 10, **kwargs
     ) -> MCPResponse:
@@ -76,57 +118,129 @@ class VectorDBMCPServer(BaseMCPServer):
             return self._error(str(e))
 
     def _hybrid_search(
-        self, query: str, top_k: int = 10, vector_weight: float = 0.7, **kwargs
+        self, query: str, top_k: int = 10, vector_weight: float = 0.7, fusion: str = "rrf", **kwargs
     ) -> MCPResponse:
-        """Combine vector and keyword search, return merged results."""
-        vec_resp = self._vector_search(query=query, top_k=top_k * 2)
-        kw_resp = self._keyword_search(query=query, top_k=top_k * 2)
+        """
+        Combine vector and keyword search, return merged results.
+        fusion="rrf" (default) uses Reciprocal Rank Fusion; fusion="weighted" blends scores.
+        """
+        vec_future = self._legs.submit(
+            self._vector_search, query=query, top_k=top_k * 2, query_embedding=kwargs.get("query_embedding")
+        )
+        kw_future = self._legs.submit(self._keyword_search, query=query, top_k=top_k * 2)
+        vec_resp, kw_resp = vec_future.result(), kw_future.result()
+        return self._fuse(vec_resp, kw_resp, top_k, vector_weight, fusion)
 
-        all_chunks: Dict[str, Dict[str, Any]] = {}
-        
-        # Add vector search results
+    async def _ahybrid_search(
+        self, query: str, top_k: int = 10, vector_weight: float = 0.7, fusion: str = "rrf", **kwargs
+    ) -> MCPResponse:
+        """
+        Same as _hybrid_search, but the vector leg (a remote embedding call plus ChromaDB)
+        and the BM25 leg run in parallel worker threads instead of one after the other.
+        """
+        vec_resp, kw_resp = await asyncio.gather(
+            self._avector_search(query, top_k * 2, kwargs.get("query_embedding")),
+            asyncio.to_thread(self._keyword_search, query=query, top_k=top_k * 2),
+        )
+        return self._fuse(vec_resp, kw_resp, top_k, vector_weight, fusion)
+
+    async def _avector_search(
+        self, query: str, top_k: int, query_embedding: Optional[List[float]]
+    ) -> MCPResponse:
+        """Vector leg of _ahybrid_search; the query is embedded on the event loop when the embedder batches async calls."""
+        if query_embedding is None and self._vector_store and hasattr(self._embedder, "aembed_query"):
+            try:
+                query_embedding = await self._embedder.aembed_query(query)
+            except Exception as e:
+                print(f"[VectorDB MCP] Vector search error: {e}")
+                return self._error(str(e))
+        return await asyncio.to_thread(self._vector_search, query=query, top_k=top_k, query_embedding=query_embedding)
+
+    @staticmethod
+    def _chunk_id(content: str) -> int:
+        """64-bit id for de-duplicating a chunk across the two result lists of one search."""
+        if XXHASH_AVAILABLE:
+            return xxhash.xxh3_64_intdigest(content.encode("utf-8"))
+        return hash(content)
+
+    def _fuse(
+        self, vec_resp: MCPResponse, kw_resp: MCPResponse, top_k: int, vector_weight: float, fusion: str
+    ) -> MCPResponse:
+        """Merge vector and keyword results, de-duplicated by a hash of the full content."""
+        vec_chunks = vec_resp.result.get("chunks", []) if vec_resp.success and vec_resp.result else []
+        kw_chunks = kw_resp.result.get("chunks", []) if kw_resp.success and kw_resp.result else []
+        if not vec_chunks or not kw_chunks:
+            return self._single(vec_resp if vec_chunks else kw_resp, top_k, vector_weight, fusion, is_vector=bool(vec_chunks))
+
+        chunks: List[Dict[str, Any]] = []
+        vec_rank: List[int] = []
+        kw_rank: List[int] = []
+        vec_score: List[float] = []
+        index: Dict[int, int] = {}
+
+        # Vector results first, so ties keep vector-then-keyword order
         if vec_resp.success and vec_resp.result:
+            distances = vec_resp.result.get("scores", [])
             for i, c in enumerate(vec_resp.result.get("chunks", [])):
-                key = c.get("content", "")[:100]
-                if key not in all_chunks:
-                    # ChromaDB returns distance (lower is better), normalize to score (higher is better)
-                    distance = vec_resp.result.get("scores", [])[i] if i < len(vec_resp.result.get("scores", [])) else 1.0
-                    vec_score = 1.0 / (1.0 + distance)  # Convert distance to similarity score
-                    all_chunks[key] = {
-                        "chunk": c,
-                        "vec_score": vec_score,
-                        "kw_score": 0
-                    }
-        
-        # Add keyword search results
+                cid = self._chunk_id(c.get("content", ""))
+                if cid in index:
+                    continue
+                index[cid] = len(chunks)
+                chunks.append(c)
+                vec_rank.append(i)
+                kw_rank.append(-1)
+                # ChromaDB returns distance (lower is better); only weighted fusion uses it
+                vec_score.append(1.0 / (1.0 + (distances[i] if i < len(distances) else 1.0)))
+
         if kw_resp.success and kw_resp.result:
             for i, c in enumerate(kw_resp.result.get("chunks", [])):
-                key = c.get("content", "")[:100] if isinstance(c, dict) else str(c)[:100]
-                if key not in all_chunks:
-                    all_chunks[key] = {
-                        "chunk": c if isinstance(c, dict) else {"content": c, "metadata": {}},
-                        "vec_score": 0,
-                        "kw_score": 1.0 - (i * 0.05)  # Decay score by rank
-                    }
-                else:
-                    all_chunks[key]["kw_score"] = max(
-                        all_chunks[key].get("kw_score", 0),
-                        1.0 - (i * 0.05)
-                    )
-
-        # Weighted score fusion
-        ranked = []
-        for v in all_chunks.values():
-            combined_score = (
-                vector_weight * v["vec_score"] +
-                (1 - vector_weight) * v.get("kw_score", 0)
-            )
-            ranked.append((v["chunk"], combined_score))
-        
-        ranked.sort(key=lambda x: x[1], reverse=True)
-        chunks = [r[0] for r in ranked[:top_k]]
-        scores = [r[1] for r in ranked[:top_k]]
-        
+                if not isinstance(c, dict):
+                    c = {"content": str(c), "metadata": {}}
+                cid = self._chunk_id(c.get("content", ""))
+                j = index.get(cid)
+                if j is None:
+                    index[cid] = len(chunks)
+                    chunks.append(c)
+                    vec_rank.append(-1)
+                    kw_rank.append(i)
+                    vec_score.append(0.0)
+                elif kw_rank[j] < 0:
+                    kw_rank[j] = i
+
+        if not chunks or top_k <= 0:
+            return self._success({"chunks": [], "scores": []})
+
+        kw_ranks = np.array(kw_rank, dtype=np.float32)
+        if fusion == "weighted":
+            # Blend the distance-derived similarity with a rank-decayed keyword score
+            kw_scores = np.where(kw_ranks >= 0, 1.0 - kw_ranks * 0.05, 0.0).astype(np.float32)
+            fused = vector_weight * np.array(vec_score, dtype=np.float32) + (1 - vector_weight) * kw_scores
+        else:
+            fused = rrf_fuse(np.array(vec_rank, dtype=np.float32), kw_ranks)
+
+        # Select the top k in O(n), then sort only those; stable so ties keep insertion order
+        k = min(top_k, len(chunks))
+        top = np.argpartition(-fused, k - 1)[:k]
+        top = top[np.lexsort((top, -fused[top]))]
+        return self._success({
+            "chunks": [chunks[i] for i in top],
+            "scores": [float(fused[i]) for i in top],
+        })
+
+    def _single(
+        self, resp: MCPResponse, top_k: int, vector_weight: float, fusion: str, is_vector: bool
+    ) -> MCPResponse:
+        """Only one leg returned results (BM25 empty, cold Chroma): keep its order, score it as _fuse would."""
+        if not resp.success or not resp.result or top_k <= 0:
+            return self._success({"chunks": [], "scores": []})
+        chunks = [c if isinstance(c, dict) else {"content": str(c), "metadata": {}} for c in resp.result.get("chunks", [])[:top_k]]
+        if fusion != "weighted":
+            scores = [1.0 / (61.0 + i) for i in range(len(chunks))]
+        elif is_vector:
+            distances = resp.result.get("scores", [])
+            scores = [vector_weight / (1.0 + (distances[i] if i < len(distances) else 1.0)) for i in range(len(chunks))]
+        else:
+            scores = [(1 - vector_weight) * (1.0 - i * 0.05) for i in range(len(chunks))]
         return self._success({"chunks": chunks, "scores": scores})
 
     def _add_documents(self, chunks: List[Dict[str, Any]], **kwargs) -> MCPResponse:
@@ -1,10 +1,51 @@
 """WebSearch MCP Server - Serper.dev integration for real-time web search."""
 
+import asyncio
+import json
 import os
-from typing import Any, Dict, List
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+
+from llm_provider import get_llm
 
 from .base_mcp import BaseMCPServer, MCPResponse
 
+try:
+    import h2  # noqa: F401 - httpx needs it for HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+SERPER_URL = "https://google.serper.dev/search"
+
+# Successful Serper results are reused for SEARCH_CACHE_TTL seconds (LRU-capped);
+# a failed query skips Serper for NEGATIVE_CACHE_TTL seconds so a burst doesn't hammer it
+SEARCH_CACHE_TTL = float(os.getenv("WEB_SEARCH_CACHE_TTL", "3600"))
+SEARCH_CACHE_SIZE = 1024
+NEGATIVE_CACHE_TTL = 60.0
+NEGATIVE_CACHE_SIZE = 256
+
+# Prompt for answering from the LLM when Serper is unavailable; the chain is built on first use
+_FALLBACK_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "You are a knowledgeable assistant with access to general world knowledge. "
+     "Provide a comprehensive, factual answer to the user's question. "
+     "Format your response as if it were a search result snippet (2-3 sentences, factual and informative). "
+     "Do not mention that you're an AI or that you don't have access to real-time data."),
+    ("human", "{query}")
+])
+
+# Keep-alive pool shared by all searches; failed connects are retried by the transport
+_POOL_LIMITS = httpx.Limits(max_connections=16, max_keepalive_connections=8)
+_CONNECT_RETRIES = 2
+
 
 class WebSearchMCPServer(BaseMCPServer):
     """
@@ -12,10 +53,19 @@ class WebSearchMCPServer(BaseMCPServer):
     Agents call this to search the web for real-time information.
     """
 
-    def __init__(self):
+    def __init__(self, aclient: Optional[httpx.AsyncClient] = None):
+        """aclient: an async client to share with other servers; it is then not closed by aclose()."""
         super().__init__("WebSearchMCPServer")
         self.api_key = os.getenv("SERPER_API_KEY")
-        self._search_cache: Dict[str, Dict[str, Any]] = {}
+        # query -> (time cached, result); only real Serper results, never fallbacks
+        self._search_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # query -> time of the last Serper failure
+        self._neg_cache: "OrderedDict[str, float]" = OrderedDict()
+        # Pooled clients, created on first use so keep-alive connections skip repeat TLS handshakes
+        self._client: Optional[httpx.Client] = None
+        self._aclient: Optional[httpx.AsyncClient] = aclient
+        self._owns_aclient = aclient is None
+        self._fallback_chain: Optional[Runnable] = None
         print(f"[{self.name}] Initialized. API Key configured: {bool(self.api_key)}")
 
     def call(self, method: str, **params) -> MCPResponse:
@@ -23,10 +73,143 @@ class WebSearchMCPServer(BaseMCPServer):
         print(f"[{self.name}] Called method: {method} with params: {params.keys()}")
         if method == "search":
             return self._search(**params)
+        if method == "search_many":
+            return self._search_many(**params)
         if method == "health":
             return self._success({"status": "ok", "server": self.name, "api_configured": bool(self.api_key)})
         return self._error(f"Unknown method: {method}")
 
+    async def acall(self, method: str, **params) -> MCPResponse:
+        """Async MCP calls; search goes through the pooled async HTTP client."""
+        if method == "search":
+            return await self._asearch(**params)
+        if method == "search_many":
+            return await self.search_many(**params)
+        return await super().acall(method, **params)
+
+    def _headers(self) -> Dict[str, str]:
+        return {"X-API-KEY": self.api_key, "Content-Type": "application/json"}
+
+    def _get_client(self) -> httpx.Client:
+        if self._client is None:
+            self._client = httpx.Client(
+                timeout=10,
+                transport=httpx.HTTPTransport(retries=_CONNECT_RETRIES, limits=_POOL_LIMITS),
+            )
+        return self._client
+
+    def _get_aclient(self) -> httpx.AsyncClient:
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(
+                timeout=10,
+                transport=httpx.AsyncHTTPTransport(http2=HTTP2_AVAILABLE, retries=_CONNECT_RETRIES, limits=_POOL_LIMITS),
+            )
+        return self._aclient
+
+    async def aclose(self) -> None:
+        """Close the pooled HTTP clients (called on app shutdown)."""
+        if self._aclient is not None and self._owns_aclient:
+            await self._aclient.aclose()
+            self._aclient = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    def _cached(self, query: str) -> Optional[Dict[str, Any]]:
+        entry = self._search_cache.get(query)
+        if entry is None:
+            return None
+        if time.time() - entry[0] > SEARCH_CACHE_TTL:
+            del self._search_cache[query]
+            return None
+        self._search_cache.move_to_end(query)
+        return entry[1]
+
+    def _recently_failed(self, query: str) -> bool:
+        failed_at = self._neg_cache.get(query)
+        if failed_at is None:
+            return False
+        if time.time() - failed_at > NEGATIVE_CACHE_TTL:
+            del self._neg_cache[query]
+            return False
+        return True
+
+    def _mark_failed(self, query: str) -> None:
+        self._neg_cache[query] = time.time()
+        self._neg_cache.move_to_end(query)
+        while len(self._neg_cache) > NEGATIVE_CACHE_SIZE:
+            self._neg_cache.popitem(last=False)
+
+    def save_cache(self, filepath: str) -> None:
+        """Save unexpired search results as JSON so they survive restarts."""
+        now = time.time()
+        entries = [[q, ts, data] for q, (ts, data) in self._search_cache.items() if now - ts <= SEARCH_CACHE_TTL]
+        with open(filepath, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+
+    def load_cache(self, filepath: str) -> None:
+        """Load results saved by save_cache(), skipping any that have expired."""
+        if not Path(filepath).exists():
+            return
+        with open(filepath, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        now = time.time()
+        self._search_cache = OrderedDict(
+            (q, (ts, data)) for q, ts, data in entries[-SEARCH_CACHE_SIZE:] if now - ts <= SEARCH_CACHE_TTL
+        )
+
+    def _format_results(self, data: Dict[str, Any], query: str, top_k: int) -> Dict[str, Any]:
+        """Format Serper results and cache them."""
+        results = []
+        for item in data.get("organic", [])[:top_k]:
+            results.append({
+                "title": item.get("title", ""),
+                "snippet": item.get("snippet", ""),
+                "url": item.get("link", "")
+            })
+        
+        print(f"[{self.name}] API success. Found {len(results)} results.")
+        result_data = {"results": results, "query": query, "total": len(results)}
+        self._search_cache[query] = (time.time(), result_data)
+        self._search_cache.move_to_end(query)
+        while len(self._search_cache) > SEARCH_CACHE_SIZE:
+            self._search_cache.popitem(last=False)
+        self._neg_cache.pop(query, None)
+        return result_data
+
+    async def _asearch(self, query: str, top_k: int = 5, **kwargs) -> MCPResponse:
+        """Async variant of _search over the pooled HTTP/2 client."""
+        cached = self._cached(query)
+        if cached is not None:
+            print(f"[{self.name}] Returning cached result for: {query}")
+            return self._success(cached)
+        
+        if not self.api_key or self._recently_failed(query):
+            print(f"[{self.name}] No API key or recent API failure. Using LLM fallback.")
+            return await asyncio.to_thread(self._llm_fallback, query, top_k)
+        
+        try:
+            response = await self._get_aclient().post(SERPER_URL, json={"q": query, "num": top_k}, headers=self._headers())
+            response.raise_for_status()
+            return self._success(self._format_results(response.json(), query, top_k))
+        except Exception as e:
+            print(f"[{self.name}] Web search API failed: {e}. Using LLM fallback.")
+            self._mark_failed(query)
+            return await asyncio.to_thread(self._llm_fallback, query, top_k)
+
+    async def search_many(self, queries: List[str], top_k: int = 5, **kwargs) -> MCPResponse:
+        """
+        Search several queries concurrently (e.g. sub-questions from query decomposition),
+        so their Serper round-trips overlap. Returns {"searches": [result per query]} in order.
+        """
+        responses = await asyncio.gather(*(self._asearch(q, top_k) for q in queries))
+        return self._success({"searches": [r.result if r.success else {"error": r.error} for r in responses]})
+
+    def _search_many(self, queries: List[str], top_k: int = 5, **kwargs) -> MCPResponse:
+        """Sync counterpart of search_many; searches run one after the other."""
+        responses = [self._search(q, top_k) for q in queries]
+        return self._success({"searches": [r.result if r.success else {"error": r.error} for r in responses]})
+
     def _search(self, query: str, top_k: int = 5, **kwargs) -> MCPResponse:
         """
         Search the web using Serper.dev API.
@@ -35,50 +218,31 @@ class WebSearchMCPServer(BaseMCPServer):
         print(f"[{self.name}] Searching for: {query}")
         
         # Check cache first
-        if query in self._search_cache:
+        cached = self._cached(query)
+        if cached is not None:
             print(f"[{self.name}] Returning cached result for: {query}")
-            return self._success(self._search_cache[query])
+            return self._success(cached)
         
-        # Check if API key is configured
-        if not self.api_key:
-            print(f"[{self.name}] No API key found. Using LLM fallback.")
+        # Check if API key is configured and Serper hasn't just failed for this query
+        if not self.api_key or self._recently_failed(query):
+            print(f"[{self.name}] No API key or recent API failure. Using LLM fallback.")
             return self._llm_fallback(query, top_k)
         
         try:
-            import requests
-            
-            url = "https://google.serper.dev/search"
-            headers = {
-                "X-API-KEY": self.api_key,
-                "Content-Type": "application/json"
-            }
             payload = {
                 "q": query,
                 "num": top_k
             }
             
             print(f"[{self.name}] Sending request to Serper API...")
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
+            response = self._get_client().post(SERPER_URL, json=payload, headers=self._headers())
             response.raise_for_status()
-            data = response.json()
-            
-            # Format results
-            results = []
-            for item in data.get("organic", [])[:top_k]:
-                results.append({
-                    "title": item.get("title", ""),
-                    "snippet": item.get("snippet", ""),
-                    "url": item.get("link", "")
-                })
-            
-            print(f"[{self.name}] API success. Found {len(results)} results.")
-            result_data = {"results": results, "query": query, "total": len(results)}
-            self._search_cache[query] = result_data
-            return self._success(result_data)
+            return self._success(self._format_results(response.json(), query, top_k))
             
         except Exception as e:
             # Fallback to LLM-generated answer if API fails
             print(f"[{self.name}] Web search API failed: {e}. Using LLM fallback.")
+            self._mark_failed(query)
             return self._llm_fallback(query, top_k)
 
     def _llm_fallback(self, query: str, top_k: int = 5) -> MCPResponse:
@@ -87,29 +251,11 @@ class WebSearchMCPServer(BaseMCPServer):
         This provides better results than generic simulated data.
         """
         try:
-            # Import LLM provider
-            import sys
-            import os
-            # Add parent directory to path to import llm_provider
-            sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-            from llm_provider import get_llm
-            from langchain_core.prompts import ChatPromptTemplate
-            
             print(f"[{self.name}] Using LLM to answer: {query}")
             
-            prompt = ChatPromptTemplate.from_messages([
-                ("system",
-                 "You are a knowledgeable assistant with access to general world knowledge. "
-                 "Provide a comprehensive, factual answer to the user's question. "
-                 "Format your response as if it were a search result snippet (2-3 sentences, factual and informative). "
-                 "Do not mention that you're an AI or that you don't have access to real-time data."),
-                ("human", "{query}")
-            ])
-            
-            llm = get_llm(temperature=0.3, max_tokens=512)
-            chain = prompt | llm
-            response = chain.invoke({"query": query})
-            answer = response.content if hasattr(response, "content") else str(response)
+            if self._fallback_chain is None:
+                self._fallback_chain = _FALLBACK_PROMPT | get_llm(temperature=0.3, max_tokens=512) | StrOutputParser()
+            answer = self._fallback_chain.invoke({"query": query})
             
             # Format as search result
             results = [{
@@ -120,8 +266,8 @@ class WebSearchMCPServer(BaseMCPServer):
             }]
             
             print(f"[{self.name}] LLM fallback generated answer")
+            # Not cached: a transient Serper outage must not pin the fallback answer
             result_data = {"results": results, "query": query, "total": len(results), "is_llm_fallback": True}
-            self._search_cache[query] = result_data
             return self._success(result_data)
             
         except Exception as e:
@@ -1,19 +1,56 @@
 """Conversation buffer memory for follow-up questions."""
 
-from typing import Any, Dict, List
-from collections import defaultdict
+import time
+from itertools import islice
+from typing import Any, Deque, Dict, Iterable, List, Union
+from collections import defaultdict, deque
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
+
+from jsonl_log import append_jsonl, dumps, read_jsonl, write_jsonl
+
+
+def iso_timestamp(ns: int) -> str:
+    """Render a time.time_ns() message timestamp as an ISO-8601 UTC string."""
+    return datetime.fromtimestamp(ns / 1e9, tz=timezone.utc).isoformat()
+
+
+def _to_ns(ts: Union[int, str, None]) -> int:
+    """Timestamp as epoch nanoseconds; older logs stored naive local ISO strings."""
+    if isinstance(ts, int):
+        return ts
+    try:
+        return int(datetime.fromisoformat(ts).timestamp() * 1e9)
+    except (TypeError, ValueError):
+        return 0
+
+
+def render_timestamps(messages: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copies of the messages with ISO timestamps, for API responses and files."""
+    return [{**m, "timestamp": iso_timestamp(m.get("timestamp", 0))} for m in messages]
 
 
 class ConversationBufferMemory:
-    """In-memory conversation history per session with persistence support."""
+    """
+    In-memory conversation history per session with persistence support.
+    Each session keeps at most max_history messages; older ones drop off the front.
+    """
+
+    def __init__(self, max_history: int = 500):
+        self.max_history = max_history
+        self._store: Dict[str, Deque[Dict[str, Any]]] = defaultdict(self._new_session)
 
-    def __init__(self):
-        self._store: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    def _new_session(self, messages: Iterable[Dict[str, Any]] = ()) -> Deque[Dict[str, Any]]:
+        return deque(messages, maxlen=self.max_history)
+
+    @staticmethod
+    def _tail(messages: Deque[Dict[str, Any]], n: int) -> List[Dict[str, Any]]:
+        if n >= len(messages):
+            return list(messages)
+        return list(islice(messages, len(messages) - max(n, 0), None))
 
     @property
-    def sessions(self) -> Dict[str, List[Dict[str, Any]]]:
+    def sessions(self) -> Dict[str, Deque[Dict[str, Any]]]:
         """Expose sessions for iteration."""
         return self._store
 
@@ -21,20 +58,54 @@ class ConversationBufferMemory:
         self._store[session_id].append({
             "role": role, 
             "content": content,
-            "timestamp": datetime.now().isoformat()
+            # Epoch ns; rendered as ISO only when a message leaves the process
+            "timestamp": time.time_ns()
         })
 
     def get(self, session_id: str, limit: int = 20) -> List[Dict[str, Any]]:
-        return self._store[session_id][-limit:]
+        messages = self._store.get(session_id)
+        return self._tail(messages, limit) if messages else []
 
     def clear(self, session_id: str) -> None:
-        self._store[session_id] = []
+        self._store[session_id] = self._new_session()
+
+    def append_log(self, filepath: str, session_id: str, count: int = 2) -> None:
+        """Append the session's last `count` messages to a JSONL log instead of rewriting the history."""
+        messages = self._tail(self._store[session_id], count)
+        append_jsonl(filepath, ({"session_id": session_id, **m} for m in render_timestamps(messages)))
+
+    def delete(self, filepath: str, session_id: str) -> None:
+        """Drop a session and append a tombstone for it to the JSONL log."""
+        self._store.pop(session_id, None)
+        append_jsonl(filepath, [{"op": "delete", "session_id": session_id}])
+
+    def load_log(self, filepath: str) -> int:
+        """Replay a JSONL log written by append_log/delete. Returns the number of log lines."""
+        records = read_jsonl(filepath)
+        store: Dict[str, Deque[Dict[str, Any]]] = defaultdict(self._new_session)
+        for r in records:
+            session_id = r.pop("session_id", None)
+            if r.pop("op", None) == "delete":
+                store.pop(session_id, None)
+            elif session_id is not None:
+                r["timestamp"] = _to_ns(r.get("timestamp"))
+                store[session_id].append(r)
+        self._store = store
+        return len(records)
+
+    def compact_log(self, filepath: str) -> None:
+        """Rewrite the JSONL log with only the live messages."""
+        write_jsonl(filepath, (
+            {"session_id": sid, **m} for sid, messages in self._store.items() for m in render_timestamps(messages)
+        ))
+
+    def message_count(self) -> int:
+        return sum(len(messages) for messages in self._store.values())
 
     def save(self, filepath: str) -> None:
         """Save conversation history to JSON."""
-        import json
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(dict(self._store), f, ensure_ascii=False, indent=2)
+        with open(filepath, 'wb') as f:
+            f.write(dumps({sid: render_timestamps(m) for sid, m in self._store.items()}, indent=True))
 
     def load(self, filepath: str) -> None:
         """Load conversation history from JSON."""
@@ -42,4 +113,9 @@ class ConversationBufferMemory:
         if Path(filepath).exists():
             with open(filepath, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                self._store = defaultdict(list, data)
+                for messages in data.values():
+                    for m in messages:
+                        m["timestamp"] = _to_ns(m.get("timestamp"))
+                self._store = defaultdict(
+                    self._new_session, {sid: self._new_session(m) for sid, m in data.items()}
+                )
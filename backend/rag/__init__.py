@@ -1,15 +1,19 @@
 """RAG components: chunking, embeddings, FAISS, BM25."""
 
-from .document_parser import parse_document, extract_images_ocr
+from .document_parser import parse_document, extract_images_ocr, parse_with_ocr
 from .chunker import semantic_chunk
-from .embeddings import get_embedder
+from .embeddings import get_embedder, BatchingEmbedder
+from .embedding_cache import CachedEmbedder
 from .store import create_vector_store, create_bm25_index, add_chunks_to_store, delete_chunks_by_source
 
 __all__ = [
     "parse_document",
     "extract_images_ocr",
+    "parse_with_ocr",
     "semantic_chunk",
     "get_embedder",
+    "BatchingEmbedder",
+    "CachedEmbedder",
     "create_vector_store",
     "create_bm25_index",
     "add_chunks_to_store",
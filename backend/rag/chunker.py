@@ -1,7 +1,8 @@
 """Semantic chunking for documents."""
 
 import re
-from typing import Any, Dict, List
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
 
 try:
     from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -9,39 +10,63 @@ try:
 except ImportError:
     HAS_RECURSIVE = False
 
+# Blank line (possibly with whitespace) between paragraphs, for the regex fallback
+_PARA_RE = re.compile(r"\n\s*\n")
+
+DEFAULT_CHUNK_SIZE = 512
+DEFAULT_CHUNK_OVERLAP = 64
+
+
+@lru_cache(maxsize=8)
+def _get_splitter(chunk_size: int, chunk_overlap: int) -> Optional["RecursiveCharacterTextSplitter"]:
+    """Shared splitter per configuration; it is stateless between calls (regexes compiled once)."""
+    if not HAS_RECURSIVE:
+        return None
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        separators=["\n\n", "\n", ". ", " ", ""],
+    )
+
+
+_SPLITTER = _get_splitter(DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP)
+
 
 def semantic_chunk(documents: List[Dict[str, Any]], **kwargs) -> List[Dict[str, Any]]:
     """
     Apply semantic-style chunking to documents.
     Uses recursive split by meaning boundaries (paragraphs, sentences).
     Each doc: { content: str, metadata: dict }
+    Optional kwargs: chunk_size (default 512), chunk_overlap (default 64).
     Returns list of { content: str, metadata: dict }
     """
     if not documents:
         return []
 
-    if HAS_RECURSIVE:
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=512,
-            chunk_overlap=64,
-            separators=["\n\n", "\n", ". ", " ", ""],
+    chunk_size = kwargs.get("chunk_size", DEFAULT_CHUNK_SIZE)
+    chunk_overlap = kwargs.get("chunk_overlap", DEFAULT_CHUNK_OVERLAP)
+    splitter = _get_splitter(chunk_size, chunk_overlap)
+    valid = [
+        doc for doc in documents
+        if isinstance(doc.get("content", ""), str) and doc.get("content", "")
+    ]
+
+    if splitter:
+        # One call for the whole batch; create_documents copies each doc's metadata per chunk
+        split_docs = splitter.create_documents(
+            [doc["content"] for doc in valid],
+            metadatas=[doc.get("metadata", {}) for doc in valid],
         )
-    else:
-        splitter = None
+        return [
+            {"content": d.page_content.strip(), "metadata": d.metadata}
+            for d in split_docs
+            if d.page_content.strip()
+        ]
 
     chunks: List[Dict[str, Any]] = []
-    for doc in documents:
-        content = doc.get("content", "")
+    for doc in valid:
         metadata = doc.get("metadata", {})
-        if not content or not isinstance(content, str):
-            continue
-
-        if splitter:
-            sub_chunks = splitter.split_text(content)
-        else:
-            sub_chunks = _fallback_split(content)
-
-        for c in sub_chunks:
+        for c in _fallback_split(doc["content"], chunk_size, chunk_overlap):
             if c.strip():
                 chunks.append({"content": c.strip(), "metadata": dict(metadata)})
 
@@ -50,7 +75,7 @@ def semantic_chunk(documents: List[Dict[str, Any]], **kwargs) -> List[Dict[str,
 
 def _fallback_split(text: str, max_chunk: int = 512, overlap: int = 64) -> List[str]:
     """Paragraph/sentence-based fallback chunking."""
-    paragraphs = re.split(r"\n\s*\n", text)
+    paragraphs = _PARA_RE.split(text)
     chunks: List[str] = []
     current: List[str] = []
     current_len = 0
@@ -69,10 +94,8 @@ def _fallback_split(text: str, max_chunk: int = 512, overlap: int = 64) -> List[
             current_len = len(para)
             if current_len > max_chunk:
                 words = para.split()
-                for i in range(0, len(words), max(1, max_chunk // 5)):
-                    seg = " ".join(words[i : i + max(1, max_chunk // 5)])
-                    if seg:
-                        chunks.append(seg)
+                step = max(1, max_chunk // 5)
+                chunks.extend(" ".join(words[i : i + step]) for i in range(0, len(words), step))
                 current = []
                 current_len = 0
 
@@ -1,6 +1,10 @@
 """Document parsing: PDF, TXT, MD with pypdf and OCR via pytesseract."""
 
 import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
@@ -10,12 +14,49 @@ from PIL import Image
 
 # Optional: pdf2image for PDF page -> image conversion
 try:
-    from pdf2image import convert_from_path
+    from pdf2image import convert_from_path, pdfinfo_from_path
     HAS_PDF2IMAGE = True
 except ImportError:
     HAS_PDF2IMAGE = False
 
 
+# PDFs with at least this many pages have their text extracted in parallel worker processes
+PARALLEL_MIN_PAGES = 8
+
+_PAGE_POOL: Optional[ProcessPoolExecutor] = None
+_page_pool_lock = threading.Lock()
+
+
+def _get_page_pool() -> ProcessPoolExecutor:
+    global _PAGE_POOL
+    with _page_pool_lock:
+        if _PAGE_POOL is None:
+            _PAGE_POOL = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+        return _PAGE_POOL
+
+
+def _extract_pages(file_path: str, start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop) with a reader of its own (runs in a worker process)."""
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def _page_texts(reader: PdfReader, file_path: str) -> List[str]:
+    """
+    Text of every page, in order. pypdf extraction is pure Python and CPU-bound, so long
+    PDFs are split into one contiguous page range per core. Inside a worker process
+    (uploads already parse files in parallel) pages are extracted serially instead.
+    """
+    n_pages = len(reader.pages)
+    workers = os.cpu_count() or 1
+    if n_pages < PARALLEL_MIN_PAGES or workers < 2 or multiprocessing.parent_process() is not None:
+        return [page.extract_text() or "" for page in reader.pages]
+    step = -(-n_pages // workers)
+    pool = _get_page_pool()
+    futures = [pool.submit(_extract_pages, file_path, start, min(start + step, n_pages)) for start in range(0, n_pages, step)]
+    return [text for future in futures for text in future.result()]
+
+
 def parse_document(file_path: str, filename: str) -> Dict[str, Any]:
     """
     Parse PDF, TXT, or MD file.
@@ -37,8 +78,7 @@ def _parse_pdf(file_path: str, filename: str) -> Dict[str, Any]:
     documents: List[Dict[str, Any]] = []
     all_text: List[str] = []
 
-    for i, page in enumerate(reader.pages):
-        text = page.extract_text() or ""
+    for i, text in enumerate(_page_texts(reader, file_path)):
         page_num = i + 1
         metadata = {"source": filename, "page": page_num}
         if text.strip():
@@ -65,6 +105,32 @@ def _parse_text(file_path: str, filename: str) -> Dict[str, Any]:
     }
 
 
+def parse_with_ocr(file_path: str, filename: str) -> List[Dict[str, Any]]:
+    """
+    Parse a file and append its OCR text as an extra document.
+    Returns the documents ready for chunking. Top-level so it can run in a worker process.
+    """
+    parse_result = parse_document(file_path, filename)
+    docs = parse_result.get("documents", [])
+    if isinstance(parse_result, dict) and "documents" not in parse_result:
+        docs = [{"content": parse_result.get("text", ""), "metadata": parse_result.get("metadata", {})}]
+
+    ocr_result = extract_images_ocr(file_path, filename)
+    if ocr_result.get("text"):
+        docs.append({"content": ocr_result["text"], "metadata": {"source": filename, "page": "ocr"}})
+    return docs
+
+
+def _ocr_page(file_path: str, page_num: int) -> str:
+    """Rasterize a single (1-based) page and OCR it, releasing the image right after."""
+    images = convert_from_path(file_path, dpi=150, first_page=page_num, last_page=page_num)
+    try:
+        return "".join(pytesseract.image_to_string(img) for img in images)
+    finally:
+        for img in images:
+            img.close()
+
+
 def extract_images_ocr(file_path: str, filename: str) -> Dict[str, Any]:
     """
     Extract images from PDF, run OCR via pytesseract.
@@ -75,32 +141,19 @@ def extract_images_ocr(file_path: str, filename: str) -> Dict[str, Any]:
         return {"text": "", "images_processed": 0}
 
     if not HAS_PDF2IMAGE:
-        # Fallback: try pypdf images
-        try:
-            reader = PdfReader(file_path)
-            texts = []
-            count = 0
-            for page in reader.pages:
-                if "/XObject" in page["/Resources"]:
-                    xobj = page["/Resources"]["/XObject"].get_object()
-                    for obj in xobj:
-                        if xobj[obj]["/Subtype"] == "/Image":
-                            count += 1
-                            # OCR extraction from pypdf images is complex; skip for simplicity
-            return {"text": "", "images_processed": count}
-        except Exception:
-            return {"text": "", "images_processed": 0}
+        # Without pdf2image there is nothing to OCR; don't walk the page images just to count them
+        return {"text": "", "images_processed": 0}
 
     try:
-        images = convert_from_path(file_path, dpi=150)
-        ocr_texts: List[str] = []
-        for i, img in enumerate(images):
-            text = pytesseract.image_to_string(img)
-            if text.strip():
-                ocr_texts.append(f"[Page {i+1} OCR]\n{text}")
+        n_pages = int(pdfinfo_from_path(file_path)["Pages"])
+        # Poppler and tesseract run as subprocesses, so threads overlap rasterizing and OCR
+        # across pages, and only one rendered image per worker is held in memory at a time
+        with ThreadPoolExecutor(max_workers=min(n_pages, os.cpu_count() or 1) or 1) as pool:
+            texts = list(pool.map(lambda p: _ocr_page(file_path, p), range(1, n_pages + 1)))
+        ocr_texts = [f"[Page {p} OCR]\n{text}" for p, text in enumerate(texts, 1) if text.strip()]
         return {
             "text": "\n\n".join(ocr_texts),
-            "images_processed": len(images),
+            "images_processed": n_pages,
         }
     except Exception as e:
         return {"text": "", "images_processed": 0, "error": str(e)}
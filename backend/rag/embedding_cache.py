@@ -0,0 +1,87 @@
+"""Query-embedding cache - avoids repeat embedding API round-trips for the same query."""
+
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+
+class CachedEmbedder:
+    """
+    Wraps a LangChain-compatible embedder and memoizes embed_query in an LRU keyed
+    by the SHA1 of the query text. embed_documents and any other attribute pass
+    straight through to the wrapped embedder.
+    """
+
+    def __init__(self, embedder, lru_size: int = 4096):
+        self.embedder = embedder
+        self.lru_size = lru_size
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        # embed_query is called from worker threads (hybrid search legs, /ask)
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.embedder, name)
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        with self._lock:
+            vec = self._cache.get(key)
+            if vec is not None:
+                self._cache.move_to_end(key)
+                return vec
+        vec = self.embedder.embed_query(text)
+        self._put(key, vec)
+        return vec
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """embed_query for async callers; misses await the wrapped embedder's aembed_query if it has one."""
+        key = self._key(text)
+        with self._lock:
+            vec = self._cache.get(key)
+            if vec is not None:
+                self._cache.move_to_end(key)
+                return vec
+        if hasattr(self.embedder, "aembed_query"):
+            vec = await self.embedder.aembed_query(text)
+        else:
+            vec = await asyncio.to_thread(self.embedder.embed_query, text)
+        self._put(key, vec)
+        return vec
+
+    def _put(self, key: str, vec: List[float]) -> None:
+        with self._lock:
+            self._cache[key] = vec
+            while len(self._cache) > self.lru_size:
+                self._cache.popitem(last=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embedder.embed_documents(texts)
+
+    def save(self, filepath: str) -> None:
+        """Save the cached query embeddings to an .npz file (key array plus float32 matrix)."""
+        with self._lock:
+            items = list(self._cache.items())
+        np.savez(
+            filepath,
+            keys=np.array([k for k, _ in items], dtype=str),
+            embeddings=np.array([v for _, v in items], dtype=np.float32) if items else np.empty((0, 0), dtype=np.float32),
+        )
+
+    def load(self, filepath: str) -> None:
+        """Load query embeddings saved by save(), keeping the most recent lru_size."""
+        if not Path(filepath).exists():
+            return
+        with np.load(filepath, allow_pickle=False) as data:
+            keys = data["keys"][-self.lru_size:]
+            matrix = data["embeddings"][-self.lru_size:]
+        with self._lock:
+            self._cache = OrderedDict((str(k), row.tolist()) for k, row in zip(keys, matrix))
@@ -1,7 +1,16 @@
 """Embeddings via Google Gemini (gemini-embedding-001) for fast, high-quality embeddings."""
 
-from typing import List
+import asyncio
+from concurrent.futures import Future
+from functools import lru_cache
+import hashlib
+from typing import List, Optional, Tuple
 import os
+import queue
+import threading
+import time
+
+import numpy as np
 
 # Primary: Google Gemini Embeddings (fast, cloud-based)
 try:
@@ -17,12 +26,25 @@ try:
 except ImportError:
     OLLAMA_AVAILABLE = False
 
+# Optional: local INT8 ONNX embedding model (see OnnxEmbeddings)
+try:
+    import onnxruntime as ort
+    from transformers import AutoTokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
 
-def get_embedder(model: str = "models/gemini-embedding-001"):
+# Keep only the leading N dimensions of each embedding (unset = full size); see TruncatedEmbeddings
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+
+
+def get_embedder(model: str = "models/gemini-embedding-001", dimensions: Optional[int] = EMBEDDING_DIMENSIONS):
     """
-    Return an embedder compatible with LangChain.
+    Return an embedder compatible with LangChain, truncated to ``dimensions`` if given.
     
     Priority:
+    0. Local ONNX model, when EMBEDDER_ONNX_DIR is set (see OnnxEmbeddings)
     1. Google Gemini gemini-embedding-001 (supported in Gemini API v1beta)
     2. Ollama nomic-embed-text (fallback, local)
     3. Fake embeddings (last resort)
@@ -31,28 +53,197 @@ def get_embedder(model: str = "models/gemini-embedding-001"):
         model: Embedding model name
             - "models/gemini-embedding-001" (Gemini, recommended)
             - "nomic-embed-text" (Ollama fallback)
+        dimensions: Leading dimensions to keep (e.g. 768 of Gemini's 3072)
+    """
+    embedder = _get_base_embedder(model)
+    return TruncatedEmbeddings(embedder, dimensions) if dimensions else embedder
+
+
+def _warmup(embedder) -> None:
+    try:
+        embedder.embed_documents(["warmup"])
+    except Exception as e:
+        print(f"[Embeddings] Warmup failed: {e}")
+
+
+@lru_cache(maxsize=4)
+def _make_gemini(model: str, task_type: str):
     """
+    One Gemini client per (model, task_type), so every caller shares its connection.
+    The first construction opens the connection from a background thread, off the first query's path.
+    """
+    embedder = GoogleGenerativeAIEmbeddings(model=model, task_type=task_type)
+    threading.Thread(target=_warmup, args=(embedder,), name="embedder-warmup", daemon=True).start()
+    return embedder
+
+
+@lru_cache(maxsize=4)
+def _make_ollama(model: str):
+    """One Ollama client per model, like _make_gemini."""
+    return OllamaEmbeddings(model=model)
+
+
+@lru_cache(maxsize=4)
+def _make_onnx(model_dir: str):
+    return OnnxEmbeddings(model_dir)
+
+
+def _get_base_embedder(model: str):
+    onnx_dir = os.getenv("EMBEDDER_ONNX_DIR", "").strip()
+    if onnx_dir and ONNX_AVAILABLE:
+        print(f"[Embeddings] Using local ONNX model from {onnx_dir}")
+        return _make_onnx(onnx_dir)
+    
     # Try Gemini first (fastest option)
     if GEMINI_AVAILABLE and os.getenv("GEMINI_API_KEY"):
         try:
             print(f"[Embeddings] Using Google Gemini: {model}")
-            return GoogleGenerativeAIEmbeddings(
-                model=model,
-                task_type="retrieval_document"
-            )
+            return _make_gemini(model, "retrieval_document")
         except Exception as e:
             print(f"[Embeddings] Gemini init failed: {e}, falling back to Ollama")
     
     # Fallback to Ollama
     if OLLAMA_AVAILABLE:
         print("[Embeddings] Using Ollama: nomic-embed-text")
-        return OllamaEmbeddings(model="nomic-embed-text")
+        return _make_ollama("nomic-embed-text")
     
     # Last resort: Fake embeddings
     print("[Embeddings] WARNING: Using fake embeddings (no Gemini or Ollama available)")
     return _FakeEmbeddings()
 
 
+class BatchingEmbedder:
+    """
+    Coalesces concurrent embed_query calls into one embed_documents request.
+    Callers (hybrid-search worker threads) enqueue their text and block on a future;
+    a daemon thread collects up to ``max_batch`` texts, waiting at most ``max_delay_ms``
+    after the first, and embeds them in one round-trip. A lone query pays only the delay.
+    Only valid for embedders whose query and document embeddings match (Gemini with a
+    fixed task_type, Ollama).
+    """
+
+    def __init__(self, embedder, max_batch: int = 32, max_delay_ms: float = 8.0):
+        self.embedder = embedder
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000.0
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+        self._worker.start()
+
+    def __getattr__(self, name):
+        return getattr(self.embedder, name)
+
+    def embed_query(self, text: str) -> List[float]:
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        """embed_query for async callers: joins the same batch without tying up a thread."""
+        future: Future = Future()
+        self._queue.put((text, future))
+        return await asyncio.wrap_future(future)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embedder.embed_documents(texts)
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # Identical concurrent queries are embedded once
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            try:
+                vectors = dict(zip(texts, self.embedder.embed_documents(texts)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for text, future in batch:
+                future.set_result(vectors[text])
+
+
+class TruncatedEmbeddings:
+    """
+    Matryoshka-style truncation: keep the leading ``dimensions`` of each vector and
+    re-normalize. gemini-embedding-001 and nomic-embed-text v1.5 are trained so the
+    prefix is itself a usable embedding; 768 of 3072 dims stores 4x fewer floats in
+    ChromaDB's index and on disk for a small recall cost. Changing it requires
+    re-indexing, since the collection's dimension is fixed at first insert.
+    """
+
+    def __init__(self, embedder, dimensions: int):
+        self.embedder = embedder
+        self.dimensions = dimensions
+
+    def _truncate(self, vectors: List[List[float]]) -> List[List[float]]:
+        arr = np.asarray(vectors, dtype=np.float32)[:, :self.dimensions]
+        norms = np.linalg.norm(arr, axis=1, keepdims=True)
+        return (arr / np.where(norms == 0, 1.0, norms)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._truncate(self.embedder.embed_documents(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._truncate([self.embedder.embed_query(text)])[0]
+
+
+class OnnxEmbeddings:
+    """
+    Local sentence embeddings from an ONNX Runtime session: mean-pooled over the attention
+    mask and L2-normalized, with no network round-trip per batch.
+    
+    Point EMBEDDER_ONNX_DIR at a directory holding the tokenizer files and an INT8 model,
+    produced once with:
+        optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 --task feature-extraction out/
+        python -c "from onnxruntime.quantization import quantize_dynamic, QuantType; \
+            quantize_dynamic('out/model.onnx', 'out/model_int8.onnx', weight_type=QuantType.QInt8)"
+    It is a different vector space from Gemini/Ollama, so switching requires re-indexing.
+    """
+
+    def __init__(self, model_dir: str, model_file: str = "model_int8.onnx", max_length: int = 512, batch_size: int = 32):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Half the cores by default, like the ONNX re-ranker, which may share the host
+        options.intra_op_num_threads = int(os.getenv("EMBEDDER_ONNX_THREADS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+        providers = [p for p in ("CUDAExecutionProvider", "CPUExecutionProvider") if p in ort.get_available_providers()]
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), sess_options=options, providers=providers
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.max_length = max_length
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        out = []
+        for start in range(0, len(texts), self.batch_size):
+            enc = self.tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True, truncation=True, max_length=self.max_length, return_tensors="np",
+            )
+            feeds = {k: v.astype(np.int64) for k, v in enc.items() if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            out.append(pooled.astype(np.float32))
+        return np.concatenate(out).tolist() if out else []
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
 class _FakeEmbeddings:
     """Fallback when neither Gemini nor Ollama is available - returns deterministic vectors."""
 
@@ -60,16 +251,13 @@ class _FakeEmbeddings:
         self.dim = dim
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        import hashlib
-        import struct
-        out = []
-        for t in texts:
-            h = hashlib.sha256(t.encode()).digest()
-            vec = [struct.unpack("f", h[i:i+4])[0] % 0.1 for i in range(0, min(len(h), self.dim * 4), 4)]
-            while len(vec) < self.dim:
-                vec.append(0.0)
-            out.append(vec[:self.dim])
-        return out
+        # One shake_128 digest per text fills every dimension; reading the bytes as uint32
+        # (not float32) keeps the values finite, scaled into [0, 0.1)
+        buf = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, t in enumerate(texts):
+            buf[i] = np.frombuffer(hashlib.shake_128(t.encode()).digest(self.dim * 4), dtype=np.uint32)
+        buf *= np.float32(0.1 / 2**32)
+        return buf.tolist()
 
     def embed_query(self, text: str) -> List[float]:
         return self.embed_documents([text])[0]
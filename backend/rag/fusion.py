@@ -0,0 +1,57 @@
+"""Rank fusion for hybrid (vector + keyword) search results."""
+
+import numpy as np
+
+# Optional JIT: compiled once and cached on disk; plain NumPy is used when numba is missing
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _rrf_numpy(rank_a: np.ndarray, rank_b: np.ndarray, k: float) -> np.ndarray:
+    fused = np.zeros(rank_a.shape[0], dtype=np.float32)
+    present_a = rank_a >= 0
+    present_b = rank_b >= 0
+    fused[present_a] += 1.0 / (k + rank_a[present_a] + 1.0)
+    fused[present_b] += 1.0 / (k + rank_b[present_b] + 1.0)
+    return fused
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def _rrf_kernel(rank_a, rank_b, k):
+        n = rank_a.shape[0]
+        fused = np.zeros(n, dtype=np.float32)
+        for i in range(n):
+            if rank_a[i] >= 0:
+                fused[i] += 1.0 / (k + rank_a[i] + 1.0)
+            if rank_b[i] >= 0:
+                fused[i] += 1.0 / (k + rank_b[i] + 1.0)
+        return fused
+else:
+    _rrf_kernel = _rrf_numpy
+
+
+def rrf_fuse(rank_a: np.ndarray, rank_b: np.ndarray, k: float = 60.0) -> np.ndarray:
+    """
+    Reciprocal Rank Fusion of two rankings over the same candidate set.
+    
+    Args:
+        rank_a: 0-based rank of each candidate in the first list, -1 if absent
+        rank_b: 0-based rank of each candidate in the second list, -1 if absent
+        k: RRF damping constant
+        
+    Returns:
+        Fused score per candidate (higher is better)
+    """
+    return _rrf_kernel(
+        np.ascontiguousarray(rank_a, dtype=np.float32),
+        np.ascontiguousarray(rank_b, dtype=np.float32),
+        np.float32(k),
+    )
+
+
+# Compile at import (app startup) rather than on the first user query
+rrf_fuse(np.array([0.0, -1.0]), np.array([-1.0, 0.0]))
@@ -1,54 +1,429 @@
 """Vector store (ChromaDB) and BM25 index."""
 
+import hashlib
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, BinaryIO, Callable, Dict, List, NamedTuple, Optional, Tuple
 import chromadb
 from chromadb.config import Settings
-from rank_bm25 import BM25Okapi
 import numpy as np
 
+# Optional: orjson for the BM25 snapshot (C, compact); stdlib json is used when it is missing
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    import json
+    ORJSON_AVAILABLE = False
+
+# Optional: xxh3 for chunk ids (SIMD C); blake2b is used when it is missing
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+# Optional JIT for BM25 score accumulation; np.bincount is used when numba is missing
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+class _Postings(NamedTuple):
+    """
+    Eager-scored postings in structure-of-arrays (CSR) form: term t's postings are
+    doc_ids[indptr[t]:indptr[t + 1]] with matching weights, all in two contiguous arrays.
+    """
+    term_index: Dict[str, int]
+    indptr: np.ndarray   # int64, len(terms) + 1
+    doc_ids: np.ndarray  # int32
+    weights: np.ndarray  # float32
+    max_weight: np.ndarray  # float32, per term: upper bound of its contribution to any doc
+
+
+def _accumulate_numpy(indptr: np.ndarray, doc_ids: np.ndarray, weights: np.ndarray, slots: np.ndarray, n_docs: int) -> np.ndarray:
+    ids = np.concatenate([doc_ids[indptr[s]:indptr[s + 1]] for s in slots])
+    w = np.concatenate([weights[indptr[s]:indptr[s + 1]] for s in slots])
+    return np.bincount(ids, weights=w, minlength=n_docs).astype(np.float32)
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, fastmath=True)
+    def _accumulate(indptr, doc_ids, weights, slots, n_docs):
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for s in slots:
+            # Contiguous streaming reads of each term's doc ids and weights
+            for j in range(indptr[s], indptr[s + 1]):
+                scores[doc_ids[j]] += weights[j]
+        return scores
+
+    # Compile at import (app startup) rather than on the first user query
+    _accumulate(
+        np.zeros(2, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32),
+        np.zeros(1, dtype=np.int64), 1,
+    )
+else:
+    _accumulate = _accumulate_numpy
+
+
+def _tokenize(text: str) -> List[str]:
+    """BM25 tokenizer for chunks and queries: lowercase, whitespace split."""
+    return text.lower().split()
+
+
+@lru_cache(maxsize=1024)
+def _tokenize_query(query: str) -> Tuple[str, ...]:
+    # Repeated and retried queries (web-search retry path, evaluation runs) skip re-tokenizing
+    return tuple(_tokenize(query))
+
+
+class _Corpus(NamedTuple):
+    """
+    One version of the BM25 index. Never mutated once published: writers build the next
+    version off to the side and swap it in with a single assignment, so a search that grabbed
+    a version keeps consistent chunks, postings and lengths while an upload or delete runs.
+    """
+    chunks: List[Dict[str, Any]]
+    # term -> (doc ids, term frequencies)
+    tf_postings: Dict[str, Tuple[np.ndarray, np.ndarray]]
+    doc_len: np.ndarray
+    # metadata["source"] -> positions of its chunks in chunks, so deletes don't scan
+    source_rows: Dict[str, List[int]]
+
+
+_EMPTY_CORPUS = _Corpus([], {}, np.empty(0, dtype=np.float32), {})
+
 
 class BM25Index:
-    """BM25 with metadata - supports incremental corpus via rebuild."""
+    """
+    BM25 with metadata - supports an incremental corpus: adds tokenize only the new
+    chunks and deletes drop their rows from the postings, never re-tokenizing the corpus.
+    Persisted as a full JSON snapshot plus an append-only ``<snapshot>.delta`` JSONL log
+    of added chunks and deleted sources, folded into the snapshot by compact().
+
+    Scoring is Okapi BM25 (same formula and IDF flooring as rank_bm25.BM25Okapi) with
+    eager scoring, as in bm25s: each term's posting holds (doc ids, precomputed BM25
+    weights), so a query is a sparse sum of its terms' weight columns and touches only
+    the documents containing those terms.
+
+    Searches may run concurrently with one writer (writers must be serialized by the caller):
+    each search reads one immutable _Corpus, and writes publish a new one.
+    """
+
+    k1 = 1.5
+    b = 0.75
+    epsilon = 0.25
 
     def __init__(self):
-        self.bm25: Optional[BM25Okapi] = None
-        self.chunk_store: List[Dict[str, Any]] = []
+        self._corpus = _EMPTY_CORPUS
+        # Snapshot generation, bumped by every save(); the delta log records the generation it
+        # extends, so a log already folded into a newer snapshot is never replayed twice
+        self._generation = 0
+        # Eager BM25 weights of every (term, doc) pair, derived lazily from a corpus's tf
+        # postings; tagged with the corpus (by identity) it was computed for
+        self._weights: Optional[Tuple[_Corpus, _Postings]] = None
+
+    @property
+    def chunk_store(self) -> List[Dict[str, Any]]:
+        return self._corpus.chunks
 
-    def add_chunks(self, chunks: List[Dict[str, Any]]) -> None:
-        """Add chunks and rebuild BM25 index."""
-        self.chunk_store.extend(chunks)
-        if self.chunk_store:
-            corpus = [c.get("content", "").lower().split() for c in self.chunk_store]
-            self.bm25 = BM25Okapi(corpus)
+    @staticmethod
+    def _with_sources(source_rows: Dict[str, List[int]], chunks: List[Dict[str, Any]], start: int) -> Dict[str, List[int]]:
+        """Copy of source_rows with chunks' positions added; only the touched lists are copied."""
+        added: Dict[str, List[int]] = {}
+        for offset, c in enumerate(chunks):
+            source = c.get("metadata", {}).get("source")
+            if source is not None:
+                added.setdefault(source, []).append(start + offset)
+        rows = dict(source_rows)
+        for source, positions in added.items():
+            rows[source] = rows.get(source, []) + positions
+        return rows
+
+    def _rebuild(self, chunks: List[Dict[str, Any]]) -> None:
+        self._corpus = self._merged(
+            _Corpus(chunks, {}, np.empty(0, dtype=np.float32), self._with_sources({}, chunks, 0)),
+            self.prepare(chunks), start=0,
+        )
+
+    @staticmethod
+    def prepare(chunks: List[Dict[str, Any]]) -> Tuple[Dict[str, Tuple[List[int], List[int]]], np.ndarray]:
+        """
+        Tokenize chunks into postings with doc ids relative to the batch. Touches no index
+        state, so it can run on another thread while the same chunks are being embedded.
+        """
+        new: Dict[str, Tuple[List[int], List[int]]] = {}
+        doc_len = np.empty(len(chunks), dtype=np.float32)
+        for offset, c in enumerate(chunks):
+            tokens = _tokenize(c.get("content", ""))
+            doc_len[offset] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                ids, tfs = new.setdefault(term, ([], []))
+                ids.append(offset)
+                tfs.append(tf)
+        return new, doc_len
+
+    @staticmethod
+    def _merged(corpus: _Corpus, prepared, start: int) -> _Corpus:
+        """corpus with prepare() output merged into new tf postings, doc ids offset by start."""
+        new, doc_len = prepared
+        tf_postings = dict(corpus.tf_postings)
+        for term, (ids, tfs) in new.items():
+            ids_arr = np.asarray(ids, dtype=np.int32) + np.int32(start)
+            tfs_arr = np.asarray(tfs, dtype=np.float32)
+            old = tf_postings.get(term)
+            if old is not None:
+                ids_arr = np.concatenate([old[0], ids_arr])
+                tfs_arr = np.concatenate([old[1], tfs_arr])
+            tf_postings[term] = (ids_arr, tfs_arr)
+        return corpus._replace(tf_postings=tf_postings, doc_len=np.concatenate([corpus.doc_len, doc_len]))
+
+    def _postings(self, corpus: _Corpus) -> _Postings:
+        """
+        Eager BM25 weights for a corpus. IDF and the average length change with every
+        add/delete, so they are recomputed here from the tf postings (no re-tokenizing),
+        once per change rather than once per upload.
+        """
+        cached = self._weights
+        if cached is not None and cached[0] is corpus:
+            return cached[1]
+
+        tf_postings, doc_len = corpus.tf_postings, corpus.doc_len
+        n_docs = len(doc_len)
+        terms = list(tf_postings)
+        df = np.fromiter((len(tf_postings[t][0]) for t in terms), dtype=np.int64, count=len(terms))
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+        doc_ids = np.ascontiguousarray(
+            np.concatenate([tf_postings[t][0] for t in terms]) if terms else np.empty(0), dtype=np.int32
+        )
+        tfs = np.ascontiguousarray(
+            np.concatenate([tf_postings[t][1] for t in terms]) if terms else np.empty(0), dtype=np.float32
+        )
+
+        idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+        # Terms in more than half the corpus get a small positive floor instead of a negative IDF
+        floor = self.epsilon * float(idf.mean()) if len(idf) else 0.0
+        idf = np.where(idf >= 0, idf, floor).astype(np.float32)
+        avg_len = float(doc_len.mean()) if n_docs else 0.0
+        # Per-document 1 / (k1 * (1 - b + b * len / avg_len)): one division per document, not per posting
+        norm_inv = (1.0 / (self.k1 * (1 - self.b + self.b * doc_len / (avg_len or 1.0)))).astype(np.float32)
+
+        # All (term, doc) weights in one vectorized pass over the flat arrays, in Lucene's
+        # form w - w / (1 + tf * norm_inv) with w = idf * (k1 + 1), equal to the textbook
+        # idf * tf * (k1 + 1) / (tf + k1 * (...)) and monotone in tf
+        term_weight = np.repeat(idf * np.float32(self.k1 + 1), df)
+        weights = (term_weight - term_weight / (1.0 + tfs * norm_inv[doc_ids])).astype(np.float32)
+        max_weight = np.zeros(len(terms), dtype=np.float32)
+        nonempty = df > 0
+        if nonempty.any():
+            max_weight[nonempty] = np.maximum.reduceat(weights, indptr[:-1][nonempty])
+        postings = _Postings({t: i for i, t in enumerate(terms)}, indptr, doc_ids, weights, max_weight)
+        self._weights = (corpus, postings)
+        return postings
+
+    def add_chunks(self, chunks: List[Dict[str, Any]], prepared=None) -> None:
+        """Add chunks, tokenizing only the new ones (or reusing prepare(chunks) output)."""
+        if not chunks:
+            return
+        corpus = self._corpus
+        start = len(corpus.chunks)
+        grown = corpus._replace(
+            chunks=corpus.chunks + list(chunks),
+            source_rows=self._with_sources(corpus.source_rows, chunks, start),
+        )
+        self._corpus = self._merged(grown, prepared if prepared is not None else self.prepare(chunks), start)
+
+    def get_scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for the query (float32, one per chunk)."""
+        return self._scores(self._corpus, query)
+
+    def _scores(self, corpus: _Corpus, query: str) -> np.ndarray:
+        postings = self._postings(corpus)
+        n_docs = len(corpus.chunks)
+        slots = [postings.term_index[t] for t in _tokenize_query(query) if t in postings.term_index]
+        if not slots:
+            return np.zeros(n_docs, dtype=np.float32)
+        # One pass over the query terms' posting ranges (a repeated term counts twice)
+        return _accumulate(
+            postings.indptr, postings.doc_ids, postings.weights,
+            np.asarray(slots, dtype=np.int64), n_docs,
+        )
+
+    def _maxscore(self, corpus: _Corpus, query: str, top_k: int) -> np.ndarray:
+        """
+        Scores with MaxScore pruning, exact for the top_k: terms are added in decreasing order
+        of their max contribution, and once the remaining terms' summed bound can't lift an
+        unscored document to the current k-th score, they only update documents still in reach.
+        """
+        postings = self._postings(corpus)
+        n_docs = len(corpus.chunks)
+        slots = [postings.term_index[t] for t in _tokenize_query(query) if t in postings.term_index]
+        if len(slots) < 2:
+            return self._scores(corpus, query)
+        slots.sort(key=lambda s: -postings.max_weight[s])
+        remaining = np.cumsum([postings.max_weight[s] for s in reversed(slots)])[::-1]
+
+        scores = np.zeros(n_docs, dtype=np.float32)
+        candidates: Optional[np.ndarray] = None
+        for i, slot in enumerate(slots):
+            start, end = postings.indptr[slot], postings.indptr[slot + 1]
+            ids, weights = postings.doc_ids[start:end], postings.weights[start:end]
+            if candidates is not None:
+                keep = candidates[ids]
+                ids, weights = ids[keep], weights[keep]
+            # Doc ids are unique within a posting, so fancy-index accumulation is exact
+            scores[ids] += weights
+            if candidates is None and i + 1 < len(slots) and top_k < n_docs:
+                kth = np.partition(scores, n_docs - top_k)[n_docs - top_k]
+                if kth > 0 and remaining[i + 1] < kth:
+                    # Documents this far below the k-th score can no longer enter the top k
+                    candidates = scores + remaining[i + 1] >= kth
+        return scores
 
     def search(self, query: str, top_k: int = 10) -> List[Dict[str, Any]]:
-        if not self.bm25 or not self.chunk_store:
+        # One corpus for the whole search, however many writes are published meanwhile
+        corpus = self._corpus
+        if not corpus.tf_postings or not corpus.chunks or top_k <= 0:
             return []
-        tokenized = query.lower().split()
-        scores = self.bm25.get_scores(tokenized)
-        top_indices = np.argsort(scores)[::-1][:top_k]
-        results = []
-        for idx in top_indices:
-            if idx < len(self.chunk_store):
-                results.append(self.chunk_store[idx])
-        return results
+        scores = self._maxscore(corpus, query, top_k)
+        k = min(top_k, len(scores))
+        top_indices = np.argpartition(-scores, k - 1)[:k]
+        # argpartition scrambles ties, so break them by corpus position
+        top_indices = top_indices[np.lexsort((top_indices, -scores[top_indices]))]
+        # tolist() converts to Python ints in one call instead of boxing numpy ints per lookup
+        return [corpus.chunks[idx] for idx in top_indices.tolist()]
 
     def save(self, filepath: str) -> None:
-        """Save chunk_store to JSON file."""
-        import json
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(self.chunk_store, f, ensure_ascii=False, indent=2)
+        """
+        Save chunk_store as compact JSON plus the tokenized postings as ``<snapshot>.postings.npz``
+        (so load() doesn't re-tokenize the corpus), and drop the now-folded delta log.
+        Both files carry the snapshot generation, so load() only pairs postings with their snapshot.
+        """
+        corpus = self._corpus
+        generation = self._generation + 1
+        terms = list(corpus.tf_postings)
+        # Postings first: a crash before the snapshot is replaced leaves a generation mismatch,
+        # and load() re-tokenizes the previous snapshot instead of trusting these postings
+        _write_atomic(filepath + ".postings.npz", lambda f: np.savez(
+            f,
+            generation=np.int64(generation),
+            terms=np.array(terms, dtype=str),
+            df=np.fromiter((len(corpus.tf_postings[t][0]) for t in terms), dtype=np.int64, count=len(terms)),
+            doc_ids=np.concatenate([corpus.tf_postings[t][0] for t in terms]) if terms else np.empty(0, dtype=np.int32),
+            tfs=np.concatenate([corpus.tf_postings[t][1] for t in terms]) if terms else np.empty(0, dtype=np.float32),
+            doc_len=corpus.doc_len,
+        ))
+        # Atomic replace: a crash leaves the previous snapshot (and its delta log) intact
+        _write_atomic(filepath, lambda f: f.write(_json_dumps({"generation": generation, "chunks": corpus.chunks})))
+        self._generation = generation
+        Path(filepath + ".delta").unlink(missing_ok=True)
+
+    def _load_postings(self, postings_path: str, chunks: List[Dict[str, Any]]) -> bool:
+        """
+        Publish chunks with the tf postings saved next to the snapshot; False if missing or
+        stale (saved for another snapshot generation).
+        """
+        if not Path(postings_path).exists():
+            return False
+        with np.load(postings_path, allow_pickle=False) as data:
+            # Postings saved before generations were tracked belong to generation 0
+            generation = int(data["generation"]) if "generation" in data.files else 0
+            if generation != self._generation or len(data["doc_len"]) != len(chunks):
+                return False
+            bounds = np.concatenate([[0], np.cumsum(data["df"])])
+            doc_ids, tfs = data["doc_ids"], data["tfs"]
+            tf_postings = {
+                str(term): (doc_ids[bounds[i]:bounds[i + 1]], tfs[bounds[i]:bounds[i + 1]])
+                for i, term in enumerate(data["terms"])
+            }
+            doc_len = data["doc_len"].astype(np.float32)
+        self._corpus = _Corpus(chunks, tf_postings, doc_len, self._with_sources({}, chunks, 0))
+        return True
 
     def load(self, filepath: str) -> None:
-        """Load chunk_store from JSON and rebuild BM25 index."""
-        import json
+        """Load chunk_store and its saved postings (tokenizing only if those are missing), then replay the delta log."""
+        chunks = self._corpus.chunks
         if Path(filepath).exists():
-            with open(filepath, 'r', encoding='utf-8') as f:
-                self.chunk_store = json.load(f)
-            if self.chunk_store:
-                corpus = [c.get("content", "").lower().split() for c in self.chunk_store]
-                self.bm25 = BM25Okapi(corpus)
+            with open(filepath, 'rb') as f:
+                snapshot = _json_loads(f.read())
+            # Snapshots written before generations were tracked are a bare chunk list
+            if isinstance(snapshot, list):
+                snapshot = {"generation": 0, "chunks": snapshot}
+            chunks = snapshot["chunks"]
+            self._generation = snapshot["generation"]
+        if not self._load_postings(filepath + ".postings.npz", chunks):
+            self._rebuild(chunks)
+        self.apply_delta(filepath + ".delta")
+
+    def _append_records(self, filepath: str, records: List[Dict[str, Any]]) -> None:
+        with open(filepath + ".delta", 'ab') as f:
+            if f.tell() == 0:
+                # A new log starts with the snapshot generation it applies to
+                records = [{"op": "generation", "generation": self._generation}, *records]
+            f.write(b"".join(_json_dumps(r) + b"\n" for r in records))
+
+    def append(self, filepath: str, chunks: List[Dict[str, Any]]) -> None:
+        """Persist newly added chunks by appending them to the delta log (no full rewrite)."""
+        self._append_records(filepath, [{"op": "add", "chunk": c} for c in chunks])
+
+    def append_delete(self, filepath: str, source_filename: str) -> None:
+        """Persist a delete_by_source by appending a tombstone to the delta log."""
+        self._append_records(filepath, [{"op": "delete", "source": source_filename}])
+
+    def apply_delta(self, delta_path: str) -> int:
+        """
+        Replay a delta log incrementally onto the index. Returns the number of records applied.
+        A log written against another snapshot generation was already folded into the current
+        snapshot (save() crashed before removing it), so it is removed instead of replayed.
+        """
+        if not Path(delta_path).exists():
+            return 0
+        applied = 0
+        pending: List[Dict[str, Any]] = []
+        stale = False
+        with open(delta_path, 'rb') as f:
+            for line in f:
+                try:
+                    record = _json_loads(line)
+                except ValueError:
+                    # Torn last line from an interrupted append
+                    continue
+                if record.get("op") == "generation":
+                    stale = record["generation"] != self._generation
+                    if stale:
+                        break
+                    continue
+                if record.get("op") == "add":
+                    pending.append(record["chunk"])
+                elif record.get("op") == "delete":
+                    # Consecutive adds are indexed in one batch before the delete applies
+                    self.add_chunks(pending)
+                    pending = []
+                    self.delete_by_source(record["source"])
+                applied += 1
+        if stale:
+            print(f"[BM25] Delta log already folded into snapshot generation {self._generation}, removing it")
+            Path(delta_path).unlink()
+            return 0
+        self.add_chunks(pending)
+        return applied
+
+    def compact(self, filepath: str, max_delta_ratio: float = 0.25) -> bool:
+        """Fold the delta log into a full snapshot once it outgrows max_delta_ratio of the snapshot."""
+        delta = Path(filepath + ".delta")
+        if not delta.exists():
+            return False
+        base_size = Path(filepath).stat().st_size if Path(filepath).exists() else 0
+        if delta.stat().st_size <= max_delta_ratio * base_size:
+            return False
+        self.save(filepath)
+        return True
     
     def delete_by_source(self, source_filename: str) -> int:
         """Delete all chunks from a specific document source.
@@ -59,33 +434,95 @@ class BM25Index:
         Returns:
             Number of chunks deleted
         """
-        before_count = len(self.chunk_store)
+        corpus = self._corpus
+        before_count = len(corpus.chunks)
         
+        rows = corpus.source_rows.get(source_filename)
+        if not rows:
+            print(f"[BM25] Deleted 0 chunks from '{source_filename}'. Remaining: {before_count}")
+            return 0
+        keep = np.ones(before_count, dtype=bool)
+        keep[rows] = False
+
         # Filter out chunks matching the source
-        self.chunk_store = [
-            chunk for chunk in self.chunk_store
-            if chunk.get("metadata", {}).get("source") != source_filename
-        ]
+        chunks = [chunk for chunk, k in zip(corpus.chunks, keep) if k]
         
-        after_count = len(self.chunk_store)
+        after_count = len(chunks)
         deleted = before_count - after_count
         
-        # Rebuild BM25 index with remaining chunks
-        if self.chunk_store:
-            corpus = [c.get("content", "").lower().split() for c in self.chunk_store]
-            self.bm25 = BM25Okapi(corpus)
-        else:
-            self.bm25 = None
+        # Drop the deleted rows from the postings and renumber the surviving doc ids
+        new_ids = (np.cumsum(keep) - 1).astype(np.int32)
+        tf_postings = {}
+        for term, (ids, tfs) in corpus.tf_postings.items():
+            mask = keep[ids]
+            if mask.any():
+                tf_postings[term] = (new_ids[ids[mask]], tfs[mask])
+        source_rows = {src: new_ids[r].tolist() for src, r in corpus.source_rows.items() if src != source_filename}
+        # Published in one assignment, so no search sees the new chunks with the old postings
+        self._corpus = _Corpus(chunks, tf_postings, corpus.doc_len[keep], source_rows)
         
         print(f"[BM25] Deleted {deleted} chunks from '{source_filename}'. Remaining: {after_count}")
         return deleted
 
 
+def _write_atomic(path: str, write: Callable[[BinaryIO], Any]) -> None:
+    """Call write on a temp file next to path and rename it over path, so readers never see a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _content_hash(data: bytes) -> str:
+    """16-hex-digit content hash for chunk ids; stable across processes, unlike hash()."""
+    if XXHASH_AVAILABLE:
+        return f"{xxhash.xxh3_64_intdigest(data):016x}"
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def _json_dumps(obj: Any) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+
+def _json_loads(data: bytes) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+_PRIMITIVE_TYPES = (str, int, float, bool)
+
+
+def _clean_metadata(meta: Dict[str, Any]) -> Dict[str, Any]:
+    """ChromaDB requires metadata values to be str, int, float, or bool; convert anything else to str."""
+    # Fast path: parser metadata ({"source", "page"}) is normally all primitive already, so reuse it as is
+    if all(isinstance(v, _PRIMITIVE_TYPES) for v in meta.values()):
+        return meta
+    return {k: (v if isinstance(v, _PRIMITIVE_TYPES) else str(v)) for k, v in meta.items()}
+
+
 class ChromaVectorStore:
     """ChromaDB-based vector store with automatic persistence."""
     
-    def __init__(self, persist_dir: str = "data/chroma_db", collection_name: str = "rag_documents"):
-        """Initialize ChromaDB with persistent storage."""
+    def __init__(
+        self,
+        persist_dir: str = "data/chroma_db",
+        collection_name: str = "rag_documents",
+        batch_size: int = 166,
+        hnsw_construction_ef: int = 200,
+        hnsw_search_ef: int = 64,
+        hnsw_m: int = 32,
+    ):
+        """
+        Initialize ChromaDB with persistent storage. Inserts are sent batch_size chunks at a time.
+        The HNSW settings trade recall for latency (lower search_ef = smaller graph traversals);
+        ChromaDB applies them only when the collection is first created.
+        """
+        self.batch_size = batch_size
         self.persist_dir = Path(persist_dir)
         self.persist_dir.mkdir(parents=True, exist_ok=True)
         
@@ -100,10 +537,20 @@ class ChromaVectorStore:
         # Get or create collection
         self.collection = self.client.get_or_create_collection(
             name=collection_name,
-            metadata={"hnsw:space": "cosine"}
+            metadata={
+                "hnsw:space": "cosine",
+                "hnsw:construction_ef": hnsw_construction_ef,
+                "hnsw:search_ef": hnsw_search_ef,
+                "hnsw:M": hnsw_m,
+                "hnsw:num_threads": os.cpu_count() or 1,
+                # Flush the HNSW write buffer once per insert batch
+                "hnsw:batch_size": batch_size,
+            }
         )
         
-        print(f"[ChromaDB] Initialized. Collection: {collection_name}, Documents: {self.collection.count()}")
+        # Document count, refreshed from ChromaDB only after this store adds, deletes or resets
+        self._cached_count: Optional[int] = None
+        print(f"[ChromaDB] Initialized. Collection: {collection_name}, Documents: {self.count()}")
     
     def add_chunks(self, chunks: List[Dict[str, Any]], embeddings: List[List[float]]) -> None:
         """Add chunks with embeddings to ChromaDB."""
@@ -111,117 +558,121 @@ class ChromaVectorStore:
             return
         
         # Generate unique IDs
-        import hashlib
-        ids = []
-        for i, chunk in enumerate(chunks):
-            content_hash = hashlib.md5(chunk["content"].encode()).hexdigest()[:8]
-            ids.append(f"chunk_{i}_{content_hash}")
-        
-        documents = [c["content"] for c in chunks]
-        metadatas = [c.get("metadata", {}) for c in chunks]
+        ids = [f"chunk_{i}_{_content_hash(c['content'].encode())}" for i, c in enumerate(chunks)]
         
-        # ChromaDB requires metadata values to be str, int, float, or bool
-        # Convert any other types to strings
-        clean_metadatas = []
-        for meta in metadatas:
-            clean_meta = {}
-            for k, v in meta.items():
-                if isinstance(v, (str, int, float, bool)):
-                    clean_meta[k] = v
-                else:
-                    clean_meta[k] = str(v)
-            clean_metadatas.append(clean_meta)
-        
-        try:
-            self.collection.add(
-                ids=ids,
-                documents=documents,
-                embeddings=embeddings,
-                metadatas=clean_metadatas
-            )
-            print(f"[ChromaDB] Added {len(chunks)} chunks. Total: {self.collection.count()}")
-        except Exception as e:
-            print(f"[ChromaDB] Error adding chunks: {e}")
+        # One collection.add per batch of 100-250 amortizes ChromaDB's per-call commit and index
+        # flush; metadata is cleaned per batch so the first insert doesn't wait on the whole list
+        added = 0
+        for i in range(0, len(chunks), self.batch_size):
+            batch = chunks[i:i + self.batch_size]
+            try:
+                self.collection.add(
+                    ids=ids[i:i + self.batch_size],
+                    documents=[c["content"] for c in batch],
+                    embeddings=embeddings[i:i + self.batch_size],
+                    metadatas=[_clean_metadata(c.get("metadata", {})) for c in batch],
+                )
+                added += len(batch)
+            except Exception as e:
+                print(f"[ChromaDB] Error adding chunks {i}-{i + len(batch) - 1}: {e}")
+        self._cached_count = None
+        print(f"[ChromaDB] Added {added}/{len(chunks)} chunks. Total: {self.count()}")
     
     def search(self, query_embedding: List[float], top_k: int = 10, filter_metadata: dict = None) -> List[Dict[str, Any]]:
         """Vector similarity search."""
-        if self.collection.count() == 0:
-            return []
+        return self.search_batch([query_embedding], top_k=top_k, filter_metadata=filter_metadata)[0]
+
+    def search_batch(
+        self, query_embeddings: List[List[float]], top_k: int = 10, filter_metadata: dict = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Vector similarity search for several queries in one collection.query call; one result list per query."""
+        empty: List[List[Dict[str, Any]]] = [[] for _ in query_embeddings]
+        if not query_embeddings:
+            return empty
         
         try:
-            results = self.collection.query(
-                query_embeddings=[query_embedding],
-                n_results=min(top_k, self.collection.count()),
-                where=filter_metadata
-            )
+            # Not gated on the cached count: other worker processes may have written since
+            try:
+                results = self.collection.query(
+                    query_embeddings=query_embeddings, n_results=top_k, where=filter_metadata
+                )
+            except Exception:
+                # Older ChromaDB raises when n_results exceeds the collection size
+                count = self.collection.count()
+                if count == 0:
+                    return empty
+                results = self.collection.query(
+                    query_embeddings=query_embeddings, n_results=min(top_k, count), where=filter_metadata
+                )
             
-            chunks = []
-            for i, doc in enumerate(results['documents'][0]):
-                chunks.append({
-                    "content": doc,
-                    "metadata": results['metadatas'][0][i] if results['metadatas'] else {},
-                    "distance": results['distances'][0][i] if results['distances'] else 0.0
-                })
-            return chunks
+            return [
+                [
+                    {
+                        "content": doc,
+                        "metadata": results['metadatas'][q][i] if results['metadatas'] else {},
+                        "distance": results['distances'][q][i] if results['distances'] else 0.0
+                    }
+                    for i, doc in enumerate(docs)
+                ]
+                for q, docs in enumerate(results['documents'])
+            ]
         except Exception as e:
             print(f"[ChromaDB] Search error: {e}")
-            return []
+            return empty
     
     def count(self) -> int:
-        """Return number of documents in collection."""
-        return self.collection.count()
+        """
+        Return number of documents in collection, cached between writes through this store.
+        Writes from other processes don't refresh it, so it is for reporting only.
+        """
+        if self._cached_count is None:
+            self._cached_count = self.collection.count()
+        return self._cached_count
     
     def reset(self) -> None:
         """Clear all documents from collection."""
         self.client.reset()
+        self._cached_count = None
         print("[ChromaDB] Collection reset")
     
-    def delete_by_source(self, source_filename: str) -> int:
+    def delete_by_source(self, source_filename: str, verify: bool = False) -> int:
         """Delete all chunks from a specific document source.
         
         Args:
             source_filename: The filename to match in metadata['source']
+            verify: Check afterwards that no chunk of the source is left (one extra lookup)
             
         Returns:
             Number of chunks deleted
         """
-        # Get current count
+        # Delete by filter in one call; the before/after counts give the number deleted
+        # (read fresh, since other worker processes may have written since the cached count)
         before_count = self.collection.count()
-        
-        # Verify chunks exist for this source before trying to delete
-        # This is expensive but safer for debugging
-        existing = self.collection.get(where={"source": source_filename}, include=["metadatas"])
-        params_count = len(existing["ids"])
-        
-        print(f"[ChromaDB] Deleting chunks for source '{source_filename}'. Found {params_count} chunks to delete.")
-        
-        if params_count == 0:
-            print(f"[ChromaDB] No chunks found for '{source_filename}'")
-            return 0
+        self.collection.delete(where={"source": source_filename})
+        self._cached_count = None
+        deleted = before_count - self.count()
 
-        # Delete by metadata filter
-        self.collection.delete(
-            where={"source": source_filename}
-        )
-        
-        # Get new count
-        after_count = self.collection.count()
-        deleted = before_count - after_count
-        
-        # Double check if any remain
-        remaining = self.collection.get(where={"source": source_filename}, include=["metadatas"])
-        if len(remaining["ids"]) > 0:
-             print(f"[ChromaDB] ⚠️ WARNING: {len(remaining['ids'])} chunks still remain after deletion!")
-             # Retry?
-             self.collection.delete(where={"source": source_filename})
-
-        print(f"[ChromaDB] Deleted {deleted} chunks from '{source_filename}'. Remaining total: {after_count}")
+        if verify and self.collection.get(where={"source": source_filename}, limit=1, include=[])["ids"]:
+            raise RuntimeError(f"[ChromaDB] Chunks for '{source_filename}' remain after delete")
+
+        print(f"[ChromaDB] Deleted {deleted} chunks from '{source_filename}'")
         return deleted
+    
+    def list_sources(self) -> List[str]:
+        """Return the distinct document sources in the collection, reading metadata only."""
+        metadatas = self.collection.get(include=["metadatas"])["metadatas"] or []
+        return sorted({m["source"] for m in metadatas if m and "source" in m})
 
 
 def create_vector_store(persist_dir: Optional[str] = None) -> ChromaVectorStore:
-    """Create or load ChromaDB vector store."""
+    """Create or load ChromaDB vector store; calls for the same directory share one client."""
     persist_path = persist_dir if persist_dir else "data/chroma_db"
+    return _open_vector_store(os.path.abspath(persist_path))
+
+
+@lru_cache(maxsize=None)
+def _open_vector_store(persist_path: str) -> ChromaVectorStore:
+    # One PersistentClient per directory: reopening re-reads the HNSW index from disk
     return ChromaVectorStore(persist_dir=persist_path)
 
 
@@ -233,6 +684,11 @@ def create_bm25_index(documents: Optional[List[Dict[str, Any]]] = None) -> BM25I
     return idx
 
 
+# Chunks per embed_documents call and concurrent calls when ingesting
+EMBED_BATCH_SIZE = 32
+EMBED_WORKERS = 4
+
+
 def add_chunks_to_store(
     vector_store: ChromaVectorStore,
     bm25_index: BM25Index,
@@ -243,15 +699,20 @@ def add_chunks_to_store(
     if not chunks:
         return
     
-    # Generate embeddings for all chunks
+    # Embed sub-batches in parallel while BM25 tokenizes the same chunks on another thread;
+    # both indexes are only updated once the embeddings succeeded
     texts = [c.get("content", "") for c in chunks]
-    embeddings = embedder.embed_documents(texts)
+    batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS + 1, thread_name_prefix="ingest") as pool:
+        prepared = pool.submit(bm25_index.prepare, chunks)
+        embeddings = [vec for batch in pool.map(embedder.embed_documents, batches) for vec in batch]
+        prepared = prepared.result()
     
     # Add to ChromaDB
     vector_store.add_chunks(chunks, embeddings)
     
     # Add to BM25
-    bm25_index.add_chunks(chunks)
+    bm25_index.add_chunks(chunks, prepared=prepared)
 
 
 def delete_chunks_by_source(
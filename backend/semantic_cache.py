@@ -0,0 +1,113 @@
+"""Semantic answer cache - reuses answers for near-duplicate questions."""
+
+import json
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    LRU of (query embedding, answer, citations) keyed by cosine similarity.
+    A lookup hits when a cached query's normalized embedding scores >= threshold
+    against the new one. Entries expire after ttl_seconds; clear() on KB changes.
+    put() stores other JSON-serializable fields instead (HybridRetriever caches chunks).
+    """
+
+    def __init__(self, threshold: float = 0.92, max_entries: int = 1024, ttl_seconds: float = 3600.0):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._next_id = 0
+        # Stacked embeddings of _entries in order; rebuilt lazily after writes
+        self._matrix: Optional[np.ndarray] = None
+        self._ids: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else vec
+
+    def _index(self):
+        if self._matrix is None:
+            self._ids = list(self._entries)
+            self._matrix = (
+                np.stack([self._entries[i]["embedding"] for i in self._ids])
+                if self._ids else np.empty((0, 0), dtype=np.float32)
+            )
+        return self._ids, self._matrix
+
+    def lookup(self, embedding) -> Optional[Dict[str, Any]]:
+        """Return the cached {"query", "answer", "citations"} (or put() fields) closest to embedding, or None."""
+        if not self._entries:
+            return None
+        ids, matrix = self._index()
+        query = np.asarray(embedding, dtype=np.float32)
+        if matrix.shape[1] != query.shape[0]:
+            return None
+        # Rows are unit-norm already; the query's norm only scales every score alike,
+        # so it is applied to the best score alone instead of normalizing the query first
+        sims = matrix @ query
+        best = int(np.argmax(sims))
+        norm = float(np.linalg.norm(query))
+        if not norm or sims[best] < self.threshold * norm:
+            return None
+
+        entry_id = ids[best]
+        entry = self._entries[entry_id]
+        if time.time() - entry["ts"] > self.ttl_seconds:
+            del self._entries[entry_id]
+            self._matrix = None
+            return None
+        self._entries.move_to_end(entry_id)
+        return {k: v for k, v in entry.items() if k not in ("embedding", "ts")}
+
+    def add(self, query: str, embedding, answer: str, citations: List[dict]) -> None:
+        self.put(query, embedding, answer=answer, citations=citations)
+
+    def put(self, query: str, embedding, **fields) -> None:
+        self._entries[self._next_id] = {
+            **fields,
+            "query": query,
+            "embedding": self._normalize(embedding),
+            "ts": time.time(),
+        }
+        self._next_id += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def clear(self) -> None:
+        """Drop every entry; called whenever the knowledge base changes."""
+        self._entries.clear()
+        self._matrix = None
+
+    def save(self, filepath: str) -> None:
+        """Save entries to an .npz file (embeddings as a matrix, the rest as JSON)."""
+        ids, matrix = self._index()
+        meta = [{k: v for k, v in self._entries[i].items() if k != "embedding"} for i in ids]
+        np.savez(filepath, embeddings=matrix, meta=np.array(json.dumps(meta, ensure_ascii=False)))
+
+    def load(self, filepath: str) -> None:
+        """Load entries saved by save(), skipping any that have already expired."""
+        if not Path(filepath).exists():
+            return
+        with np.load(filepath, allow_pickle=False) as data:
+            matrix = data["embeddings"]
+            meta = json.loads(str(data["meta"]))
+        now = time.time()
+        self.clear()
+        for emb, m in zip(matrix, meta):
+            if now - m["ts"] <= self.ttl_seconds:
+                self._entries[self._next_id] = {**m, "embedding": emb}
+                self._next_id += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
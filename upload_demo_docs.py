@@ -0,0 +1,177 @@
+"""Upload the demo documents to a running RAG_advanced server and wait for them to be indexed."""
+
+import asyncio
+import sys
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from typing import List
+
+import httpx
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_exponential
+
+try:
+    import h2  # noqa: F401 - httpx needs it for HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+API_URL = "http://localhost:8000"
+DEMO_DIR = Path(__file__).parent / "demo_documents"
+DEMO_FILES = [
+    "Risk_Fraud_Analyst_Learning_Guide.pdf",
+    "White Simple Invoice.pdf",
+    "sample-invoice.pdf",
+]
+POLL_INTERVAL = 1.0
+POLL_TIMEOUT = 300.0
+
+# Gateway errors and dropped connections are retried with 2s, 4s, 8s, 16s backoff (capped at 25s)
+RETRY_STATUSES = (502, 503, 504)
+MAX_ATTEMPTS = 5
+IDEMPOTENT_METHODS = ("GET", "HEAD")
+
+
+def _is_transient(e: BaseException) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code in RETRY_STATUSES
+    return isinstance(e, httpx.TransportError)
+
+
+def _not_sent(e: BaseException) -> bool:
+    """Failed before the request reached the server, so retrying can't ingest the upload twice."""
+    return isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+
+def _log_retry(retry_state) -> None:
+    print(f"  ! attempt {retry_state.attempt_number} failed ({retry_state.outcome.exception()}), "
+          f"retrying in {retry_state.next_action.sleep:.0f}s")
+
+
+async def request(client: httpx.AsyncClient, method: str, url: str, **kwargs) -> httpx.Response:
+    """
+    client.request that raises on HTTP errors and retries transient ones with exponential backoff.
+    Non-idempotent requests (the upload POST) are only retried if they were never sent: a gateway
+    timeout may arrive after the server already accepted the batch.
+    """
+    transient = _is_transient if method.upper() in IDEMPOTENT_METHODS else _not_sent
+    async for attempt in AsyncRetrying(
+        wait=wait_exponential(multiplier=2, max=25),
+        stop=stop_after_attempt(MAX_ATTEMPTS),
+        retry=retry_if_exception(transient),
+        before_sleep=_log_retry,
+        reraise=True,
+    ):
+        with attempt:
+            # httpx rewinds file objects in files= before each send, so a retried upload is complete
+            response = await client.request(method, url, **kwargs)
+            response.raise_for_status()
+    return response
+
+
+async def port_open(url: httpx.URL, timeout: float = 0.5) -> bool:
+    """Cheap TCP connect to the server's port, so a dead host fails in 0.5s rather than an HTTP timeout."""
+    port = url.port or (443 if url.scheme == "https" else 80)
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(url.host, port), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return False
+    writer.close()
+    return True
+
+
+async def wait_for_server(client: httpx.AsyncClient, total: float = 30.0) -> bool:
+    """Poll /health until it answers 200, backing off from 0.25s to 2s; False once total seconds pass."""
+    deadline = time.monotonic() + total
+    delay = 0.25
+    while True:
+        # Only ask the app once something accepts connections on the port
+        if await port_open(client.base_url):
+            try:
+                if (await client.get("/health", timeout=2)).status_code == 200:
+                    return True
+            except httpx.TransportError:
+                # Listening but not serving yet (server still starting)
+                pass
+        if time.monotonic() + delay > deadline:
+            return False
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 2.0)
+
+
+async def wait_for_ingest(client: httpx.AsyncClient, task_id: str) -> dict:
+    """Poll the background ingest task until it is done or failed."""
+    deadline = time.monotonic() + POLL_TIMEOUT
+    while True:
+        task = (await request(client, "GET", f"/upload/status/{task_id}", timeout=10)).json()
+        if task["status"] in ("done", "error") or time.monotonic() > deadline:
+            return task
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+def preflight(file_paths: List[Path]) -> List[Path]:
+    """
+    The files worth uploading, largest first: missing and empty files are reported here
+    rather than sent, and the server's parse pool starts on the longest document first.
+    """
+    sized = []
+    for path in file_paths:
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            print(f"  ✗ {path.name}: not found in {path.parent}")
+            continue
+        if size == 0:
+            print(f"  ✗ {path.name}: empty file")
+            continue
+        sized.append((size, path))
+    sized.sort(key=lambda item: item[0], reverse=True)
+    return [path for _, path in sized]
+
+
+async def upload_files(client: httpx.AsyncClient, present: List[Path]) -> int:
+    """
+    Upload the files as one multipart request (repeated "files" parts), so the server
+    ingests them as a single batch, then wait for it. Returns the number indexed.
+    """
+    try:
+        with ExitStack() as stack:
+            files = [
+                ("files", (path.name, stack.enter_context(open(path, "rb")), "application/pdf"))
+                for path in present
+            ]
+            response = await request(client, "POST", "/upload", files=files, timeout=60)
+        task = await wait_for_ingest(client, response.json()["task_id"])
+    except httpx.HTTPError as e:
+        print(f"  ✗ upload failed: {e}")
+        return 0
+
+    # One write for the whole report instead of a print per file
+    results = task.get("results", [])
+    if results:
+        print("\n".join(
+            f"  ✓ {r['filename']}: {r.get('chunks', 0)} chunks" if r.get("status") == "ok"
+            else f"  ✗ {r['filename']}: {r.get('reason', r.get('status'))}"
+            for r in results
+        ), flush=True)
+    return sum(r.get("status") == "ok" for r in results)
+
+
+async def main(api_url: str = API_URL) -> int:
+    # One client for the health check, the upload and status polls, over HTTP/2 when h2 is installed
+    async with httpx.AsyncClient(base_url=api_url, http2=HTTP2_AVAILABLE, timeout=30) as client:
+        if not await wait_for_server(client):
+            print(f"Server not ready at {api_url}")
+            print("Start it with: cd backend && python -m uvicorn main:app --port 8000")
+            return 1
+
+        print(f"Uploading {len(DEMO_FILES)} demo documents to {api_url}...")
+        valid = preflight([DEMO_DIR / f for f in DEMO_FILES])
+        successful_uploads = await upload_files(client, valid) if valid else 0
+
+    print(f"Uploaded {successful_uploads}/{len(DEMO_FILES)} documents.")
+    return 0 if successful_uploads == len(DEMO_FILES) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else API_URL)))